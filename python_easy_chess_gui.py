@@ -46,6 +46,26 @@ import copy
 import time
 from datetime import datetime
 import json
+import shutil
+import tempfile
+import heapq
+import random
+import functools
+import itertools
+import hashlib
+import struct
+import multiprocessing
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import zlib
+import gzip
+import bz2
+import lzma
+import io
+import re
+import mmap
+import bisect
+from array import array
 import pyperclip
 import chess
 import chess.pgn
@@ -58,12 +78,17 @@ import platform as sys_plat
 
 
 log_format = '%(asctime)s :: %(funcName)s :: line: %(lineno)d :: %(levelname)s :: %(message)s'
-logging.basicConfig(
-    filename='pecg_log.txt',
-    filemode='w',
-    level=logging.INFO,
-    format=log_format
-)
+# A --replay-uci process is spawned by the GUI as an engine, and the position
+# index workers import this module; they must not truncate the GUI's own log
+# file.
+if '--replay-uci' not in sys.argv[1:] \
+        and multiprocessing.current_process().name == 'MainProcess':
+    logging.basicConfig(
+        filename='pecg_log.txt',
+        filemode='w',
+        level=logging.INFO,
+        format=log_format
+    )
 
 # python-chess logs every UCI line exchanged with the engine at DEBUG level.
 # During live (infinite/long) analysis this floods pecg_log.txt with thousands
@@ -75,10 +100,17 @@ logging.getLogger('chess.engine').setLevel(logging.WARNING)
 APP_NAME = 'Python Easy Chess GUI'
 APP_VERSION = 'v2.14.1'
 BOX_TITLE = f'{APP_NAME} {APP_VERSION}'
-REVIEW_MAX_DISPLAY_GAMES = 10000
+REVIEW_GAME_LIST_ROWS = 12  # visible rows of the Review game picker
 REVIEW_ANALYSIS_MULTIPV_LINES = 3
 REVIEW_ANALYSIS_PV_MOVES = 7
 REVIEW_NAV_DEBOUNCE_SEC = 0.3
+REVIEW_PGN_INPUT_DEBOUNCE_SEC = 0.5  # typed PGN path is loaded once it settles
+REVIEW_CHECKPOINT_PLIES = 16  # board kept every so many plies, see ReviewPositionStore
+REVIEW_BOARD_CACHE_SIZE = 32  # recently viewed review boards kept
+REVIEW_MOVE_LIST_SEGMENTS = 4000  # move list text segments in the widget at a time
+REVIEW_MOVE_LIST_EDGE = 0.02  # scrolled this close to an end moves the window
+REVIEW_PREFETCH_GAMES = 4  # prepared review games kept, see ReviewGamePrefetcher
+REVIEW_NAG_SYMBOLS = {1: '!', 2: '?', 3: '!!', 4: '??', 5: '!?', 6: '?!'}
 REVIEW_MOVE_LIST_HEIGHT = 8   # reduced from 11 to make room for the threat panel
 REVIEW_ANALYSIS_BOX_HEIGHT = 3
 REVIEW_THREAT_BOX_HEIGHT = 1
@@ -94,6 +126,72 @@ REVIEW_ANALYSIS_TIME_SEC = 60   # default analysis time cap
 REVIEW_THREAT_TIME_SEC = 30     # default threat time cap
 REVIEW_ANALYSIS_TIME_MIN = 1
 REVIEW_ANALYSIS_TIME_MAX = 3600
+# Evaluation graph under the Review board. Every mainline position is
+# searched to this depth (Settings/Game, persisted, 0 turns it off) by a
+# single-threaded analysis engine run at a lower OS priority.
+REVIEW_EVAL_GRAPH_DEPTH = 10
+REVIEW_EVAL_GRAPH_DEPTH_MAX = 30
+REVIEW_EVAL_GRAPH_SIZE = (480, 60)  # pixels, the board width
+REVIEW_EVAL_GRAPH_CP = 800  # evaluations are clamped to +/- this many cp
+REVIEW_EVAL_GRAPH_NICE = 10  # os.setpriority() niceness of its engine
+# Optional trace of every UCI line exchanged with the engines (Settings/Game).
+# The chess.engine logger stays silenced in pecg_log.txt; recorded lines go to
+# this file only and can be served back with --replay-uci.
+UCI_SESSION_LOG_FILE = 'pecg_uci_session.log'
+UCI_SESSION_LOG_VERSION = 1
+# Sidecar index written next to a PGN opened in Review, <pgn>.pecgidx. It
+# holds the byte offset and these header values of every indexed game.
+PGN_INDEX_SUFFIX = '.pecgidx'
+PGN_INDEX_VERSION = 3  # 2: decompression checkpoints, 3: games split as by python-chess
+PGN_INDEX_HEADERS = ('Event', 'Site', 'Date', 'Round', 'White', 'Black',
+                     'Result', 'WhiteElo', 'BlackElo', 'ECO')
+PGN_INDEX_TAIL_BYTES = 4096  # crc32 window checked before reusing an index
+PGN_FILTER_BATCH_GAMES = 100000  # games added to PgnHeaderFilter at a time
+# Compressed PGNs are read through the stdlib codecs. Offsets are positions
+# in the decompressed text; a checkpoint is (offset, compressed offset) of a
+# gzip member, bz2 stream or xz block, where decompression can restart.
+PGN_CODECS = {'.gz': 'gz', '.bz2': 'bz2', '.xz': 'xz'}
+PGN_READ_BYTES = 1 << 20  # compressed bytes per read
+PGN_CHECKPOINT_BYTES = 1 << 24  # min decompressed distance between checkpoints
+PGN_FILE_TYPES = (('PGN Files', '*.pgn *.pgn.gz *.pgn.bz2 *.pgn.xz'),
+                  ('ALL Files', '*.*'))
+# Binary game database written by Tools -> PGN -> Convert, <name>.pecgdb, see
+# PecgDatabase. Moves are from | to << 6 | promotion << 12.
+PECGDB_SUFFIX = '.pecgdb'
+PECGDB_VERSION = 1
+PECGDB_MAGIC = b'PECGDB\n\0'
+PECGDB_CHUNK_GAMES = 1000  # games per converter worker task
+PECGDB_KIND_MOVES = 0  # mainline stored as move codes
+PECGDB_KIND_TEXT = 1  # movetext stored zlib-compressed
+PECGDB_FILE_TYPES = (('Game Database', '*' + PECGDB_SUFFIX), ('ALL Files', '*.*'))
+# Position index written next to a PGN by Game -> Find Position, <pgn>.pecgpos.
+# Records are (polyglot key, game index, ply), big-endian so that the bytes
+# sort like the keys; one sorted segment per chunk of games.
+POSITION_INDEX_SUFFIX = '.pecgpos'
+POSITION_INDEX_VERSION = 1
+POSITION_INDEX_MAGIC = b'PECGPOS\n'
+POSITION_INDEX_CHUNK_GAMES = 1000  # games per worker task and per segment
+POSITION_RECORD = struct.Struct('>QIH')
+# Opening explorer written next to a PGN chosen with Game -> Explorer PGN,
+# <pgn>.pecgexp. Records are (polyglot key, move, games, white wins, draws,
+# black wins, Elo sum, Elo count, latest date) sorted by key and move.
+EXPLORER_SUFFIX = '.pecgexp'
+EXPLORER_VERSION = 2  # 2: castling stored as king takes rook
+EXPLORER_MAGIC = b'PECGEXP\n'
+EXPLORER_MAX_PLY = 40  # plies of each game counted
+EXPLORER_CHUNK_GAMES = 2000  # games per worker task
+EXPLORER_RECORD = struct.Struct('>QHIIIIQII')
+BOOK_BUILD_MAX_PLY = 30  # default depth of Book -> Build Book
+# Open polyglot readers and cached book moves, see BookRegistry.
+BOOK_CACHE_POSITIONS = 4096
+BOOK_STAT_INTERVAL_SEC = 1.0  # how often a book file is checked for changes
+PGN_PARSE_CHUNK_GAMES = 1000  # games per PgnParseService worker task
+PGN_TOOL_PROGRESS_SEC = 0.25  # min interval of Tools -> PGN status messages
+PGN_SPLIT_OPEN_FILES = 64  # output files kept open by Tools -> PGN -> Split
+PGN_SORT_RUN_BYTES = 64 << 20  # games sorted in memory per run
+PGN_SORT_RECORD = struct.Struct('>HI')  # key and game size of a run record
+PGN_DEDUP_FILTER_BYTES = 1 << 24  # bit table of the digests seen
+PGN_DEDUP_HEADERS = ('White', 'Black', 'Date', 'Result', 'FEN')
 
 
 platform = sys.platform
@@ -185,6 +283,9 @@ GUI_THEME = [
 IMAGE_PATH = 'Images/60'  # path to the chess pieces
 SQUARE_PX = 60            # piece images are 60x60, so the board is 8 * 60 wide
 BOARD_PX = 8 * SQUARE_PX
+# Board backends, 64 square buttons or one canvas (Settings/Game).
+BOARD_RENDERERS = ('buttons', 'canvas')
+BOARD_CANVAS_KEY = 'board_canvas_k'
 
 
 BLANK = 0  # piece names
@@ -201,6 +302,22 @@ ROOKW = 10
 KINGW = 11
 QUEENW = 12
 
+# python-chess (piece type, color) -> psg piece code
+PSG_PIECE_CODES = {
+    (chess.PAWN, chess.BLACK): PAWNB,
+    (chess.KNIGHT, chess.BLACK): KNIGHTB,
+    (chess.BISHOP, chess.BLACK): BISHOPB,
+    (chess.ROOK, chess.BLACK): ROOKB,
+    (chess.KING, chess.BLACK): KINGB,
+    (chess.QUEEN, chess.BLACK): QUEENB,
+    (chess.PAWN, chess.WHITE): PAWNW,
+    (chess.KNIGHT, chess.WHITE): KNIGHTW,
+    (chess.BISHOP, chess.WHITE): BISHOPW,
+    (chess.ROOK, chess.WHITE): ROOKW,
+    (chess.KING, chess.WHITE): KINGW,
+    (chess.QUEEN, chess.WHITE): QUEENW,
+}
+
 
 # Absolute rank based on real chess board, white at bottom, black at the top.
 # This is also the rank mapping used by python-chess modules.
@@ -305,11 +422,16 @@ HELP_TOPICS = {
     'help_review_open': (
         'Open a Game to Review',
         'Mode -> Review, choose a PGN file, select a game and press OK.\n'
-        'Use Game -> Load PGN / Select Game to change games later.'),
+        'Use Game -> Load PGN / Select Game to change games later, or\n'
+        'Game -> Next Game / Previous Game to step through the file.\n'
+        'Game -> Find Position lists the games of the PGN that reached\n'
+        'the current position.'),
     'help_review_nav': (
         'Navigate Moves',
         'Use the First, Previous, Next and Last buttons below the board,\n'
-        'or click a move in the move list to jump to that position.'),
+        'or click a move in the move list to jump to that position.\n'
+        'The evaluation graph below the board fills in as the game is\n'
+        'evaluated; click it to jump to that mainline position.'),
     'help_review_engine': (
         'Analysis and Threat (Review)',
         'Analysis button: evaluate the position with the analysis engine.\n'
@@ -427,9 +549,12 @@ menu_def_neutral = [
                      'Set Engine Threat', 'Set Engine Opponent', 'Set Depth',
                      'Manage', ['Install', 'Edit', 'Delete']]],
         ['&Time', ['User::tc_k', 'Engine::tc_k']],
-        ['&Book', ['Set Book::book_set_k']],
+        ['&Book', ['Set Book::book_set_k', 'Build Book::build_book_k']],
         ['&User', ['Set Name::user_name_k']],
-        ['Tools', ['PGN', ['Delete Player::delete_player_k']]],
+        ['Tools', ['PGN', ['Delete Player::delete_player_k', 'Merge::pgn_tool_k',
+                           'Split::pgn_tool_k', 'Sort::pgn_tool_k',
+                           'Deduplicate::pgn_tool_k', 'Convert to Database::pgn_tool_k',
+                           'Export Database::pgn_tool_k']]],
         ['&Settings', ['Game::settings_game_k']],
         make_help_menu(HELP_ENGINE_MENU, HELP_GAME_MENU,
                        HELP_REVIEW_MENU, HELP_BOARD_MENU),
@@ -455,6 +580,10 @@ menu_def_review = [
         ['&Mode', ['Neutral']],
         ['&Game', ['Load PGN::review_load_pgn_k',
                    'Select Game::review_select_game_k',
+                   'Next Game::review_next_game_k',
+                   'Previous Game::review_prev_game_k',
+                   'Find Position::review_find_position_k',
+                   'Explorer PGN::review_explorer_pgn_k',
                    'Auto-Analyze Game::review_auto_analyze_k',
                    'Cancel Analysis::review_cancel_analysis_k']],
         ['Boar&d', ['Flip']],
@@ -462,104 +591,3284 @@ menu_def_review = [
 ]
 
 
-class Timer:
-    def __init__(self, tc_type: str = 'fischer', base: int = 300000, inc: int = 10000, period_moves: int = 40) -> None:
-        """Manages time control.
+class Timer:
+    def __init__(self, tc_type: str = 'fischer', base: int = 300000, inc: int = 10000, period_moves: int = 40) -> None:
+        """Manages time control.
+
+        Args:
+          tc_type: time control type ['fischer, delay, classical']
+          base: base time in ms
+          inc: increment time in ms can be negative and 0
+          period_moves: number of moves in a period
+        """
+        self.tc_type = tc_type  # ['fischer', 'delay', 'timepermove']
+        self.base = base
+        self.inc = inc
+        self.period_moves = period_moves
+        self.elapse = 0
+        self.init_base_time = self.base
+
+    def update_base(self) -> None:
+        """Updates base time after every move."""
+        if self.tc_type == 'delay':
+            self.base += min(0, self.inc - self.elapse)
+        elif self.tc_type == 'fischer':
+            self.base += self.inc - self.elapse
+        elif self.tc_type == 'timepermove':
+            self.base = self.init_base_time
+        else:
+            self.base -= self.elapse
+
+        self.base = max(0, self.base)
+        self.elapse = 0
+
+
+class BookRegistry:
+    """Process-wide cache of open polyglot book readers.
+
+    A book is opened once with chess.polyglot.open_reader, which maps the
+    file with mmap, and stays open while its size and mtime are unchanged;
+    the stat is checked at most every BOOK_STAT_INTERVAL_SEC. The moves of
+    a position are kept in an LRU of BOOK_CACHE_POSITIONS entries keyed by
+    book, file stat and polyglot key, so a changed book misses the cache.
+    """
+
+    def __init__(self, max_positions=BOOK_CACHE_POSITIONS):
+        self.max_positions = max_positions
+        self._readers = {}  # path -> [reader, stat, last stat check time]
+        self._moves = OrderedDict()  # (path, stat, key) -> [(move, weight), ...]
+        self._lock = threading.Lock()
+
+    def _reader(self, book_file):
+        """Returns (reader, stat) of book_file, (None, None) if it is missing."""
+        path = os.path.abspath(book_file)
+        cached = self._readers.get(path)
+        now = time.monotonic()
+        if cached is not None and now - cached[2] < BOOK_STAT_INTERVAL_SEC:
+            return cached[0], cached[1]
+        try:
+            st = os.stat(path)
+            stat = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stat = None
+        if cached is not None:
+            if cached[1] == stat:
+                cached[2] = now
+                return cached[0], stat
+            cached[0].close()
+            del self._readers[path]
+        if stat is None:
+            return None, None
+        reader = chess.polyglot.open_reader(path)
+        self._readers[path] = [reader, stat, now]
+        return reader, stat
+
+    def moves(self, book_file, board):
+        """Returns the [(move, weight), ...] of board in book_file, file order."""
+        with self._lock:
+            reader, stat = self._reader(book_file)
+            if reader is None:
+                return []
+            key = (os.path.abspath(book_file), stat, chess.polyglot.zobrist_hash(board))
+            moves = self._moves.get(key)
+            if moves is not None:
+                self._moves.move_to_end(key)
+                return moves
+            moves = [(entry.move, entry.weight) for entry in reader.find_all(board)]
+            self._moves[key] = moves
+            if len(self._moves) > self.max_positions:
+                self._moves.popitem(last=False)
+            return moves
+
+    def probe_keys(self, book_file, keys):
+        """Returns the polyglot moves of each of keys in book_file.
+
+        All keys are resolved in one pass over the entries in the reader's
+        mmap: they are visited in sorted order and each binary search starts
+        where the previous one ended. Entries of weight 0 are left out, as
+        find_all() does. Moves are encoded like encode_book_move().
+        """
+        moves = [[] for _ in keys]
+        unpack = chess.polyglot.ENTRY_STRUCT.unpack_from
+        entry_size = chess.polyglot.ENTRY_STRUCT.size
+        with self._lock:
+            reader, _ = self._reader(book_file)
+            if reader is None:
+                return moves
+            data = reader.mmap
+            size = len(reader)
+            lo = 0
+            for i in sorted(range(len(keys)), key=keys.__getitem__):
+                key = keys[i]
+                hi = size
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    if unpack(data, mid * entry_size)[0] < key:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                j = lo
+                while j < size:
+                    entry_key, move, weight, _ = unpack(data, j * entry_size)
+                    if entry_key != key:
+                        break
+                    if weight:
+                        moves[i].append(move)
+                    j += 1
+        return moves
+
+    def close(self, book_file=None):
+        """Close the reader of book_file, or all readers."""
+        with self._lock:
+            paths = [os.path.abspath(book_file)] if book_file else list(self._readers)
+            for path in paths:
+                cached = self._readers.pop(path, None)
+                if cached is not None:
+                    cached[0].close()
+
+
+book_registry = BookRegistry()
+
+
+class GuiBook:
+    def __init__(self, book_file: str, board, is_random: bool = True) -> None:
+        """Handles gui polyglot book for engine opponent.
+
+        Args:
+          book_file: polgylot book filename
+          board: given board position
+          is_random: randomly select move from book
+        """
+        self.book_file = book_file
+        self.board = board
+        self.is_random = is_random
+        self.__book_move = None
+
+    def get_book_move(self) -> None:
+        """Gets book move either random or best move."""
+        try:
+            moves = book_registry.moves(self.book_file, self.board)
+            if not moves:
+                raise IndexError('no book move')
+            if self.is_random:
+                weights = [weight for _, weight in moves]
+                if sum(weights):
+                    self.__book_move = random.choices(moves, weights)[0][0]
+                else:
+                    self.__book_move = random.choice(moves)[0]
+            else:
+                self.__book_move = max(moves, key=lambda m: m[1])[0]
+        except IndexError:
+            logging.warning('No more book move.')
+        except Exception:
+            logging.exception('Failed to get book move.')
+
+        return self.__book_move
+
+    def get_all_moves(self):
+        """
+        Read polyglot book and get all legal moves from a given positions.
+
+        :return: move string
+        """
+        is_found = False
+        total_score = 0
+        book_data = {}
+        cnt = 0
+
+        if os.path.isfile(self.book_file):
+            moves = '{:4s}   {:<5s}   {}\n'.format('move', 'score', 'weight')
+            for move, score in book_registry.moves(self.book_file, self.board):
+                is_found = True
+                san_move = self.board.san(move)
+                total_score += score
+                bd = {cnt: {'move': san_move, 'score': score}}
+                book_data.update(bd)
+                cnt += 1
+        else:
+            moves = '{:4s}  {:<}\n'.format('move', 'score')
+
+        # Get weight for each move
+        if is_found:
+            for _, v in book_data.items():
+                move = v['move']
+                score = v['score']
+                weight = score/total_score
+                moves += '{:4s}   {:<5d}   {:<2.1f}%\n'.format(move, score, 100*weight)
+
+        return moves, is_found
+
+
+def pgn_codec(pgn_file):
+    """Returns 'gz', 'bz2' or 'xz' for a compressed PGN, '' for plain text."""
+    return PGN_CODECS.get(os.path.splitext(pgn_file)[1].lower(), '')
+
+
+def _new_pgn_decompressor(codec):
+    """Returns a decompressor for one gzip member, bz2 stream or xz stream."""
+    if codec == 'gz':
+        return zlib.decompressobj(wbits=31)
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor()
+    return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+
+
+def _read_xz_varint(data, pos):
+    """Returns (value, next position) of the xz multibyte integer at pos."""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise ValueError('xz integer too long')
+
+
+def _read_xz_block_header(h, offset):
+    """Returns (raw filter chain, offset of the compressed data) of an xz block."""
+    h.seek(offset)
+    header = h.read(1)
+    if not header or header[0] == 0:
+        raise ValueError('not an xz block header')
+    header += h.read(header[0] * 4 + 3)
+    flags = header[1]
+    if flags & 0x3c:
+        raise ValueError('unsupported xz block flags')
+    pos = 2
+    for size_flag in (0x40, 0x80):
+        if flags & size_flag:
+            _, pos = _read_xz_varint(header, pos)
+    filters = []
+    for _ in range((flags & 3) + 1):
+        filter_id, pos = _read_xz_varint(header, pos)
+        props_size, pos = _read_xz_varint(header, pos)
+        props = header[pos:pos + props_size]
+        pos += props_size
+        if filter_id == lzma.FILTER_LZMA2 and props_size == 1 and props[0] <= 40:
+            bits = props[0]
+            dict_size = 0xffffffff if bits == 40 else (2 | (bits & 1)) << (bits // 2 + 11)
+            filters.append({'id': filter_id, 'dict_size': dict_size})
+        elif filter_id == lzma.FILTER_DELTA and props_size == 1:
+            filters.append({'id': filter_id, 'dist': props[0] + 1})
+        elif lzma.FILTER_X86 <= filter_id <= lzma.FILTER_SPARC and not props_size:
+            filters.append({'id': filter_id})
+        else:
+            raise ValueError(f'unsupported xz filter {filter_id:#x}')
+    return filters, offset + len(header)
+
+
+def _xz_block_checkpoints(pgn_file):
+    """Returns the checkpoints of every block of an xz file.
+
+    Blocks are found from the index at the end of each stream, nothing is
+    decompressed. Returns None for a file whose blocks cannot be located or
+    decoded on their own; it is then read as a whole from the start.
+    """
+    streams = []
+    try:
+        with open(pgn_file, 'rb') as h:
+            end = h.seek(0, os.SEEK_END)
+            while end > 0:
+                h.seek(end - 4)
+                if h.read(4) == b'\0\0\0\0':  # stream padding
+                    end -= 4
+                    continue
+                h.seek(end - 12)
+                footer = h.read(12)
+                if len(footer) != 12 or footer[10:] != b'YZ':
+                    return None
+                index_size = (struct.unpack('<I', footer[4:8])[0] + 1) * 4
+                h.seek(end - 12 - index_size)
+                index = h.read(index_size)
+                if index[:1] != b'\0':
+                    return None
+                count, pos = _read_xz_varint(index, 1)
+                blocks = []  # (padded size, decompressed size)
+                for _ in range(count):
+                    unpadded, pos = _read_xz_varint(index, pos)
+                    usize, pos = _read_xz_varint(index, pos)
+                    blocks.append(((unpadded + 3) & ~3, usize))
+                stream_start = end - 12 - index_size - sum(b[0] for b in blocks) - 12
+                h.seek(max(0, stream_start))
+                if stream_start < 0 or h.read(6) != b'\xfd7zXZ\0':
+                    return None
+                offset = stream_start + 12
+                stream = []
+                for padded, usize in blocks:
+                    _read_xz_block_header(h, offset)
+                    stream.append((offset, usize))
+                    offset += padded
+                streams.append(stream)
+                end = stream_start
+    except (OSError, ValueError, IndexError):
+        logging.info('Cannot read the xz blocks of %s, it is read from the start.', pgn_file)
+        return None
+
+    checkpoints = []
+    offset = 0
+    for stream in reversed(streams):
+        for compressed_offset, usize in stream:
+            checkpoints.append((offset, compressed_offset))
+            offset += usize
+    return checkpoints
+
+
+def pgn_checkpoints(pgn_file):
+    """Returns the checkpoints known before a compressed PGN is read.
+
+    Every xz block is a checkpoint; gzip members and bz2 streams are found
+    while the file is scanned, starting from the one at offset 0.
+    """
+    codec = pgn_codec(pgn_file)
+    if not codec:
+        return []
+    if codec == 'xz':
+        checkpoints = _xz_block_checkpoints(pgn_file)
+        if checkpoints:
+            return checkpoints
+    return [(0, 0)]
+
+
+def iter_pgn_bytes(pgn_file, start=0, checkpoints=None, is_recording=False):
+    """Yields (offset, data) decompressed chunks of a compressed PGN.
+
+    Decompression starts from the last checkpoint at or before start and
+    the chunks begin exactly at start. With is_recording, gzip members and
+    bz2 streams at least PGN_CHECKPOINT_BYTES past the last checkpoint are
+    appended to checkpoints as they are reached.
+    """
+    codec = pgn_codec(pgn_file)
+    if not checkpoints:
+        checkpoints = [(0, 0)]
+    i = max(0, bisect.bisect_right(checkpoints, (start, float('inf'))) - 1)
+    offset, compressed_offset = checkpoints[i]
+
+    def skip(data):
+        nonlocal offset
+        begin = offset
+        offset += len(data)
+        if offset > start and data:
+            return (start, data[start - begin:]) if begin < start else (begin, data)
+        return None
+
+    with open(pgn_file, 'rb') as h:
+        if codec == 'xz' and compressed_offset:
+            # Independent blocks, each a raw LZMA2 (plus filters) stream.
+            for offset, compressed_offset in checkpoints[i:]:
+                filters, data_start = _read_xz_block_header(h, compressed_offset)
+                d = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=filters)
+                h.seek(data_start)
+                while not d.eof:
+                    raw = h.read(PGN_READ_BYTES)
+                    if not raw:
+                        break
+                    chunk = skip(d.decompress(raw))
+                    if chunk is not None:
+                        yield chunk
+            return
+
+        h.seek(compressed_offset)
+        d = None
+        unit_start = compressed_offset
+        while True:
+            raw = h.read(PGN_READ_BYTES)
+            if not raw:
+                return
+            read_end = h.tell()
+            while raw:
+                if d is None:
+                    raw = raw.lstrip(b'\0')  # padding between xz streams
+                    if not raw:
+                        break
+                    unit_start = read_end - len(raw)
+                    if is_recording and offset >= checkpoints[-1][0] + PGN_CHECKPOINT_BYTES:
+                        checkpoints.append((offset, unit_start))
+                    d = _new_pgn_decompressor(codec)
+                chunk = skip(d.decompress(raw))
+                if chunk is not None:
+                    yield chunk
+                if d.eof:
+                    raw = d.unused_data
+                    d = None
+                else:
+                    raw = b''
+
+
+class PgnTextReader:
+    """Text reader of a compressed PGN for chess.pgn.read_game().
+
+    Like a PGN opened in text mode with errors='replace', readline() returns
+    '\\n' terminated str lines. seek() takes the offset of a line start in
+    the decompressed text: seeking forward decompresses and drops what lies
+    in between, seeking back restarts from the nearest checkpoint.
+    """
+
+    def __init__(self, pgn_file, checkpoints=None):
+        self.pgn_file = pgn_file
+        self.checkpoints = checkpoints
+        self._chunks = None
+        self._buffer = b''
+        self._pos = 0  # read position in self._buffer
+        self._offset = 0  # offset of self._buffer[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._chunks is not None:
+            self._chunks.close()
+            self._chunks = None
+
+    def seek(self, offset):
+        if self._chunks is None or offset < self._offset:
+            self.close()
+            self._chunks = iter_pgn_bytes(self.pgn_file, offset, self.checkpoints)
+            self._buffer, self._pos, self._offset = b'', 0, offset
+            return offset
+        while offset > self._offset + len(self._buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                offset = self._offset + len(self._buffer)
+                break
+            self._offset += len(self._buffer)
+            self._buffer = chunk[1]
+        self._pos = offset - self._offset
+        return offset
+
+    def readline(self):
+        if self._chunks is None:
+            self.seek(0)
+        while True:
+            eol = self._buffer.find(b'\n', self._pos)
+            if eol >= 0:
+                line = self._buffer[self._pos:eol + 1]
+                self._pos = eol + 1
+                break
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                line = self._buffer[self._pos:]
+                self._pos = len(self._buffer)
+                break
+            self._offset += self._pos
+            self._buffer = self._buffer[self._pos:] + chunk[1]
+            self._pos = 0
+        if line.endswith(b'\r\n'):
+            line = line[:-2] + b'\n'
+        return line.decode('utf-8', errors='replace')
+
+
+def open_pgn(pgn_file, checkpoints=None):
+    """Opens a PGN for chess.pgn.read_game(), seek() takes game offsets.
+
+    Plain files are opened in text mode, compressed ones with a
+    PgnTextReader that restarts decompression from checkpoints.
+    """
+    if pgn_codec(pgn_file):
+        return PgnTextReader(pgn_file, checkpoints)
+    return open(pgn_file, encoding='utf-8', errors='replace')
+
+
+def open_pgn_output(pgn_file, mode='wb'):
+    """Opens a PGN for writing bytes, compressed as its extension says."""
+    codec = pgn_codec(pgn_file)
+    if codec:
+        if codec == 'gz':
+            return gzip.open(pgn_file, mode, compresslevel=6)
+        return (bz2.open if codec == 'bz2' else lzma.open)(pgn_file, mode)
+    return open(pgn_file, mode)
+
+
+def iter_pgn_game_bytes(pgn_file, games):
+    """Yields (game, data) with the bytes of each of games in pgn_file.
+
+    games are ascending (start, end, ...) tuples as yielded by
+    scan_pgn_games() and may be a generator, consumed as the file is read.
+    A compressed PGN is decompressed once, from the start.
+    """
+    if pgn_codec(pgn_file):
+        chunks = iter_pgn_bytes(pgn_file)
+        data, base = b'', 0  # data holds the decompressed bytes from base
+        try:
+            for game in games:
+                start, end = game[0], game[1]
+                while base + len(data) < end:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    if chunk[0] <= start:
+                        data, base = chunk[1], chunk[0]
+                    else:
+                        data = data[max(0, start - base):] + chunk[1]
+                        base = max(base, start)
+                yield game, data[start - base:end - base]
+        finally:
+            chunks.close()
+        return
+
+    with open(pgn_file, 'rb') as h:
+        if os.fstat(h.fileno()).st_size == 0:
+            return
+        with mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for game in games:
+                yield game, data[game[0]:game[1]]
+
+
+def write_pgn_game(out, data):
+    """Writes the bytes of a game, with a blank line after it if it has none."""
+    out.write(data)
+    if not data.endswith(b'\n'):
+        out.write(b'\n\n')
+    elif not PGN_BLANK_END_RE.search(data):
+        out.write(b'\n')
+
+
+def copy_pgn_games(pgn_file, ranges, out):
+    """Writes the games at ranges of pgn_file to out, byte for byte.
+
+    ranges are ascending (start, end) offsets, see iter_pgn_game_bytes().
+    Returns the number of games written.
+    """
+    count = 0
+    for _, data in iter_pgn_game_bytes(pgn_file, ranges):
+        write_pgn_game(out, data)
+        count += 1
+    return count
+
+
+# Byte-level PGN scanner, see scan_pgn_games(). It reads games the way
+# chess.pgn.read_game() reads lines: the tag section is the run of lines
+# starting with '[' (one blank line allowed between them, '%' and ';' lines
+# skipped) and the game ends at the first blank line outside a brace
+# comment. Like the python-chess tag regex the value runs to the last quote
+# of the line, so escaped quotes stay inside it and are kept as written.
+PGN_SPACE_RE = re.compile(rb'\s*')
+PGN_BLANK_END_RE = re.compile(rb'\n[ \t\r\f\v]*\n\Z')
+PGN_LINE_END_RE = re.compile(rb'\r\n?|\n')
+PGN_TAG_LINES_RE = re.compile(rb'(?:\[[^\n]*(?:\n|\Z))+')
+PGN_TAG_PAIR_RE = re.compile(
+    rb'^\[([A-Za-z0-9][A-Za-z0-9_+#=:-]*)\s+"([^\r\n]*)"\]\s*$', re.M)
+# Movetext tokens that matter for finding the end of a game outside a brace
+# comment: a comment start, a rest-of-line comment, an escape line and a
+# blank line.
+PGN_MOVETEXT_RE = re.compile(rb'\{|;|\n(?:%|[ \t\r\f\v]*\n)')
+PGN_BLANK_LINE_RE = re.compile(rb'\n[ \t\r\f\v]*\n')
+# Bytes that python-chess reads as a line break or as white space while the
+# byte scan does not: a lone CR, the ASCII separators and the UTF-8 encoded
+# Unicode spaces, whose first bytes are PGN_TEXT_SPACE_LEADS. A game with
+# any of them is read by python-chess, see _has_pgn_text_space().
+PGN_LONE_CR_RE = re.compile(rb'\r(?!\n)')
+PGN_TEXT_SPACE_RE = re.compile(
+    rb'[\x1c-\x1f]|\xc2[\x85\xa0]|\xe1\x9a\x80'
+    rb'|\xe2\x80[\x80-\x8a\xa8\xa9\xaf]|\xe2\x81\x9f|\xe3\x80\x80')
+PGN_TEXT_SPACE_LEADS = (b'\x1c', b'\x1d', b'\x1e', b'\x1f', b'\xc2', b'\xe1', b'\xe2', b'\xe3')
+
+
+def _has_pgn_text_space(data, start, end):
+    """True if data[start:end] has bytes matched by PGN_TEXT_SPACE_RE or a lone CR.
+
+    The leading bytes are looked for first, they are rare in PGN.
+    """
+    if data.find(b'\r', start, end) >= 0 and PGN_LONE_CR_RE.search(data, start, end):
+        return True
+    return any(data.find(lead, start, end) >= 0 for lead in PGN_TEXT_SPACE_LEADS) \
+        and PGN_TEXT_SPACE_RE.search(data, start, end) is not None
+
+
+class _PgnLineReader:
+    """Lines of data[start:size] as readline() of a PGN opened in text mode.
+
+    Lines end at LF, CRLF or a lone CR and are returned ending with LF;
+    pos is the byte position after the last line read.
+    """
+
+    def __init__(self, data, start, size):
+        self.data = data
+        self.pos = start
+        self.size = size
+
+    def readline(self):
+        if self.pos >= self.size:
+            return ''
+        m = PGN_LINE_END_RE.search(self.data, self.pos, self.size)
+        end = self.size if m is None else m.start()
+        line = self.data[self.pos:end].decode('utf-8', errors='replace')
+        self.pos = self.size if m is None else m.end()
+        return line if m is None else line + '\n'
+
+
+def _read_pgn_game_fallback(data, start, size):
+    """Returns (headers, end) of the game at start read by python-chess.
+
+    headers is None if there is no game before size.
+    """
+    h = _PgnLineReader(data, start, size)
+    headers = chess.pgn.read_headers(h)
+    return (dict(headers) if headers is not None else None), h.pos
+
+
+def _read_pgn_tags(data, pos, size):
+    """Returns (headers, movetext start) of the game starting at line pos."""
+    headers = {}
+    is_blank_seen = False
+    while pos < size:
+        if data[pos:pos + 1] == b'[':
+            # A run of tag lines, lines not matching a tag pair are ignored.
+            run_end = PGN_TAG_LINES_RE.match(data, pos, size).end()
+            for name, value in PGN_TAG_PAIR_RE.findall(data[pos:run_end]):
+                headers[name.decode('ascii')] = value.decode('utf-8', errors='replace')
+            is_blank_seen = False
+            pos = run_end
+            continue
+        eol = data.find(b'\n', pos, size)
+        next_pos = size if eol < 0 else eol + 1
+        if data[pos:pos + 1] in (b'%', b';'):
+            pos = next_pos
+            continue
+        if not is_blank_seen and data[pos:next_pos].isspace():
+            is_blank_seen = True
+            pos = next_pos
+            continue
+        break
+    return headers, pos
+
+
+def _find_pgn_game_end(data, pos, size):
+    """Returns the end of the game whose movetext starts at line pos.
+
+    The game ends after the first blank line outside a brace comment, or
+    at size. Brace comments do not nest and '}' outside one is ignored;
+    ';' comments and '%' escape lines are skipped. Up to a blank line
+    without those in between, the last brace tells whether the line is in
+    a comment: after '{' it is, after '}' it is not.
+    """
+    eol = data.find(b'\n', pos, size)
+    if eol >= 0 and data[pos:eol + 1].isspace():
+        return eol + 1
+    if data[pos:pos + 1] == b'%':
+        if eol < 0:
+            return size
+        pos = eol
+    while True:
+        m = PGN_BLANK_LINE_RE.search(data, pos, size)
+        stop = size if m is None else m.start()
+        if data.find(b';', pos, stop) >= 0 or data.find(b'\n%', pos, stop) >= 0:
+            break
+        if data.rfind(b'{', pos, stop) <= data.rfind(b'}', pos, stop):
+            return size if m is None else m.end()
+        close = data.find(b'}', stop, size)
+        if close < 0:
+            return size
+        pos = close + 1
+
+    while True:
+        m = PGN_MOVETEXT_RE.search(data, pos, size)
+        if m is None:
+            return size
+        token = data[m.start():m.end()]
+        if token == b'{':
+            close = data.find(b'}', m.end(), size)
+            if close < 0:
+                return size
+            pos = close + 1
+        elif token in (b';', b'\n%'):
+            pos = data.find(b'\n', m.end(), size)
+            if pos < 0:
+                return size
+        else:
+            return m.end()
+
+
+def _scan_pgn_data(data, pos, size, base=0, is_final=True):
+    """Yields (start, end, headers) of the games in data[pos:size].
+
+    Offsets are shifted by base. Returns the position of the first game not
+    yielded: with is_final False, a game reaching size may go on in the
+    next data and is left for it.
+    """
+    while True:
+        # Skip blank lines; a game starts at the start of its first line.
+        space_end = PGN_SPACE_RE.match(data, pos).end()
+        if space_end >= size:
+            return size
+        pos = max(pos, data.rfind(b'\n', pos, space_end) + 1)
+        eol = data.find(b'\n', pos, size)
+        if data[pos] in b';%' \
+                and not _has_pgn_text_space(data, pos, size if eol < 0 else eol):
+            # Comment or escape line between games.
+            if eol < 0 and not is_final:
+                return pos
+            pos = size if eol < 0 else eol + 1
+            continue
+
+        game_start = pos
+        headers, pos = _read_pgn_tags(data, pos, size)
+        end = _find_pgn_game_end(data, pos, size) if pos < size else size
+        if _has_pgn_text_space(data, game_start, end):
+            headers, end = _read_pgn_game_fallback(data, game_start, size)
+        if end >= size and not is_final:
+            return game_start
+        if headers is not None:
+            yield base + game_start, base + end, headers
+        pos = end
+
+
+def scan_pgn_games(pgn_file, start=0, checkpoints=None):
+    """Yields (start, end, headers) byte ranges and tags of the games in a PGN.
+
+    The file is memory-mapped; tag lines are matched with a regex and the
+    movetext is skipped with byte searches instead of being tokenized by
+    python-chess. Games are split and their tags read as by
+    chess.pgn.read_headers, which reads the games whose bytes the scan
+    could take differently, see _has_pgn_text_space(). start must be the start
+    of a game or 0. A game's range ends after the blank line ending it.
+
+    A compressed PGN is scanned the same way over decompressed chunks, with
+    offsets in the decompressed text. checkpoints, if given, are used to
+    start near start and get the gzip members or bz2 streams found.
+    """
+    if pgn_codec(pgn_file):
+        data = b''
+        base = start
+        for _, chunk in iter_pgn_bytes(pgn_file, start, checkpoints,
+                                       is_recording=checkpoints is not None):
+            data += chunk
+            pos = 3 if base == 0 and data[:3] == b'\xef\xbb\xbf' else 0
+            pos = yield from _scan_pgn_data(data, pos, len(data), base, is_final=False)
+            data = data[pos:]
+            base += pos
+        yield from _scan_pgn_data(data, 0, len(data), base)
+        return
+
+    with open(pgn_file, 'rb') as h:
+        size = os.fstat(h.fileno()).st_size
+        if size <= start:
+            return
+        with mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            pos = start
+            if pos == 0 and data[:3] == b'\xef\xbb\xbf':
+                pos = 3
+            yield from _scan_pgn_data(data, pos, size)
+
+
+class PgnIndex:
+    """Sidecar index of the games of a PGN file, saved as <pgn>.pecgidx.
+
+    The index covers the file prefix up to self.end, the position after the
+    last indexed game. It is reused while that prefix is unchanged: same
+    size and mtime, or else a matching crc32 of the PGN_INDEX_TAIL_BYTES
+    before self.end in a file that did not shrink. Games appended to the
+    file, or not scanned yet, are indexed from self.end instead of from the
+    start.
+
+    For a compressed PGN the offsets are in the decompressed text and the
+    index also keeps the decompression checkpoints, so that a game can be
+    read without decompressing the file from the start. It is only reused
+    for the same size and mtime; a changed file is indexed again.
+    """
+
+    def __init__(self, pgn_file):
+        self.pgn_file = pgn_file
+        self.index_file = pgn_file + PGN_INDEX_SUFFIX
+        self.games = []  # [{'offset': int, 'headers': dict}, ...]
+        self.end = 0
+        self.size = 0
+        self.mtime_ns = 0
+        self.tail_crc = 0
+        self.is_compressed = bool(pgn_codec(pgn_file))
+        self.is_eof = False  # whole compressed file scanned
+        self.checkpoints = []  # [(offset, compressed offset), ...]
+
+    def tail_crc32(self, end):
+        """Returns the crc32 of the PGN bytes just before end.
+
+        For a compressed PGN, of the last compressed bytes of the file.
+        """
+        if self.is_compressed:
+            end = os.path.getsize(self.pgn_file)
+        start = max(0, end - PGN_INDEX_TAIL_BYTES)
+        with open(self.pgn_file, 'rb') as h:
+            h.seek(start)
+            return zlib.crc32(h.read(end - start))
+
+    def load(self):
+        """Read the index file, returns True if it is valid for the PGN.
+
+        self.games is filled in place, readers may hold on to the list.
+        """
+        del self.games[:]
+        self.end = 0
+        self.is_eof = False
+        self.checkpoints = []
+        if not os.path.isfile(self.index_file):
+            return False
+        try:
+            st = os.stat(self.pgn_file)
+            with open(self.index_file, encoding='utf-8') as h:
+                meta = h.readline().rstrip('\n').split('\t')
+                if meta[0] != 'PECGIDX' or int(meta[1]) != PGN_INDEX_VERSION:
+                    return False
+                size, mtime_ns, end, tail_crc, is_eof = (int(v) for v in meta[2:7])
+                if st.st_size < size:
+                    return False
+                if (st.st_size, st.st_mtime_ns) != (size, mtime_ns) \
+                        and (self.is_compressed or self.tail_crc32(end) != tail_crc):
+                    logging.info('PGN index %s is stale.', self.index_file)
+                    return False
+                checkpoints = [tuple(int(v) for v in cp.split(','))
+                               for cp in h.readline().rstrip('\n').split('\t')[1:]]
+
+                games = []
+                for line in h:
+                    values = line.rstrip('\n').split('\t')
+                    headers = {k: v for k, v in zip(PGN_INDEX_HEADERS, values[1:]) if v}
+                    games.append({'offset': int(values[0]), 'headers': headers})
+        except Exception:
+            logging.exception('Failed to read PGN index %s.', self.index_file)
+            return False
+
+        self.games.extend(games)
+        self.end, self.tail_crc, self.is_eof = end, tail_crc, bool(is_eof)
+        if self.is_compressed:
+            self.checkpoints = checkpoints
+        self.size, self.mtime_ns = st.st_size, st.st_mtime_ns
+        return True
+
+    def save(self):
+        """Write the index file, a failure only costs a rescan next time.
+
+        The index is written to a temporary file of its own and renamed, so
+        a concurrent save of the same index cannot leave it half written.
+        """
+        tmp_file = None
+        try:
+            fd, tmp_file = tempfile.mkstemp(
+                suffix='.tmp', prefix=os.path.basename(self.index_file) + '.',
+                dir=os.path.dirname(os.path.abspath(self.index_file)))
+            with os.fdopen(fd, 'w', encoding='utf-8') as h:
+                h.write('PECGIDX\t{}\t{}\t{}\t{}\t{}\t{:d}\n'.format(
+                    PGN_INDEX_VERSION, self.size, self.mtime_ns, self.end,
+                    self.tail_crc, self.is_eof))
+                h.write('\t'.join(['CHECKPOINTS'] + [
+                    f'{offset},{compressed_offset}'
+                    for offset, compressed_offset in self.checkpoints]) + '\n')
+                for game in self.games:
+                    headers = game['headers']
+                    values = [str(game['offset'])] + [
+                        headers.get(k, '') for k in PGN_INDEX_HEADERS]
+                    h.write('\t'.join(values) + '\n')
+            os.replace(tmp_file, self.index_file)
+        except Exception:
+            logging.exception('Failed to write PGN index %s.', self.index_file)
+            if tmp_file is not None and os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+
+    def is_complete(self):
+        if self.is_compressed:
+            return self.is_eof
+        return self.end >= self.size
+
+    def update(self, max_games=None, stop_event=None):
+        """Index games from self.end until max_games are indexed or EOF.
+
+        Games are appended to self.games one by one, so another thread can
+        read the first ones while this runs. Setting stop_event stops early
+        and keeps what was indexed so far. Returns the number of games
+        added. The index file is rewritten when games were added or the PGN
+        stat changed.
+        """
+        st = os.stat(self.pgn_file)
+        is_new_stat = (st.st_size, st.st_mtime_ns) != (self.size, self.mtime_ns)
+        self.size, self.mtime_ns = st.st_size, st.st_mtime_ns
+
+        if self.is_compressed and is_new_stat and self.end:
+            # Compressed files are not appended to in place, index it again.
+            del self.games[:]
+            self.end, self.is_eof, self.checkpoints = 0, False, []
+        if self.is_compressed and not self.checkpoints:
+            self.checkpoints = pgn_checkpoints(self.pgn_file)
+
+        added = 0
+        if not self.is_complete() and (max_games is None or len(self.games) < max_games):
+            for start, end, headers in scan_pgn_games(
+                    self.pgn_file, self.end, self.checkpoints if self.is_compressed else None):
+                self.games.append({
+                    'offset': start,
+                    'headers': {k: ' '.join(headers[k].split())
+                                for k in PGN_INDEX_HEADERS if k in headers}})
+                self.end = end
+                added += 1
+                if max_games is not None and len(self.games) >= max_games:
+                    break
+                if stop_event is not None and stop_event.is_set():
+                    break
+            else:
+                self.is_eof = True
+                if not self.is_compressed:
+                    self.end = self.size
+
+        if added or is_new_stat:
+            self.tail_crc = self.tail_crc32(self.end)
+            self.save()
+        return added
+
+
+def pgn_date_key(date, is_upper=False):
+    """Returns PGN date 'YYYY.MM.DD' as int YYYYMMDD, 0 if the year is unknown.
+
+    Unknown month or day count as 00, or as 99 with is_upper so that a
+    partial date like '2024' works as the inclusive end of a range.
+    """
+    if date and len(date) == 10 and not is_upper:
+        try:
+            return int(date[:4]) * 10000 + int(date[5:7]) * 100 + int(date[8:])
+        except ValueError:
+            pass
+    parts = (date or '').strip().split('.')
+    try:
+        key = int(parts[0]) * 10000
+    except ValueError:
+        return 0
+    for i, scale in ((1, 100), (2, 1)):
+        try:
+            key += int(parts[i]) * scale
+        except (IndexError, ValueError):
+            if is_upper:
+                key += 9999 if scale == 100 else 99
+            break
+    return key
+
+
+class PgnHeaderFilter:
+    """Search index over the headers of a PgnIndex game list.
+
+    Names, events and ECO codes have inverted indexes from the lowercased
+    value to the game indexes, text criteria are matched as substrings of
+    the distinct values (ECO as a prefix). Date and Elo ranges use game
+    indexes sorted by key and bisect; games added after the last sort are
+    checked one by one until the unsorted tail is worth a new sort. update()
+    picks up games appended to the list since the last call.
+    """
+
+    TEXT_FIELDS = ('White', 'Black', 'Event', 'ECO')
+    RANGE_FIELDS = {'Date': 'L', 'WhiteElo': 'H', 'BlackElo': 'H'}
+
+    def __init__(self, games):
+        self.games = games
+        self.count = 0
+        self.postings = {f: {} for f in self.TEXT_FIELDS}
+        self.results = {}
+        self.keys = {f: array(t) for f, t in self.RANGE_FIELDS.items()}
+        self._sorted = {}  # field -> (game indexes by key, sorted keys)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def elo_key(value):
+        try:
+            elo = int(value)
+        except (TypeError, ValueError):
+            return 0
+        return elo if 0 <= elo <= 65535 else 0
+
+    def update(self):
+        """Index the games added to self.games since the last update."""
+        with self._lock:
+            self._update()
+
+    def _update(self):
+        # In batches, a database lists all its games at once.
+        while self.count < len(self.games):
+            self._update_batch(self.count, min(len(self.games),
+                                               self.count + PGN_FILTER_BATCH_GAMES))
+
+    def _update_batch(self, start, count):
+        new_headers = [g['headers'] for g in self.games[start:count]]
+
+        # Column by column, the per-game work stays in comprehensions.
+        for field in self.TEXT_FIELDS:
+            self._add_postings(self.postings[field], start,
+                               [h.get(field, '').lower() for h in new_headers])
+        self._add_postings(self.results, start,
+                           [h.get('Result', '*') for h in new_headers])
+        # Dates and ratings repeat a lot, parse each distinct value once.
+        for field, parse in (('Date', pgn_date_key), ('WhiteElo', self.elo_key),
+                             ('BlackElo', self.elo_key)):
+            column = [h.get(field) for h in new_headers]
+            parsed = {v: parse(v) for v in set(column)}
+            self.keys[field].extend([parsed[v] for v in column])
+        self.count = count
+
+    @staticmethod
+    def _add_postings(postings, start, values):
+        for i, value in enumerate(values, start):
+            if value:
+                ids = postings.get(value)
+                if ids is None:
+                    postings[value] = array('L', (i,))
+                else:
+                    ids.append(i)
+
+    def prepare(self):
+        """Index new games and sort the range keys ahead of the first search."""
+        with self._lock:
+            self._update()
+            for field in self.RANGE_FIELDS:
+                self._sorted_keys(field)
+
+    def _sorted_keys(self, field):
+        keys = self.keys[field]
+        order, sorted_keys = self._sorted.get(field, ((), ()))
+        if self.count - len(order) > len(order) // 4 + 1000:
+            order = array('L', sorted(range(self.count), key=keys.__getitem__))
+            sorted_keys = array(keys.typecode, (keys[i] for i in order))
+            self._sorted[field] = order, sorted_keys
+        return order, sorted_keys
+
+    def _range_matches(self, field, low, high):
+        """Returns the games with low <= key <= high, not sorted."""
+        order, sorted_keys = self._sorted_keys(field)
+        keys = self.keys[field]
+        matches = list(order[bisect.bisect_left(sorted_keys, low):
+                             bisect.bisect_right(sorted_keys, high)])
+        matches.extend(i for i in range(len(order), self.count)
+                       if low <= keys[i] <= high)
+        return matches
+
+    def _range_size(self, field, low, high):
+        """Upper bound of len(self._range_matches(field, low, high))."""
+        order, sorted_keys = self._sorted_keys(field)
+        return (bisect.bisect_right(sorted_keys, high) -
+                bisect.bisect_left(sorted_keys, low) + self.count - len(order))
+
+    def _match_text(self, field, text, is_prefix=False):
+        text = text.strip().lower()
+        postings = self.postings[field]
+        if is_prefix:
+            values = [v for v in postings if v.startswith(text)]
+        else:
+            values = [v for v in postings if text in v]
+        return set().union(*(postings[v] for v in values))
+
+    def search(self, white='', black='', player='', event='', eco='',
+               result='', date_from='', date_to='', elo_min=0, elo_max=0):
+        """Returns the sorted indexes of the games matching all criteria.
+
+        Empty criteria are ignored; player matches White or Black and the
+        Elo range applies to both players. Text criteria give candidate sets
+        that are intersected; the result and the ranges are checked on the
+        remaining candidates, or the smallest of them seeds the candidates
+        when there is no text criterion.
+        """
+        with self._lock:
+            self._update()
+            sets = []
+            if white:
+                sets.append(self._match_text('White', white))
+            if black:
+                sets.append(self._match_text('Black', black))
+            if player:
+                sets.append(self._match_text('White', player) |
+                            self._match_text('Black', player))
+            if event:
+                sets.append(self._match_text('Event', event))
+            if eco:
+                sets.append(self._match_text('ECO', eco, is_prefix=True))
+
+            ranges = []  # (field, low, high)
+            if date_from or date_to:
+                ranges.append(('Date', max(1, pgn_date_key(date_from)),
+                               pgn_date_key(date_to, is_upper=True) if date_to else 99999999))
+            if elo_min or elo_max:
+                for field in ('WhiteElo', 'BlackElo'):
+                    ranges.append((field, max(1, elo_min), elo_max or 65535))
+
+            if sets:
+                sets.sort(key=len)
+                candidates = sets[0].intersection(*sets[1:])
+            elif result and (not ranges or len(self.results.get(result, ())) <=
+                             min(self._range_size(*r) for r in ranges)):
+                candidates = self.results.get(result, ())
+                result = ''
+            elif ranges:
+                ranges.sort(key=lambda r: self._range_size(*r))
+                candidates = self._range_matches(*ranges.pop(0))
+            else:
+                return list(range(self.count))
+
+            for field, low, high in ranges:
+                keys = self.keys[field]
+                candidates = [i for i in candidates if low <= keys[i] <= high]
+            if result:
+                games = self.games
+                candidates = [i for i in candidates
+                              if games[i]['headers'].get('Result', '*') == result]
+            return sorted(candidates)
+
+
+class PgnGamesLoader(threading.Thread):
+    """Index the games of a PGN file in the background with PgnIndex.
+
+    self.games is the index's game list and grows while the thread runs, so
+    the first games can be listed and opened before the whole file is done.
+    """
+
+    def __init__(self, pgn_file):
+        super().__init__(daemon=True)
+        self.pgn_file = pgn_file
+        self.index = PgnIndex(pgn_file)
+        self.games = self.index.games
+        self.header_filter = PgnHeaderFilter(self.games)
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def read_game(self, game_entry):
+        """Returns the chess.pgn.Game of a game_entry of self.games."""
+        with open_pgn(self.pgn_file, self.index.checkpoints) as h:
+            h.seek(game_entry['offset'])
+            return chess.pgn.read_game(h)
+
+    def run(self):
+        try:
+            self.index.load()
+            self.index.update(stop_event=self._stop_event)
+            if not self._stop_event.is_set():
+                self.header_filter.prepare()
+        except Exception:
+            logging.exception('Failed to index PGN file %s.', self.pgn_file)
+            self.is_failed = True
+        finally:
+            self.is_done = True
+
+
+def encode_db_move(move):
+    """Returns the 16-bit PECGDB_MOVE code of a move: from, to and promotion."""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_db_move(code):
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 or None)
+
+
+class PecgDatabase:
+    """Compact binary game database, a <name>.pecgdb file.
+
+    Written by convert_pgn_to_db() and memory-mapped for reading. The
+    PGN_INDEX_HEADERS are stored per column as ids into a table of the
+    distinct values; the other tags of a game are one 'tag\\0value\\0' blob.
+    A game whose mainline has no comment, NAG, variation or error is stored
+    as PECGDB_MOVE codes, 2 bytes a ply; other games keep their movetext,
+    zlib-compressed. Every section has an end offset table, so a game is
+    found in O(1). The file ends with a JSON directory of the sections, its
+    length and PECGDB_MAGIC; arrays are in the byte order of the writer.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.count = 0
+        self._file = None
+        self._data = None
+        self._sections = {}  # name -> memoryview
+        self._values = {}  # tag -> distinct values, decoded on first use
+        self._is_swapped = False
+
+    def open(self):
+        """Map the file, raises ValueError if it is not a database."""
+        self.close()
+        self._file = open(self.db_file, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            length, magic = struct.unpack('<Q8s', self._data[-16:])
+            if magic != PECGDB_MAGIC or self._data[:8] != PECGDB_MAGIC:
+                raise ValueError(f'{self.db_file} is not a game database')
+            meta = json.loads(self._data[-16 - length:-16].decode('utf-8'))
+            if meta['version'] != PECGDB_VERSION:
+                raise ValueError(f'{self.db_file} has version {meta["version"]}')
+            self._is_swapped = meta['byteorder'] != sys.byteorder
+            for name, (offset, size, typecode) in meta['sections'].items():
+                view = memoryview(self._data)[offset:offset + size]
+                if typecode != 'B':
+                    if self._is_swapped:
+                        values = array(typecode, view.tobytes())
+                        values.byteswap()
+                        view.release()
+                        view = memoryview(values)
+                    else:
+                        view = view.cast(typecode)
+                self._sections[name] = view
+            self.count = meta['count']
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        for view in self._sections.values():
+            view.release()
+        self._sections = {}
+        self._values = {}
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.count = 0
+
+    def _blob(self, name, i):
+        """Returns item i of a blob section, by its end offset table."""
+        ends = self._sections[name + '_end']
+        return self._sections[name][ends[i - 1] if i else 0:ends[i]]
+
+    def _column_values(self, tag):
+        values = self._values.get(tag)
+        if values is None:
+            ends = self._sections['values_end.' + tag]
+            blob = self._sections['values.' + tag]
+            values = [None] + [bytes(blob[ends[i - 1] if i else 0:ends[i]]).decode('utf-8')
+                               for i in range(len(ends))]
+            self._values[tag] = values
+        return values
+
+    def index_headers(self, i):
+        """Returns the PGN_INDEX_HEADERS of game i, like a PgnIndex entry."""
+        headers = {}
+        for tag in PGN_INDEX_HEADERS:
+            value = self._column_values(tag)[self._sections['ids.' + tag][i]]
+            if value is not None:
+                headers[tag] = value
+        return headers
+
+    def headers(self, i):
+        """Returns all the tags of game i as chess.pgn.Headers."""
+        headers = chess.pgn.Headers(self.index_headers(i))
+        tags = bytes(self._blob('tags', i)).decode('utf-8').split('\0')
+        for name, value in zip(tags[0::2], tags[1::2]):
+            headers[name] = value
+        return headers
+
+    def read_game(self, i):
+        """Returns game i as a chess.pgn.Game."""
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        headers = self.headers(i)
+        data = self._blob('moves', i)
+        if self._sections['kinds'][i] == PECGDB_KIND_TEXT:
+            # The start position tags are needed to parse the movetext.
+            setup = ''.join(f'[{name} "{headers[name]}"]\n'
+                            for name in ('Variant', 'FEN', 'SetUp') if name in headers)
+            text = zlib.decompress(data).decode('utf-8')
+            game = chess.pgn.read_game(io.StringIO(setup + '\n' + text))
+            if game is None:
+                game = chess.pgn.Game()
+            game.headers = headers
+            return game
+        codes = array('H')
+        codes.frombytes(data)
+        if self._is_swapped:
+            codes.byteswap()
+        game = chess.pgn.Game()
+        game.headers = headers
+        node = game
+        for code in codes:
+            node = node.add_variation(decode_db_move(code))
+        return game
+
+
+class PecgDbGames:
+    """The games of a PecgDatabase as a read-only list of PgnIndex entries.
+
+    Entries are built on access; 'offset' is the game number.
+    """
+
+    def __init__(self, database):
+        self.database = database
+
+    def __len__(self):
+        return self.database.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return {'offset': i, 'headers': self.database.index_headers(i)}
+
+
+class PecgDbGamesLoader(threading.Thread):
+    """Open a PecgDatabase as the review game source, like PgnGamesLoader.
+
+    All games are listed as soon as the file is mapped; the thread then
+    only prepares the header filter. There is no PgnIndex, so Find
+    Position is not available for a database.
+    """
+
+    def __init__(self, db_file):
+        super().__init__(daemon=True)
+        self.pgn_file = db_file
+        self.index = None
+        self.database = PecgDatabase(db_file)
+        self.games = PecgDbGames(self.database)
+        self.header_filter = PgnHeaderFilter(self.games)
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def read_game(self, game_entry):
+        return self.database.read_game(game_entry['offset'])
+
+    def run(self):
+        try:
+            self.database.open()
+            if not self._stop_event.is_set():
+                self.header_filter.prepare()
+        except Exception:
+            logging.exception('Failed to open game database %s.', self.pgn_file)
+            self.is_failed = True
+        finally:
+            self.is_done = True
+
+
+class PositionKeysVisitor(chess.pgn.BaseVisitor):
+    """Collects the polyglot keys of the mainline positions of a game.
+
+    Variations are skipped and no game tree is built; read_game() returns
+    the keys from the start position on, one per ply. The piece part of the
+    key is updated from the squares whose piece changed since the previous
+    position instead of being hashed from scratch.
+    """
+
+    hasher = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+    def begin_game(self):
+        self.keys = []
+        self.masks = [0] * 12  # polyglot piece index -> squares
+        self.piece_key = 0
+
+    def visit_board(self, board):
+        random_array = self.hasher.array
+        black, white = board.occupied_co
+        masks = self.masks
+        key = self.piece_key
+        i = 0
+        for pieces in (board.pawns, board.knights, board.bishops,
+                       board.rooks, board.queens, board.kings):
+            for mask in (pieces & black, pieces & white):
+                diff = mask ^ masks[i]
+                if diff:
+                    masks[i] = mask
+                    for square in chess.scan_forward(diff):
+                        key ^= random_array[64 * i + square]
+                i += 1
+        self.piece_key = key
+        hasher = self.hasher
+        self.keys.append(key ^ hasher.hash_castling(board) ^
+                         hasher.hash_ep_square(board) ^ hasher.hash_turn(board))
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def handle_error(self, error):
+        pass
+
+    def result(self):
+        return self.keys
+
+
+def index_pgn_positions(pgn_file, offsets, first_game, checkpoints=None):
+    """Returns the POSITION_RECORD bytes of the games at offsets, sorted.
+
+    Games are numbered from first_game. A position repeated in a game is
+    recorded at its first ply only. checkpoints are those of a compressed
+    PGN, see open_pgn(). Runs in the worker processes of
+    PgnPositionIndex.build().
+    """
+    records = []
+    with open_pgn(pgn_file, checkpoints) as h:
+        for game, offset in enumerate(offsets, first_game):
+            h.seek(offset)
+            keys = chess.pgn.read_game(h, Visitor=PositionKeysVisitor)
+            seen = set()
+            for ply, key in enumerate((keys or [])[:0x10000]):
+                if key not in seen:
+                    seen.add(key)
+                    records.append((key, game, ply))
+    records.sort()
+    pack = POSITION_RECORD.pack
+    return b''.join([pack(*r) for r in records])
+
+
+class MainlineMovesVisitor(chess.pgn.BaseVisitor):
+    """Read only the headers and mainline moves of a game.
+
+    Comments, NAGs and variations are skipped, no GameNode is built. The
+    result is (headers dict, [uci move, ...]), cheap to send back from a
+    PgnParseService worker.
+    """
+
+    def begin_game(self):
+        self.headers = {}
+        self.moves = []
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        self.moves.append(move.uci())
+
+    def handle_error(self, error):
+        pass
+
+    def result(self):
+        return self.headers, self.moves
+
+
+def read_pgn_games(pgn_file, offsets, first_game=0, visitor=MainlineMovesVisitor,
+                   checkpoints=None):
+    """Returns [chess.pgn.read_game(Visitor=visitor) result] of the games at offsets.
+
+    Runs in the worker processes of PgnParseService.games().
+    """
+    with open_pgn(pgn_file, checkpoints) as h:
+        results = []
+        for offset in offsets:
+            h.seek(offset)
+            results.append(chess.pgn.read_game(h, Visitor=visitor))
+    return results
+
+
+class PgnParseService:
+    """Parse the games of a PGN in a process pool, in game order.
+
+    offsets are the game offsets recorded by a PgnIndex and checkpoints
+    those of a compressed PGN. The games are split in chunks of chunk_games
+    and each chunk is parsed in a worker process; results are yielded in
+    game order while at most two chunks per worker are in flight, so memory
+    stays bounded whatever the file size. A single chunk is parsed in this
+    process. Setting stop_event ends an iteration after the next chunk.
+    """
+
+    def __init__(self, pgn_file, offsets, checkpoints=None,
+                 chunk_games=PGN_PARSE_CHUNK_GAMES):
+        self.pgn_file = pgn_file
+        self.offsets = offsets
+        self.checkpoints = checkpoints or None
+        self.chunk_games = chunk_games
+
+    @classmethod
+    def from_index(cls, pgn_index, chunk_games=PGN_PARSE_CHUNK_GAMES):
+        return cls(pgn_index.pgn_file, [g['offset'] for g in pgn_index.games],
+                   pgn_index.checkpoints, chunk_games)
+
+    def map(self, func, first=0, stop_event=None):
+        """Yields (start, offsets, result) for each chunk of games from first.
+
+        result is func(pgn_file, offsets, start, checkpoints=...), start
+        being the index of the first game of the chunk. func must be a
+        module-level function or a functools.partial of one.
+        """
+        total = len(self.offsets)
+        n = self.chunk_games
+        chunks = ((start, list(self.offsets[start:start + n]))
+                  for start in range(first, total, n))
+        func = functools.partial(func, checkpoints=self.checkpoints)
+        if total - first <= n:
+            for start, offsets in chunks:
+                yield start, offsets, func(self.pgn_file, offsets, start)
+            return
+
+        workers = min(-(-(total - first) // n), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+
+            def submit():
+                for start, offsets in chunks:
+                    pending.append((start, offsets,
+                                    pool.submit(func, self.pgn_file, offsets, start)))
+                    break
+
+            for _ in range(2 * workers):
+                submit()
+            try:
+                while pending:
+                    start, offsets, future = pending.popleft()
+                    yield start, offsets, future.result()
+                    if stop_event is not None and stop_event.is_set():
+                        break
+                    submit()
+            finally:
+                for _, _, future in pending:
+                    future.cancel()
+
+    def games(self, visitor=MainlineMovesVisitor, first=0, stop_event=None):
+        """Yields (game index, visitor result) for each game from first.
+
+        The default visitor gives the headers and mainline moves only. The
+        result is None for an offset where python-chess finds no game.
+        """
+        parse = functools.partial(read_pgn_games, visitor=visitor)
+        for start, _, results in self.map(parse, first, stop_event):
+            yield from enumerate(results, start)
+
+
+class PgnPositionIndex:
+    """Index from polyglot Zobrist keys to games, saved as <pgn>.pecgpos.
+
+    Every distinct mainline position of a game is a POSITION_RECORD of
+    (key, game, ply), game being the index in the PgnIndex game list. The
+    records of each chunk of POSITION_INDEX_CHUNK_GAMES games are one
+    segment sorted by key, and find() binary searches every segment over
+    mmap. Games appended to the PGN go to new segments. The file ends with
+    a JSON directory of the segments, its length and POSITION_INDEX_MAGIC.
+
+    Like PgnIndex, the index covers the PGN prefix up to self.end and is
+    reused while the crc32 of the bytes before self.end is unchanged.
+    """
+
+    def __init__(self, pgn_file):
+        self.pgn_file = pgn_file
+        self.index_file = pgn_file + POSITION_INDEX_SUFFIX
+        self.count = 0  # games indexed
+        self.end = 0
+        self.tail_crc = 0
+        self.last_offset = -1
+        self.segments = []  # [[file offset, record count], ...]
+        self.data_end = 0
+
+    def load(self, pgn_index):
+        """Read the directory, returns True if it is valid for pgn_index."""
+        self.count, self.end, self.tail_crc, self.last_offset = 0, 0, 0, -1
+        self.segments, self.data_end = [], 0
+        if not os.path.isfile(self.index_file):
+            return False
+        try:
+            with open(self.index_file, 'rb') as h:
+                h.seek(-16, os.SEEK_END)
+                length, magic = struct.unpack('<Q8s', h.read(16))
+                if magic != POSITION_INDEX_MAGIC:
+                    return False
+                h.seek(-16 - length, os.SEEK_END)
+                data_end = h.tell()
+                meta = json.loads(h.read(length).decode('utf-8'))
+            if meta['version'] != POSITION_INDEX_VERSION:
+                return False
+            count, end = meta['count'], meta['end']
+            games = pgn_index.games
+            if count > len(games) or end > pgn_index.end \
+                    or (count and games[count - 1]['offset'] != meta['last_offset']) \
+                    or pgn_index.tail_crc32(end) != meta['tail_crc']:
+                logging.info('Position index %s is stale.', self.index_file)
+                return False
+        except Exception:
+            logging.exception('Failed to read position index %s.', self.index_file)
+            return False
+
+        self.count, self.end, self.tail_crc = count, end, meta['tail_crc']
+        self.last_offset = meta['last_offset']
+        self.segments = meta['segments']
+        self.data_end = data_end
+        return True
+
+    def _write_directory(self, h):
+        meta = json.dumps({
+            'version': POSITION_INDEX_VERSION, 'count': self.count,
+            'end': self.end, 'tail_crc': self.tail_crc,
+            'last_offset': self.last_offset, 'segments': self.segments
+        }).encode('utf-8')
+        h.seek(self.data_end)
+        h.write(meta + struct.pack('<Q8s', len(meta), POSITION_INDEX_MAGIC))
+        h.truncate()
+        h.flush()
+
+    def build(self, pgn_index, progress=None, stop_event=None):
+        """Index the games of pgn_index from self.count on.
+
+        Chunks of games are parsed by a PgnParseService. Segments are written in game order and the directory
+        after each one, so a stopped build keeps the chunks done so far.
+        progress(done, total) is called after each chunk. Returns the
+        number of games added.
+        """
+        offsets = [g['offset'] for g in pgn_index.games]
+        total, first = len(offsets), self.count
+        if first >= total:
+            return 0
+        service = PgnParseService(self.pgn_file, offsets, pgn_index.checkpoints,
+                                  POSITION_INDEX_CHUNK_GAMES)
+
+        mode = 'r+b' if first and os.path.isfile(self.index_file) else 'wb'
+        if mode == 'wb':
+            self.segments, self.data_end = [], 0
+        with open(self.index_file, mode) as h:
+            for start, chunk, data in service.map(index_pgn_positions, first, stop_event):
+                if data:
+                    self.segments.append([self.data_end, len(data) // POSITION_RECORD.size])
+                    h.seek(self.data_end)
+                    h.write(data)
+                    self.data_end += len(data)
+                self.count = start + len(chunk)
+                self.last_offset = chunk[-1]
+                self.end = offsets[self.count] if self.count < total else pgn_index.end
+                self.tail_crc = pgn_index.tail_crc32(self.end)
+                self._write_directory(h)
+                if progress is not None:
+                    progress(self.count, total)
+        return self.count - first
+
+    def find(self, key):
+        """Returns the (game, ply) of the records of key, sorted."""
+        if not self.segments:
+            return []
+        size = POSITION_RECORD.size
+        target = key.to_bytes(8, 'big')
+        hits = []
+        with open(self.index_file, 'rb') as h, \
+                mmap.mmap(h.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for offset, n in self.segments:
+                lo, hi = 0, n
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    pos = offset + mid * size
+                    if data[pos:pos + 8] < target:
+                        lo = mid + 1
+                    else:
+                        hi = mid
+                pos = offset + lo * size
+                end = offset + n * size
+                while pos < end and data[pos:pos + 8] == target:
+                    hits.append(POSITION_RECORD.unpack_from(data, pos)[1:])
+                    pos += size
+        hits.sort()
+        return hits
+
+
+class PgnPositionIndexBuilder(threading.Thread):
+    """Bring the PgnPositionIndex of a fully indexed PgnIndex up to date.
+
+    done and total report the progress; stop() ends the build after the
+    chunks in flight.
+    """
+
+    def __init__(self, pgn_index):
+        super().__init__(daemon=True)
+        self.pgn_index = pgn_index
+        self.position_index = PgnPositionIndex(pgn_index.pgn_file)
+        self.done = 0
+        self.total = len(pgn_index.games)
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _progress(self, done, total):
+        self.done = done
+
+    def run(self):
+        try:
+            self.position_index.load(self.pgn_index)
+            self.done = self.position_index.count
+            self.position_index.build(self.pgn_index, progress=self._progress,
+                                      stop_event=self._stop_event)
+        except Exception:
+            logging.exception('Failed to index positions of %s.',
+                              self.pgn_index.pgn_file)
+            self.is_failed = True
+        finally:
+            self.is_done = True
+
+
+class OpeningStatsVisitor(PositionKeysVisitor):
+    """Collects the headers and the first max_ply mainline moves of a game.
+
+    read_game() returns (headers, keys, moves, turns): moves[i] is the
+    encode_book_move() of the move played by turns[i] in the position of
+    polyglot key keys[i]. Later moves are not parsed.
+    """
+
+    def __init__(self, max_ply=EXPLORER_MAX_PLY):
+        super().__init__()
+        self.max_ply = max_ply
+
+    def begin_game(self):
+        super().begin_game()
+        self.headers = {}
+        self.moves = []
+        self.turns = []
+
+    def visit_header(self, tagname, tagvalue):
+        self.headers[tagname] = tagvalue
+
+    def begin_parse_san(self, board, san):
+        if len(self.moves) >= self.max_ply:
+            return chess.pgn.SKIP
+
+    def visit_move(self, board, move):
+        self.moves.append(encode_book_move(board, move))
+        self.turns.append(board.turn)
+
+    def visit_board(self, board):
+        # Also called after a skipped move, the board did not change then.
+        if len(self.keys) <= len(self.moves):
+            super().visit_board(board)
+
+    def result(self):
+        return self.headers, self.keys, self.moves, self.turns
+
+
+def encode_book_move(board, move):
+    """Returns move played in board as a polyglot book move.
+
+    Castling is encoded as the king capturing its rook, as polyglot does.
+    """
+    to_square = move.to_square
+    if board.is_castling(move) and not board.rooks & chess.BB_SQUARES[to_square]:
+        to_file = 7 if chess.square_file(to_square) > chess.square_file(move.from_square) else 0
+        to_square = chess.square(to_file, chess.square_rank(to_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return to_square | move.from_square << 6 | promotion << 12
+
+
+def decode_book_move(value):
+    """Returns the chess.Move of a polyglot book move, castling as king takes rook."""
+    promotion = value >> 12 & 7
+    return chess.Move((value >> 6) & 63, value & 63,
+                      promotion=promotion + 1 if promotion else None)
+
+
+def explore_pgn_games(pgn_file, offsets, first_game=0, max_ply=EXPLORER_MAX_PLY,
+                      min_elo=0, results=('1-0', '1/2-1/2', '0-1'),
+                      is_mover_view=False, checkpoints=None):
+    """Returns the EXPLORER_RECORD bytes of the games at offsets, sorted.
+
+    Moves played in the same position are added up over the first max_ply
+    plies of the games with one of results whose players are both rated
+    min_elo or more. With is_mover_view the white and black columns count
+    the wins and losses of the side that played the move. first_game is not
+    used, see PgnParseService.map(); checkpoints are those of a compressed
+    PGN, see open_pgn(). Runs in the worker processes of
+    OpeningExplorer.build() and PolyglotBookBuilder.
+    """
+    stats = {}  # (key, move) -> [games, white, draws, black, elo sum, elos, date]
+    outcomes = {'1-0': (1, 0, 0), '1/2-1/2': (0, 1, 0), '0-1': (0, 0, 1)}
+    outcomes = {r: outcomes[r] for r in results if r in outcomes}
+    with open_pgn(pgn_file, checkpoints) as h:
+        for offset in offsets:
+            h.seek(offset)
+            game = chess.pgn.read_game(h, Visitor=lambda: OpeningStatsVisitor(max_ply))
+            if game is None:
+                continue
+            headers, keys, moves, turns = game
+            outcome = outcomes.get(headers.get('Result'))
+            if outcome is None:
+                continue
+            elos = [PgnHeaderFilter.elo_key(headers.get('WhiteElo')),
+                    PgnHeaderFilter.elo_key(headers.get('BlackElo'))]
+            if min_elo and min(elos) < min_elo:
+                continue
+            elos = [elo for elo in elos if elo]
+            elo_sum, elo_count = sum(elos), len(elos)
+            date = pgn_date_key(headers.get('Date'))
+            for key, move, turn in zip(keys, moves, turns):
+                white, draw, black = outcome
+                if is_mover_view and turn == chess.BLACK:
+                    white, black = black, white
+                entry = stats.get((key, move))
+                if entry is None:
+                    stats[(key, move)] = [
+                        1, white, draw, black, elo_sum, elo_count, date]
+                else:
+                    entry[0] += 1
+                    entry[1] += white
+                    entry[2] += draw
+                    entry[3] += black
+                    entry[4] += elo_sum
+                    entry[5] += elo_count
+                    if date > entry[6]:
+                        entry[6] = date
+    pack = EXPLORER_RECORD.pack
+    return b''.join([pack(*k, *stats[k]) for k in sorted(stats)])
+
+
+def merge_explorer_runs(runs):
+    """Yields the records of the EXPLORER_RECORD runs merged in order.
+
+    Each run is an iterable of record tuples sorted by (key, move); records
+    of the same key and move are added up, keeping the latest date. Only one
+    record per run is held in memory.
+    """
+    current = None
+    for record in heapq.merge(*runs):
+        if current is not None and record[0] == current[0] and record[1] == current[1]:
+            for i in range(2, 8):
+                current[i] += record[i]
+            current[8] = max(current[8], record[8])
+            continue
+        if current is not None:
+            yield current
+        current = list(record)
+    if current is not None:
+        yield current
+
+
+def write_explorer_records(records, h):
+    """Write EXPLORER_RECORD tuples to file h, returns the number written."""
+    pack = EXPLORER_RECORD.pack
+    count = 0
+    out = []
+    for record in records:
+        out.append(pack(*record))
+        if len(out) >= 65536:
+            h.write(b''.join(out))
+            count += len(out)
+            out = []
+    h.write(b''.join(out))
+    return count + len(out)
+
+
+class OpeningExplorer:
+    """Move statistics per position of a PGN database, saved as <pgn>.pecgexp.
+
+    An EXPLORER_RECORD holds the games, white wins, draws, black wins, Elo
+    sum and count and latest date of one move in one position, for the
+    first EXPLORER_MAX_PLY plies of every game. Records are sorted by
+    (polyglot key, move) and the file is memory-mapped, so lookup() is a
+    binary search. The file ends with a JSON directory, its length and
+    EXPLORER_MAGIC, and is validated against the PgnIndex like
+    PgnPositionIndex.
+
+    build() aggregates chunks of games in worker processes, spills each
+    chunk's sorted records to <pgn>.pecgexp.runs and merges the runs, with
+    the current records when games were appended, into a new file.
+    """
+
+    def __init__(self, pgn_file):
+        self.pgn_file = pgn_file
+        self.explorer_file = pgn_file + EXPLORER_SUFFIX
+        self.count = 0  # games aggregated
+        self.end = 0
+        self.tail_crc = 0
+        self.last_offset = -1
+        self.records = 0
+        self._file = None
+        self._data = None
+
+    def load(self, pgn_index):
+        """Map the explorer file, returns True if it is valid for pgn_index."""
+        self.close()
+        self.count, self.end, self.tail_crc, self.last_offset = 0, 0, 0, -1
+        self.records = 0
+        if not os.path.isfile(self.explorer_file):
+            return False
+        try:
+            with open(self.explorer_file, 'rb') as h:
+                h.seek(-16, os.SEEK_END)
+                length, magic = struct.unpack('<Q8s', h.read(16))
+                if magic != EXPLORER_MAGIC:
+                    return False
+                h.seek(-16 - length, os.SEEK_END)
+                data_end = h.tell()
+                meta = json.loads(h.read(length).decode('utf-8'))
+            if meta['version'] != EXPLORER_VERSION:
+                return False
+            count, end = meta['count'], meta['end']
+            games = pgn_index.games
+            if count > len(games) or end > pgn_index.end \
+                    or (count and games[count - 1]['offset'] != meta['last_offset']) \
+                    or pgn_index.tail_crc32(end) != meta['tail_crc']:
+                logging.info('Opening explorer %s is stale.', self.explorer_file)
+                return False
+            self._file = open(self.explorer_file, 'rb')
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            logging.exception('Failed to read opening explorer %s.', self.explorer_file)
+            self.close()
+            return False
+
+        self.count, self.end, self.tail_crc = count, end, meta['tail_crc']
+        self.last_offset = meta['last_offset']
+        self.records = data_end // EXPLORER_RECORD.size
+        return True
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def build(self, pgn_index, progress=None, stop_event=None):
+        """Add the games of pgn_index from self.count on.
+
+        progress(done, total) is called after each chunk. A stopped build
+        leaves the current file as it is. Returns the number of games added.
+        """
+        service = PgnParseService.from_index(pgn_index, EXPLORER_CHUNK_GAMES)
+        total, first = len(service.offsets), self.count
+        if first >= total:
+            return 0
+
+        runs_file = self.explorer_file + '.runs'
+        tmp_file = self.explorer_file + '.tmp'
+        runs = []  # (offset, size) in runs_file
+        try:
+            with open(runs_file, 'wb') as h:
+                for start, chunk, data in service.map(explore_pgn_games, first, stop_event):
+                    runs.append((h.tell(), len(data)))
+                    h.write(data)
+                    if progress is not None:
+                        progress(start + len(chunk), total)
+                    if stop_event is not None and stop_event.is_set():
+                        return 0
+
+            with open(runs_file, 'rb') as runs_h, open(tmp_file, 'wb') as h:
+                run_data = mmap.mmap(runs_h.fileno(), 0, access=mmap.ACCESS_READ) \
+                    if os.path.getsize(runs_file) else None
+                views = [memoryview(run_data)[offset:offset + size]
+                         for offset, size in runs if size]
+                if self._data is not None and self.records:
+                    views.append(memoryview(self._data)[:self.records * EXPLORER_RECORD.size])
+                try:
+                    write_explorer_records(merge_explorer_runs(
+                        [EXPLORER_RECORD.iter_unpack(view) for view in views]), h)
+                finally:
+                    for view in views:
+                        view.release()
+                    if run_data is not None:
+                        run_data.close()
+
+                self.count = total
+                self.last_offset = service.offsets[-1]
+                self.end = pgn_index.end
+                self.tail_crc = pgn_index.tail_crc32(self.end)
+                meta = json.dumps({
+                    'version': EXPLORER_VERSION, 'count': self.count,
+                    'end': self.end, 'tail_crc': self.tail_crc,
+                    'last_offset': self.last_offset
+                }).encode('utf-8')
+                h.write(meta + struct.pack('<Q8s', len(meta), EXPLORER_MAGIC))
+
+            # The old file must be unmapped before it can be replaced on Windows.
+            self.close()
+            os.replace(tmp_file, self.explorer_file)
+        finally:
+            for file in (runs_file, tmp_file):
+                if os.path.isfile(file):
+                    os.remove(file)
+        self.load(pgn_index)
+        return total - first
+
+    def lookup(self, board):
+        """Returns the moves played in board, most played first.
+
+        Each move is a dict with the move, games, white, draws and black
+        counts, the average Elo (0 if unknown) and the latest date key.
+        """
+        if self._data is None or not self.records:
+            return []
+        data = self._data
+        size = EXPLORER_RECORD.size
+        target = chess.polyglot.zobrist_hash(board).to_bytes(8, 'big')
+        lo, hi = 0, self.records
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[mid * size:mid * size + 8] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        moves = []
+        pos = lo * size
+        while lo < self.records and data[pos:pos + 8] == target:
+            _, move, games, white, draws, black, elo_sum, elo_count, date = \
+                EXPLORER_RECORD.unpack_from(data, pos)
+            moves.append({
+                'move': decode_book_move(move), 'games': games, 'white': white,
+                'draws': draws, 'black': black,
+                'elo': elo_sum // elo_count if elo_count else 0, 'date': date})
+            lo += 1
+            pos += size
+        moves.sort(key=lambda m: -m['games'])
+        return moves
+
+
+class OpeningExplorerBuilder(threading.Thread):
+    """Index a PGN file and bring its OpeningExplorer up to date.
+
+    done and total report the progress of the current phase, 'index' while
+    the PgnIndex is updated and 'explorer' while moves are aggregated.
+    """
+
+    def __init__(self, pgn_file):
+        super().__init__(daemon=True)
+        self.pgn_file = pgn_file
+        self.explorer = OpeningExplorer(pgn_file)
+        self.phase = 'index'
+        self.done = 0
+        self.total = 0
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _progress(self, done, total):
+        self.done, self.total = done, total
+
+    def run(self):
+        try:
+            pgn_index = PgnIndex(self.pgn_file)
+            pgn_index.load()
+            pgn_index.update(stop_event=self._stop_event)
+            if self._stop_event.is_set():
+                return
+            self.phase = 'explorer'
+            self.explorer.load(pgn_index)
+            self.done, self.total = self.explorer.count, len(pgn_index.games)
+            self.explorer.build(pgn_index, progress=self._progress,
+                                stop_event=self._stop_event)
+        except Exception:
+            logging.exception('Failed to build opening explorer for %s.',
+                              self.pgn_file)
+            self.is_failed = True
+        finally:
+            self.is_done = True
+
+
+def write_polyglot_book(records, h, min_games=1):
+    """Write the merged mover view EXPLORER_RECORD tuples as polyglot entries.
+
+    A move weighs 2 per win and 1 per draw of the side that played it;
+    moves below min_games games or without a point are left out. Weights of
+    a position are scaled down to fit 16 bits when needed. Records come
+    sorted by key, so the book is too. Returns the number of entries.
+    """
+    pack = chess.polyglot.ENTRY_STRUCT.pack
+    count = 0
+    out = []
+
+    def flush_key(key, moves):
+        top = max(weight for _, weight in moves)
+        scale = 65535 / top if top > 65535 else 1
+        for move, weight in sorted(moves, key=lambda m: -m[1]):
+            out.append(pack(key, move, max(1, int(weight * scale)), 0))
+
+    key, moves = None, []
+    for record in records:
+        if record[0] != key:
+            if moves:
+                flush_key(key, moves)
+                count += len(moves)
+            key, moves = record[0], []
+            if len(out) >= 65536:
+                h.write(b''.join(out))
+                out = []
+        games, wins, draws = record[2], record[3], record[4]
+        weight = 2 * wins + draws
+        if games >= min_games and weight:
+            moves.append((record[1], weight))
+    if moves:
+        flush_key(key, moves)
+        count += len(moves)
+    h.write(b''.join(out))
+    return count
+
+
+class PolyglotBookBuilder(threading.Thread):
+    """Build a polyglot book from PGN files in the background.
+
+    Each file is indexed with PgnIndex and its games are aggregated per
+    position and move by explore_pgn_games() in worker processes. The
+    sorted records of every chunk are spilled to <book>.runs and merged
+    with heapq.merge, so memory stays bounded by the chunk size and the
+    number of runs. phase, done and total report the progress.
+    """
+
+    def __init__(self, pgn_files, book_file, max_ply=BOOK_BUILD_MAX_PLY,
+                 min_elo=0, results=('1-0', '1/2-1/2', '0-1'), min_games=1):
+        super().__init__(daemon=True)
+        self.pgn_files = pgn_files
+        self.book_file = book_file
+        self.max_ply = max_ply
+        self.min_elo = min_elo
+        self.results = tuple(results)
+        self.min_games = min_games
+        self.phase = 'index'
+        self.done = 0
+        self.total = 0
+        self.entries = 0
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _progress(self, done, total):
+        self.done, self.total = done, total
+
+    def run(self):
+        runs_file = self.book_file + '.runs'
+        tmp_file = self.book_file + '.tmp'
+        parse = functools.partial(
+            explore_pgn_games, max_ply=self.max_ply, min_elo=self.min_elo,
+            results=self.results, is_mover_view=True)
+        try:
+            runs = []  # (offset, size) in runs_file
+            with open(runs_file, 'wb') as h:
+                for pgn_file in self.pgn_files:
+                    self.phase = f'index {os.path.basename(pgn_file)}'
+                    pgn_index = PgnIndex(pgn_file)
+                    pgn_index.load()
+                    pgn_index.update(stop_event=self._stop_event)
+                    service = PgnParseService.from_index(pgn_index, EXPLORER_CHUNK_GAMES)
+                    total = len(service.offsets)
+                    self.phase = f'parse {os.path.basename(pgn_file)}'
+                    self._progress(0, total)
+                    for start, chunk, data in service.map(parse, stop_event=self._stop_event):
+                        if data:
+                            runs.append((h.tell(), len(data)))
+                            h.write(data)
+                        self._progress(start + len(chunk), total)
+                    if self._stop_event.is_set():
+                        return
+
+            self.phase = 'write'
+            with open(runs_file, 'rb') as runs_h, open(tmp_file, 'wb') as h:
+                if runs:
+                    run_data = mmap.mmap(runs_h.fileno(), 0, access=mmap.ACCESS_READ)
+                    views = [memoryview(run_data)[offset:offset + size]
+                             for offset, size in runs]
+                    try:
+                        self.entries = write_polyglot_book(merge_explorer_runs(
+                            [EXPLORER_RECORD.iter_unpack(view) for view in views]),
+                            h, self.min_games)
+                    finally:
+                        for view in views:
+                            view.release()
+                        run_data.close()
+            # An open reader keeps the old book mapped.
+            book_registry.close(self.book_file)
+            os.replace(tmp_file, self.book_file)
+        except Exception:
+            logging.exception('Failed to build polyglot book %s.', self.book_file)
+            self.is_failed = True
+        finally:
+            for file in (runs_file, tmp_file):
+                if os.path.isfile(file):
+                    os.remove(file)
+            self.is_done = True
+
+
+def pgn_tmp_file(pgn_file):
+    """Returns a temporary name next to pgn_file with the same codec suffix."""
+    base, ext = os.path.splitext(pgn_file)
+    if not pgn_codec(pgn_file):
+        base, ext = pgn_file, ''
+    return base + '.tmp' + ext
+
+
+def delete_player_games(pgn_file, name, progress=None):
+    """Tools -> PGN -> Delete Player: remove the games of player name from pgn_file.
+
+    Games are dropped by their White and Black tags and the other games
+    are copied byte for byte to out_<pgn>, compressed like pgn_file, see
+    copy_pgn_games(). When games were dropped the original file is kept as
+    <pgn>.backup, a hard link when the file system allows it, and the copy
+    replaces it; otherwise pgn_file is left as it is. progress gets
+    ('scan', games) at most every PGN_TOOL_PROGRESS_SEC. Returns (games,
+    deleted).
+    """
+    folder, base = os.path.split(pgn_file)
+    out_file = os.path.join(folder, 'out_' + base)
+    backup_file = pgn_file + '.backup'
+    games = deleted = 0
+    report_time = time.perf_counter()
+
+    def kept_games():
+        nonlocal games, deleted, report_time
+        for start, end, headers in scan_pgn_games(pgn_file):
+            games += 1
+            if progress is not None and \
+                    time.perf_counter() - report_time >= PGN_TOOL_PROGRESS_SEC:
+                report_time = time.perf_counter()
+                progress('scan', games)
+            if name in (headers.get('White', '?'), headers.get('Black', '?')):
+                deleted += 1
+            else:
+                yield start, end
+
+    try:
+        with open_pgn_output(out_file) as out:
+            copy_pgn_games(pgn_file, kept_games(), out)
+        if deleted:
+            # The original file becomes the backup, the output replaces it.
+            if os.path.exists(backup_file):
+                os.remove(backup_file)
+            try:
+                os.link(pgn_file, backup_file)
+            except OSError:
+                shutil.copyfile(pgn_file, backup_file)
+            os.replace(out_file, pgn_file)
+    finally:
+        if os.path.isfile(out_file):
+            os.remove(out_file)
+    return games, deleted
+
+
+def merge_pgn_files(pgn_files, out_file, progress=None, stop_event=None):
+    """Tools -> PGN -> Merge: write the games of pgn_files to out_file.
+
+    The files are copied as they are, decompressed if needed, with a blank
+    line between them. Returns the number of files merged.
+    """
+    tmp_file = pgn_tmp_file(out_file)
+    try:
+        with open_pgn_output(tmp_file) as out:
+            for i, pgn_file in enumerate(pgn_files):
+                if progress is not None:
+                    progress(f'merge {os.path.basename(pgn_file)}', i, len(pgn_files))
+                with open(pgn_file, 'rb') as h:
+                    if pgn_codec(pgn_file):
+                        chunks = (data for _, data in iter_pgn_bytes(pgn_file))
+                    else:
+                        chunks = iter(functools.partial(h.read, PGN_READ_BYTES), b'')
+                    tail = b''
+                    for data in chunks:
+                        if not tail and data.startswith(b'\xef\xbb\xbf'):
+                            data = data[3:]
+                        out.write(data)
+                        tail = (tail + data)[-2:]
+                        if stop_event is not None and stop_event.is_set():
+                            return 0
+                if tail and tail != b'\n\n':
+                    out.write(b'\n' if tail.endswith(b'\n') else b'\n\n')
+        os.replace(tmp_file, out_file)
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+    return len(pgn_files)
+
+
+def pgn_split_values(headers, by):
+    """Returns the values a game is filed under when split by player, event or year."""
+    if by == 'player':
+        return {headers.get('White', '?'), headers.get('Black', '?')}
+    if by == 'event':
+        return {headers.get('Event', '?')}
+    return {headers.get('Date', '?')[:4]}
+
+
+def split_pgn_file(pgn_file, out_dir, by='player', progress=None, stop_event=None):
+    """Tools -> PGN -> Split: write the games of a PGN to a file per value.
+
+    by is 'player', 'event' or 'year'; a game is written to
+    <out_dir>/<pgn name>-<value>.pgn, compressed like pgn_file, and by
+    player to the files of both players. Games are copied byte for byte and
+    at most PGN_SPLIT_OPEN_FILES output files are kept open. Returns
+    (games, files).
+    """
+    name = os.path.basename(pgn_file)
+    ext = '.pgn' + (os.path.splitext(name)[1] if pgn_codec(name) else '')
+    stem = name[:-len(ext)] if name.lower().endswith(ext.lower()) else os.path.splitext(name)[0]
+    files = {}  # casefolded file name -> path
+    handles = OrderedDict()  # path -> open file, least recently used first
+    games = 0
+    try:
+        for (_, _, headers), data in iter_pgn_game_bytes(pgn_file, scan_pgn_games(pgn_file)):
+            for value in sorted(pgn_split_values(headers, by)):
+                value = re.sub(r'[^\w.-]+', '_', value).strip('._') or 'unknown'
+                path = os.path.join(out_dir, f'{stem}-{value}{ext}')
+                # One file for names differing in case only, as on Windows.
+                is_new = path.casefold() not in files
+                path = files.setdefault(path.casefold(), path)
+                h = handles.pop(path, None)
+                if h is None:
+                    if len(handles) >= PGN_SPLIT_OPEN_FILES:
+                        handles.popitem(last=False)[1].close()
+                    h = open_pgn_output(path, 'wb' if is_new else 'ab')
+                handles[path] = h
+                write_pgn_game(h, data)
+            games += 1
+            if progress is not None and games % 1000 == 0:
+                progress('split', games)
+            if stop_event is not None and stop_event.is_set():
+                break
+    finally:
+        for h in handles.values():
+            h.close()
+    return games, len(files)
+
+
+def pgn_sort_key(headers, by):
+    """Returns the bytes that order a game by date or by ECO then date.
+
+    Games without a date or an ECO code come last.
+    """
+    date = pgn_date_key(headers.get('Date')) or 0xffffffff
+    key = struct.pack('>I', date)
+    if by == 'eco':
+        eco = headers.get('ECO', '').strip().upper()[:3]
+        key = (eco.encode('ascii', 'replace').ljust(3) if eco else b'\xff' * 3) + key
+    return key
+
+
+def _iter_pgn_sort_run(runs_file, offset, size):
+    """Yields the (key, game bytes) records of a sort run."""
+    with open(runs_file, 'rb') as h:
+        h.seek(offset)
+        while size > 0:
+            key_size, data_size = PGN_SORT_RECORD.unpack(h.read(PGN_SORT_RECORD.size))
+            key = h.read(key_size)
+            yield key, h.read(data_size)
+            size -= PGN_SORT_RECORD.size + key_size + data_size
+
+
+def sort_pgn_file(pgn_file, out_file, by='date', progress=None, stop_event=None):
+    """Tools -> PGN -> Sort: write the games of a PGN sorted by date or ECO.
+
+    An external merge sort: runs of up to PGN_SORT_RUN_BYTES of games are
+    sorted in memory and spilled to <out>.runs, then merged with
+    heapq.merge. Equal keys keep the file order. Games are copied byte for
+    byte. Returns the number of games.
+    """
+    runs_file = out_file + '.runs'
+    tmp_file = pgn_tmp_file(out_file)
+    runs = []  # (offset, size) in runs_file
+    games = 0
+    try:
+        with open(runs_file, 'wb') as h:
+            run, run_size = [], 0
+
+            def spill():
+                run.sort(key=lambda r: r[0])
+                offset = h.tell()
+                for key, data in run:
+                    h.write(PGN_SORT_RECORD.pack(len(key), len(data)))
+                    h.write(key)
+                    h.write(data)
+                runs.append((offset, h.tell() - offset))
+                del run[:]
+
+            for (_, _, headers), data in iter_pgn_game_bytes(pgn_file, scan_pgn_games(pgn_file)):
+                run.append((pgn_sort_key(headers, by), data))
+                run_size += len(data)
+                games += 1
+                if run_size >= PGN_SORT_RUN_BYTES:
+                    spill()
+                    run_size = 0
+                if progress is not None and games % 1000 == 0:
+                    progress('read', games)
+                if stop_event is not None and stop_event.is_set():
+                    return 0
+            if run:
+                spill()
+
+        with open_pgn_output(tmp_file) as out:
+            written = 0
+            for _, data in heapq.merge(
+                    *[_iter_pgn_sort_run(runs_file, offset, size) for offset, size in runs],
+                    key=lambda r: r[0]):
+                write_pgn_game(out, data)
+                written += 1
+                if progress is not None and written % 1000 == 0:
+                    progress('write', written, games)
+                if stop_event is not None and stop_event.is_set():
+                    return 0
+        os.replace(tmp_file, out_file)
+    finally:
+        for file in (runs_file, tmp_file):
+            if os.path.isfile(file):
+                os.remove(file)
+    return games
+
+
+class GameDedupKeyVisitor(MainlineMovesVisitor):
+    """The PGN_DEDUP_HEADERS and mainline moves of a game as bytes.
+
+    Header values are compared casefolded with whitespace collapsed, so
+    copies of a game that differ only in formatting or annotation get the
+    same key.
+    """
+
+    def result(self):
+        values = [' '.join(self.headers.get(name, '').split()).casefold()
+                  for name in PGN_DEDUP_HEADERS]
+        return (''.join(value + '\0' for value in values).encode('utf-8') +
+                ' '.join(self.moves).encode('ascii'))
+
+
+def pgn_game_digest(key):
+    """Returns the 64-bit digest of a GameDedupKeyVisitor key."""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+class GameDigestVisitor(GameDedupKeyVisitor):
+    """Hash the GameDedupKeyVisitor key of a game to 64 bits."""
+
+    def result(self):
+        return pgn_game_digest(super().result())
+
+
+def dedup_pgn_file(pgn_file, out_file, progress=None, stop_event=None):
+    """Tools -> PGN -> Deduplicate: write the games of a PGN without repeats.
+
+    Every game is hashed by GameDigestVisitor in a PgnParseService; the
+    first game with a digest is kept and copied byte for byte. Digests are
+    8 bytes a game, repeats are found with a PGN_DEDUP_FILTER_BYTES bit
+    table and a set of the few digests seen twice in it. The games with a
+    repeated digest are parsed again for their GameDedupKeyVisitor keys and
+    a game is dropped only when its key equals that of a game kept, so a
+    digest collision never drops a distinct game. Returns (games,
+    duplicates).
+    """
+    codec = pgn_codec(pgn_file)
+    checkpoints = pgn_checkpoints(pgn_file)
+    starts, ends = array('Q'), array('Q')
+    for start, end, _ in scan_pgn_games(pgn_file, 0, checkpoints if codec else None):
+        starts.append(start)
+        ends.append(end)
+        if progress is not None and len(starts) % 1000 == 0:
+            progress('scan', len(starts))
+        if stop_event is not None and stop_event.is_set():
+            return 0, 0
+    total = len(starts)
+
+    digests = array('Q')
+    service = PgnParseService(pgn_file, starts, checkpoints)
+    for i, digest in service.games(GameDigestVisitor, stop_event=stop_event):
+        if digest is None:
+            # Not a game for python-chess, never a duplicate.
+            digest = int.from_bytes(hashlib.blake2b(
+                b'offset %d' % starts[i], digest_size=8).digest(), 'big')
+        digests.append(digest)
+        if progress is not None and len(digests) % 1000 == 0:
+            progress('hash', len(digests), total)
+    if stop_event is not None and stop_event.is_set():
+        return 0, 0
+
+    bits = bytearray(PGN_DEDUP_FILTER_BYTES)
+    mask = len(bits) * 8 - 1
+    repeated = set()
+    for digest in digests:
+        bit = digest & mask
+        if bits[bit >> 3] & (1 << (bit & 7)):
+            repeated.add(digest)
+        else:
+            bits[bit >> 3] |= 1 << (bit & 7)
+    del bits
+
+    candidates = array('Q', (i for i, digest in enumerate(digests) if digest in repeated))
+    kept_keys = {}  # digest -> keys of the games kept
+    dropped = set()
+    service = PgnParseService(pgn_file, array('Q', (starts[i] for i in candidates)),
+                              checkpoints)
+    for j, key in service.games(GameDedupKeyVisitor, stop_event=stop_event):
+        if progress is not None and j % 1000 == 0:
+            progress('compare', j, len(candidates))
+        if key is None:
+            continue
+        keys = kept_keys.setdefault(digests[candidates[j]], [])
+        if key in keys:
+            dropped.add(candidates[j])
+        else:
+            keys.append(key)
+    if stop_event is not None and stop_event.is_set():
+        return 0, 0
+    del kept_keys
+
+    def kept_games():
+        for i in range(total):
+            if i not in dropped:
+                yield starts[i], ends[i]
+
+    if progress is not None:
+        progress('write', total)
+    tmp_file = pgn_tmp_file(out_file)
+    try:
+        with open_pgn_output(tmp_file) as out:
+            copy_pgn_games(pgn_file, kept_games(), out)
+        os.replace(tmp_file, out_file)
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+    return total, len(dropped)
+
+
+def _is_db_mainline_game(game):
+    """True if game is its headers and mainline moves only, see PecgDatabase."""
+    if game.errors or game.comment or game.nags:
+        return False
+    node = game
+    while node.variations:
+        if len(node.variations) > 1:
+            return False
+        node = node.variations[0]
+        if node.comment or node.starting_comment or node.nags or node.move.drop:
+            return False
+    return True
+
+
+def encode_db_games(pgn_file, offsets, first_game=0, checkpoints=None):
+    """Returns [(headers, kind, moves bytes)] of the games at offsets.
+
+    Runs in the worker processes of convert_pgn_to_db(). kind is
+    PECGDB_KIND_MOVES with PECGDB move codes, or PECGDB_KIND_TEXT with the
+    zlib-compressed movetext. Offsets without a game give None.
+    """
+    results = []
+    with open_pgn(pgn_file, checkpoints) as h:
+        for offset in offsets:
+            h.seek(offset)
+            game = chess.pgn.read_game(h)
+            if game is None:
+                results.append(None)
+            elif _is_db_mainline_game(game):
+                codes = array('H', (encode_db_move(m) for m in game.mainline_moves()))
+                results.append((dict(game.headers), PECGDB_KIND_MOVES, codes.tobytes()))
+            else:
+                exporter = chess.pgn.StringExporter(headers=False)
+                text = game.accept(exporter)
+                results.append((dict(game.headers), PECGDB_KIND_TEXT,
+                                zlib.compress(text.encode('utf-8'), 6)))
+    return results
+
+
+def convert_pgn_to_db(pgn_file, db_file, progress=None, stop_event=None):
+    """Tools -> PGN -> Convert to Database: write a PGN as a PecgDatabase.
+
+    Games are parsed in a PgnParseService and each section is appended to
+    its own <db>.<name>.tmp spill file, so only the distinct header values
+    are kept in memory. The spill files are then joined into the database.
+    Returns the number of games.
+    """
+    codec = pgn_codec(pgn_file)
+    checkpoints = pgn_checkpoints(pgn_file)
+    starts = array('Q')
+    for start, _, _ in scan_pgn_games(pgn_file, 0, checkpoints if codec else None):
+        starts.append(start)
+        if progress is not None and len(starts) % 1000 == 0:
+            progress('scan', len(starts))
+        if stop_event is not None and stop_event.is_set():
+            return 0
+    total = len(starts)
+
+    names = ['ids.' + tag for tag in PGN_INDEX_HEADERS]
+    names += ['kinds', 'tags', 'tags_end', 'moves', 'moves_end']
+    typecodes = {name: 'I' for name in names[:len(PGN_INDEX_HEADERS)]}
+    typecodes.update({'kinds': 'B', 'tags': 'B', 'tags_end': 'Q',
+                      'moves': 'B', 'moves_end': 'Q'})
+    value_ids = {tag: {} for tag in PGN_INDEX_HEADERS}
+    spill_files = {name: f'{db_file}.{name}.tmp' for name in names}
+    tmp_file = db_file + '.tmp'
+    count = 0
+    try:
+        spills = {name: open(file, 'wb') for name, file in spill_files.items()}
+        try:
+            tags_size = moves_size = 0
+            service = PgnParseService(pgn_file, starts, checkpoints, PECGDB_CHUNK_GAMES)
+            for _, _, results in service.map(encode_db_games, stop_event=stop_event):
+                columns = {tag: array('I') for tag in PGN_INDEX_HEADERS}
+                kinds, tags_end, moves_end = array('B'), array('Q'), array('Q')
+                tags, moves = [], []
+                for result in results:
+                    if result is None:
+                        continue
+                    headers, kind, data = result
+                    for tag in PGN_INDEX_HEADERS:
+                        value = headers.pop(tag, None)
+                        if value is None:
+                            columns[tag].append(0)
+                        else:
+                            ids = value_ids[tag]
+                            columns[tag].append(ids.setdefault(value, len(ids) + 1))
+                    extra = ''.join(f'{name}\0{value}\0' for name, value in headers.items())
+                    extra = extra.encode('utf-8')
+                    tags.append(extra)
+                    tags_size += len(extra)
+                    tags_end.append(tags_size)
+                    kinds.append(kind)
+                    moves.append(data)
+                    moves_size += len(data)
+                    moves_end.append(moves_size)
+                for tag in PGN_INDEX_HEADERS:
+                    columns[tag].tofile(spills['ids.' + tag])
+                kinds.tofile(spills['kinds'])
+                tags_end.tofile(spills['tags_end'])
+                moves_end.tofile(spills['moves_end'])
+                spills['tags'].write(b''.join(tags))
+                spills['moves'].write(b''.join(moves))
+                count += len(kinds)
+                if progress is not None:
+                    progress('convert', count, total)
+        finally:
+            for h in spills.values():
+                h.close()
+        if stop_event is not None and stop_event.is_set():
+            return 0
+
+        sections = {}
+        with open(tmp_file, 'wb') as out:
+            out.write(PECGDB_MAGIC)
+
+            def add_section(name, typecode, chunks):
+                out.write(b'\0' * (-out.tell() % 8))
+                offset = out.tell()
+                for data in chunks:
+                    out.write(data)
+                sections[name] = [offset, out.tell() - offset, typecode]
+
+            for name in names:
+                with open(spill_files[name], 'rb') as h:
+                    add_section(name, typecodes[name],
+                                iter(functools.partial(h.read, PGN_READ_BYTES), b''))
+            for tag, ids in value_ids.items():
+                values = [value.encode('utf-8') for value in ids]  # in id order
+                add_section('values.' + tag, 'B', values)
+                add_section('values_end.' + tag, 'Q',
+                            [array('Q', itertools.accumulate(map(len, values))).tobytes()])
+            meta = json.dumps({'version': PECGDB_VERSION, 'byteorder': sys.byteorder,
+                               'count': count, 'sections': sections}).encode('utf-8')
+            out.write(meta)
+            out.write(struct.pack('<Q8s', len(meta), PECGDB_MAGIC))
+        os.replace(tmp_file, db_file)
+    finally:
+        for file in list(spill_files.values()) + [tmp_file]:
+            if os.path.isfile(file):
+                os.remove(file)
+    return count
+
+
+def export_db_to_pgn(db_file, out_file, progress=None, stop_event=None):
+    """Tools -> PGN -> Export Database: write the games of a PecgDatabase as PGN.
+
+    Returns the number of games.
+    """
+    database = PecgDatabase(db_file)
+    database.open()
+    tmp_file = pgn_tmp_file(out_file)
+    try:
+        count = database.count
+        with open_pgn_output(tmp_file) as out:
+            for i in range(count):
+                write_pgn_game(out, str(database.read_game(i)).encode('utf-8'))
+                if progress is not None and (i + 1) % 1000 == 0:
+                    progress('export', i + 1, count)
+                if stop_event is not None and stop_event.is_set():
+                    return 0
+        os.replace(tmp_file, out_file)
+    finally:
+        database.close()
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+    return count
+
+
+class PgnToolRunner(threading.Thread):
+    """Run a Tools -> PGN operation in the background.
+
+    func is one of merge_pgn_files(), split_pgn_file(), sort_pgn_file(),
+    dedup_pgn_file(), convert_pgn_to_db() or export_db_to_pgn(); it gets args and the progress and stop_event keywords.
+    phase, done and total report the progress, result is its return value.
+    """
+
+    def __init__(self, func, *args):
+        super().__init__(daemon=True)
+        self.func = func
+        self.args = args
+        self.phase = 'start'
+        self.done = 0
+        self.total = 0
+        self.result = None
+        self.is_done = False
+        self.is_failed = False
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _progress(self, phase, done, total=0):
+        self.phase, self.done, self.total = phase, done, total
+
+    def run(self):
+        try:
+            self.result = self.func(*self.args, progress=self._progress,
+                                    stop_event=self._stop_event)
+        except Exception:
+            logging.exception('PGN tool %s failed.', self.func.__name__)
+            self.is_failed = True
+        finally:
+            self.is_done = True
+
+
+class ReviewPositionStore:
+    """Positions of the review game nodes, in self.review_nodes order.
+
+    A position is the parent's index and the move played; a board is kept
+    only at the root and every REVIEW_CHECKPOINT_PLIES plies. Indexing
+    replays the moves from the nearest kept board above the node, so at
+    most REVIEW_CHECKPOINT_PLIES - 1 pushes, and the last
+    REVIEW_BOARD_CACHE_SIZE boards built are kept. The boards returned
+    hold the move stack since their checkpoint, at least the last move;
+    they are shared and must not be modified.
+    """
+
+    def __init__(self, board):
+        self._parents = array('L', (0,))
+        self._plies = array('L', (0,))
+        self._moves = [None]
+        self._checkpoints = {0: board.copy(stack=False)}
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._moves)
+
+    def parent(self, index):
+        """Returns the index of the parent of node index."""
+        return self._parents[index]
+
+    def append(self, parent, move, board):
+        """Add the node reached by move from node parent, board being its position.
+
+        Returns the index of the new node.
+        """
+        index = len(self._moves)
+        ply = self._plies[parent] + 1
+        self._parents.append(parent)
+        self._plies.append(ply)
+        self._moves.append(move)
+        if ply % REVIEW_CHECKPOINT_PLIES == 0:
+            board = board.copy(stack=1)
+            self._checkpoints[index] = board
+        return index
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self._moves)
+        board = self._cache.get(index)
+        if board is not None:
+            self._cache.move_to_end(index)
+            return board
+        if not 0 <= index < len(self._moves):
+            raise IndexError(index)
+
+        moves = []
+        i = index
+        while i not in self._checkpoints:
+            moves.append(self._moves[i])
+            i = self._parents[i]
+        board = self._checkpoints[i].copy()
+        for move in reversed(moves):
+            board.push(move)
+
+        self._cache[index] = board
+        if len(self._cache) > REVIEW_BOARD_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return board
+
+
+def tk_text_positions(texts):
+    """Returns the (line, column) of each text and of the end when joined in a Tk Text.
+
+    Columns count characters as Tk does; before Tk 9 that is UTF-16 code units.
+    """
+    positions = []
+    line, col = 1, 0
+    for text in texts:
+        positions.append((line, col))
+        newlines = text.count('\n')
+        if newlines:
+            line += newlines
+            text = text[text.rindex('\n') + 1:]
+            col = 0
+        if tk.TkVersion < 9 and not text.isascii():
+            col += len(text.encode('utf-16-le')) // 2
+        else:
+            col += len(text)
+    positions.append((line, col))
+    return positions
+
+
+class ReviewTree:
+    """The nodes of a review game in move list order, built in one pass.
+
+    nodes, boards (a ReviewPositionStore) and labels are indexed alike,
+    index 0 being the game itself. segments is the move list text as
+    (text, kind, value) in order: kind 'move' with the node index as
+    value, 'comment' or 'text'; move_segments gives the segment of a node
+    (node 0 has none). var_spans are (index of the first node,
+    first segment, end segment) of every variation, end excluded, and
+    mainline gives the node index of every mainline position by ply. The
+    tree is walked with an explicit stack, so neither long games nor
+    deep variations reach the recursion limit.
+    """
+
+    def __init__(self, game):
+        self.nodes = [game]
+        self.boards = ReviewPositionStore(game.board())
+        self.labels = ['Start position']
+        self.segments = []
+        self.move_segments = array('L', (0,))
+        self.var_spans = []
+        self._build(game)
+        ids = {id(node): index for index, node in enumerate(self.nodes)}
+        self.mainline = array('L', [0] + [ids[id(node)] for node in game.mainline()])
+
+    def _add_move(self, node, board, parent, indent, is_var, is_first):
+        """Add node played from board, returns (its board, its index)."""
+        segments = self.segments
+        if node.starting_comment:
+            segments.append((f'{{{node.starting_comment}}} ', 'comment', None))
+        fullmove = board.fullmove_number
+        san = board.san(node.move)
+        nag_suffix = ''.join(REVIEW_NAG_SYMBOLS.get(nag, '') for nag in node.nags)
+        if board.turn == chess.WHITE:
+            prefix = f'{fullmove}. '
+        else:
+            prefix = f'{fullmove}... ' if is_first else ''
+
+        next_board = board.copy(stack=False)
+        next_board.push(node.move)
+        index = self.boards.append(parent, node.move, next_board)
+        self.nodes.append(node)
+        self.move_segments.append(len(segments))
+        segments.append((f'{prefix}{san}{nag_suffix} ', 'move', index))
+        if node.comment:
+            segments.append((f'{{{node.comment}}} ', 'comment', None))
+
+        start_comment = f'{{{node.starting_comment}}} ' if node.starting_comment else ''
+        end_comment = f' {{{node.comment}}}' if node.comment else ''
+        move_prefix = f'{fullmove}. ' if board.turn == chess.WHITE else f'{fullmove}... '
+        label = f'{start_comment}{move_prefix}{san}{end_comment}'
+        self.labels.append('    ' * indent + (f'( {label} )' if is_var else label))
+        return next_board, index
+
+    def _build(self, game):
+        # Work items: ('line', node, board, parent index, indent) continues
+        # the line below node; ('var', node, board, parent index, indent)
+        # writes a variation in parentheses; ('text', text) writes text;
+        # ('end', None) closes the innermost variation.
+        stack = [('line', game, game.board(), 0, 0)]
+        open_vars = []
+        is_first = True  # next move starts a line, black moves show '...'
+        while stack:
+            item = stack.pop()
+            kind = item[0]
+            if kind == 'text':
+                self.segments.append((item[1], 'text', None))
+                continue
+            if kind == 'end':
+                self.segments.append((' ) ', 'text', None))
+                var_index, first = open_vars.pop()
+                self.var_spans.append((var_index, first, len(self.segments)))
+                is_first = True
+                continue
+
+            _, node, board, parent, indent = item
+            if kind == 'var':
+                open_vars.append((len(self.nodes), len(self.segments)))
+                self.segments.append(('\n' + '    ' * indent + '( ', 'text', None))
+                board, parent = self._add_move(node, board, parent, indent, True, True)
+                is_first = False
+                stack.append(('end', None))
+                stack.append(('line', node, board, parent, indent))
+                continue
+
+            if not node.variations:
+                continue
+            main = node.variations[0]
+            next_board, index = self._add_move(main, board, parent, indent, False, is_first)
+            is_first = False
+            # Pushed in reverse: the variations, a new line, then the line.
+            stack.append(('line', main, next_board, index, indent))
+            if len(node.variations) > 1:
+                if main.variations:
+                    # The line goes on at the parent's indentation level.
+                    stack.append(('text', '\n' + '    ' * indent))
+                for var_node in reversed(node.variations[1:]):
+                    stack.append(('var', var_node, board, parent, indent + 1))
+
+
+class ReviewGamePrefetcher(threading.Thread):
+    """Read and build review games ahead of time in the background.
+
+    request() replaces the games wanted; each is read through its games
+    loader and its ReviewTree is built, and the last REVIEW_PREFETCH_GAMES
+    prepared are kept. take() hands a prepared game over and forgets it,
+    so the GUI thread owns the game it shows.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self._requests = queue.Queue()
+        self._prepared = OrderedDict()  # (loader, game index) -> (game, tree)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self._requests.put(None)
+
+    def request(self, loader, game_indexes):
+        """Prepare game_indexes of loader.games, dropping older requests."""
+        try:
+            while True:
+                self._requests.get_nowait()
+        except queue.Empty:
+            pass
+        self._requests.put((loader, list(game_indexes)))
+
+    def take(self, loader, game_index):
+        """Returns the prepared (game, ReviewTree) of a game, None if not ready."""
+        with self._lock:
+            return self._prepared.pop((loader, game_index), None)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            item = self._requests.get()
+            if item is None:
+                break
+            loader, game_indexes = item
+            for game_index in game_indexes:
+                key = (loader, game_index)
+                with self._lock:
+                    if key in self._prepared:
+                        self._prepared.move_to_end(key)
+                        continue
+                if not 0 <= game_index < len(loader.games) or not self._requests.empty():
+                    continue
+                try:
+                    game = loader.read_game(loader.games[game_index])
+                    if game is None:
+                        continue
+                    prepared = (game, ReviewTree(game))
+                except Exception:
+                    logging.exception('Failed to prefetch game %d of %s.',
+                                      game_index, loader.pgn_file)
+                    continue
+                with self._lock:
+                    self._prepared[key] = prepared
+                    while len(self._prepared) > REVIEW_PREFETCH_GAMES:
+                        self._prepared.popitem(last=False)
+
+
+class VirtualListbox:
+    """Show a window of a long list in a fixed-height sg.Listbox.
+
+    Only the visible rows are formatted and handed to Tk; a vertical
+    sg.Slider scrolls the window and the selection is kept as an index into
+    the whole list, so the list size has no practical limit. Wheel and
+    navigation keys on the listbox are turned into window events which the
+    dialog loop passes to handle_event().
+    """
+
+    def __init__(self, window, list_key, slider_key, rows, get_text):
+        self.window = window
+        self.list_key = list_key
+        self.slider_key = slider_key
+        self.rows = rows
+        self.get_text = get_text  # get_text(index) -> row string
+        self.count = 0
+        self.top = 0
+        self.selected = None
+
+        widget = window[list_key].Widget
+        wheel_key = list_key + '_wheel'
+        nav_key = list_key + '_nav'
+        widget.bind('<MouseWheel>', lambda e: window.write_event_value(
+            wheel_key, -3 if e.delta > 0 else 3))
+        widget.bind('<Button-4>', lambda e: window.write_event_value(wheel_key, -3))
+        widget.bind('<Button-5>', lambda e: window.write_event_value(wheel_key, 3))
+        for key, step in (('<Up>', -1), ('<Down>', 1), ('<Prior>', -rows),
+                          ('<Next>', rows), ('<Home>', -sys.maxsize),
+                          ('<End>', sys.maxsize)):
+            widget.bind(key, lambda e, step=step: (
+                window.write_event_value(nav_key, step), 'break')[1])
+        self.wheel_key, self.nav_key = wheel_key, nav_key
+
+    def set_count(self, count):
+        """The list grew or shrank to count items."""
+        if count == self.count:
+            return
+        self.count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        if self.selected is None and count:
+            self.selected = 0
+        self.window[self.slider_key].Update(range=(0, max(0, count - self.rows)))
+        self.scroll_to(self.top, is_forced=True)
+
+    def scroll_to(self, top, is_forced=False):
+        top = max(0, min(top, self.count - self.rows))
+        if top == self.top and not is_forced:
+            return
+        self.top = top
+        self.window[self.slider_key].Update(value=top)
+        self.refresh()
+
+    def select(self, index):
+        """Select index and scroll it into view."""
+        if not self.count:
+            return
+        self.selected = max(0, min(index, self.count - 1))
+        if self.selected < self.top:
+            self.scroll_to(self.selected)
+        elif self.selected >= self.top + self.rows:
+            self.scroll_to(self.selected - self.rows + 1)
+        else:
+            self.refresh()
+
+    def refresh(self):
+        end = min(self.count, self.top + self.rows)
+        values = [self.get_text(i) for i in range(self.top, end)]
+        selected = []
+        if self.selected is not None and self.top <= self.selected < end:
+            selected = [self.selected - self.top]
+        self.window[self.list_key].Update(values=values, set_to_index=selected)
+
+    def handle_event(self, event, values):
+        """Returns True if event belonged to this list."""
+        if event == self.list_key:
+            indexes = self.window[self.list_key].get_indexes()
+            if indexes:
+                self.selected = self.top + indexes[0]
+            return True
+        if event == self.slider_key:
+            self.scroll_to(int(values[self.slider_key]))
+            return True
+        if event == self.wheel_key:
+            self.scroll_to(self.top + values[self.wheel_key])
+            return True
+        if event == self.nav_key:
+            current = self.selected if self.selected is not None else self.top
+            self.select(current + values[self.nav_key])
+            return True
+        return False
+
+
+class UciSessionRecorder(logging.Handler):
+    """Record the UCI lines exchanged with every engine to a compact log.
+
+    python-chess logs each line sent (``<<``) and received (``>>``) at DEBUG
+    level on the chess.engine logger. While recording, this handler takes that
+    logger over (propagation off, so pecg_log.txt is not flooded) and writes one
+    tab-separated line per UCI line::
+
+        <ms since start>  <pid>  <dir>  <text>
+
+    where dir is ``<`` for GUI -> engine, ``>`` for engine -> GUI and ``=`` for
+    a role record (opponent, adviser, analysis, threat, auto_analysis) written
+    when an engine is registered. Warnings are still passed to pecg_log.txt.
+    """
+
+    _SEND_MSG = '%s: << %s'
+    _RECV_MSG = '%s: >> %s'
+
+    def __init__(self, log_file=UCI_SESSION_LOG_FILE):
+        logging.Handler.__init__(self, level=logging.DEBUG)
+        self.log_file = log_file
+        self._file = None
+        self._start_time = 0.0
+        self._pids = {}
+        self._saved_level = None
+        self._saved_propagate = None
+
+    def is_active(self):
+        return self._file is not None
+
+    def start(self):
+        """Start a new session log, replacing any previous one."""
+        if self.is_active():
+            return
+        try:
+            self._file = open(self.log_file, 'w', encoding='utf-8')
+        except OSError:
+            logging.exception('Failed to open UCI session log %s.', self.log_file)
+            return
+        self._start_time = time.perf_counter()
+        self._pids = {}
+        self._file.write('# pecg-uci-session v{} {}\n'.format(
+            UCI_SESSION_LOG_VERSION, datetime.now().isoformat(timespec='seconds')))
+        engine_logger = logging.getLogger('chess.engine')
+        self._saved_level = engine_logger.level
+        self._saved_propagate = engine_logger.propagate
+        engine_logger.setLevel(logging.DEBUG)
+        engine_logger.propagate = False
+        engine_logger.addHandler(self)
+        logging.info('UCI session recording started: %s', self.log_file)
+
+    def stop(self):
+        """Stop recording and restore the quiet chess.engine logger."""
+        if not self.is_active():
+            return
+        engine_logger = logging.getLogger('chess.engine')
+        engine_logger.removeHandler(self)
+        engine_logger.setLevel(self._saved_level)
+        engine_logger.propagate = self._saved_propagate
+        self.acquire()
+        try:
+            self._file.close()
+            self._file = None
+        finally:
+            self.release()
+        logging.info('UCI session recording stopped.')
+
+    def register(self, engine, role):
+        """Tag the process of a SimpleEngine with the GUI role that uses it."""
+        if not self.is_active() or engine is None:
+            return
+        pid = self._get_pid(engine.protocol)
+        self.acquire()
+        try:
+            self._write(pid, '=', role)
+        finally:
+            self.release()
+
+    def _get_pid(self, protocol):
+        key = id(protocol)
+        pid = self._pids.get(key)
+        if pid is None:
+            try:
+                pid = protocol.transport.get_pid()
+            except Exception:
+                pid = 0
+            self._pids[key] = pid
+        return pid
 
-        Args:
-          tc_type: time control type ['fischer, delay, classical']
-          base: base time in ms
-          inc: increment time in ms can be negative and 0
-          period_moves: number of moves in a period
-        """
-        self.tc_type = tc_type  # ['fischer', 'delay', 'timepermove']
-        self.base = base
-        self.inc = inc
-        self.period_moves = period_moves
-        self.elapse = 0
-        self.init_base_time = self.base
+    def _write(self, pid, direction, text):
+        if self._file is None:
+            return
+        elapsed_ms = (time.perf_counter() - self._start_time) * 1000
+        self._file.write('{:.1f}\t{}\t{}\t{}\n'.format(
+            elapsed_ms, pid, direction, text))
 
-    def update_base(self) -> None:
-        """Updates base time after every move."""
-        if self.tc_type == 'delay':
-            self.base += min(0, self.inc - self.elapse)
-        elif self.tc_type == 'fischer':
-            self.base += self.inc - self.elapse
-        elif self.tc_type == 'timepermove':
-            self.base = self.init_base_time
-        else:
-            self.base -= self.elapse
+    def flush(self):
+        self.acquire()
+        try:
+            if self._file is not None:
+                self._file.flush()
+        finally:
+            self.release()
 
-        self.base = max(0, self.base)
-        self.elapse = 0
+    def close(self):
+        # Called by logging.shutdown() at exit, so the log is never truncated.
+        self.stop()
+        logging.Handler.close(self)
 
+    def emit(self, record):
+        if record.msg in (self._SEND_MSG, self._RECV_MSG):
+            protocol, line = record.args
+            direction = '<' if record.msg == self._SEND_MSG else '>'
+            try:
+                self._write(self._get_pid(protocol), direction, line)
+            except Exception:
+                self.handleError(record)
+        elif record.levelno >= logging.WARNING:
+            # Keep engine warnings visible in pecg_log.txt while recording.
+            logging.getLogger().handle(record)
 
-class GuiBook:
-    def __init__(self, book_file: str, board, is_random: bool = True) -> None:
-        """Handles gui polyglot book for engine opponent.
 
-        Args:
-          book_file: polgylot book filename
-          board: given board position
-          is_random: randomly select move from book
-        """
-        self.book_file = book_file
-        self.board = board
-        self.is_random = is_random
-        self.__book_move = None
+uci_session_recorder = UciSessionRecorder()
 
-    def get_book_move(self) -> None:
-        """Gets book move either random or best move."""
-        reader = chess.polyglot.open_reader(self.book_file)
-        try:
-            if self.is_random:
-                entry = reader.weighted_choice(self.board)
+
+def read_uci_session(log_file):
+    """Return {pid: {'role': role, 'records': [(ms, dir, text), ...]}}."""
+    sessions = {}
+    with open(log_file, encoding='utf-8') as h:
+        for line in h:
+            if line.startswith('#'):
+                continue
+            parts = line.rstrip('\n').split('\t', 3)
+            if len(parts) != 4:
+                continue
+            ms, pid, direction, text = parts
+            session = sessions.setdefault(pid, {'role': None, 'records': []})
+            if direction == '=':
+                session['role'] = text
             else:
-                entry = reader.find(self.board)
-            self.__book_move = entry.move
-        except IndexError:
-            logging.warning('No more book move.')
-        except Exception:
-            logging.exception('Failed to get book move.')
-        finally:
-            reader.close()
+                session['records'].append((float(ms), direction, text))
+    return sessions
 
-        return self.__book_move
 
-    def get_all_moves(self):
-        """
-        Read polyglot book and get all legal moves from a given positions.
+class UciSessionReplayer:
+    """Serve a recorded UCI session back as a stand-in engine on stdin/stdout.
 
-        :return: move string
-        """
-        is_found = False
-        total_score = 0
-        book_data = {}
-        cnt = 0
+    Engine lines are written strictly in recorded order. When the recording
+    reaches the next GUI line, the replayer waits until the GUI sends a line
+    with the same command word, so the GUI sees exactly the recorded stream.
+    Delays between engine lines follow the recording divided by ``speed``.
+    """
 
-        if os.path.isfile(self.book_file):
-            moves = '{:4s}   {:<5s}   {}\n'.format('move', 'score', 'weight')
-            with chess.polyglot.open_reader(self.book_file) as reader:
-                for entry in reader.find_all(self.board):
-                    is_found = True
-                    san_move = self.board.san(entry.move)
-                    score = entry.weight
-                    total_score += score
-                    bd = {cnt: {'move': san_move, 'score': score}}
-                    book_data.update(bd)
-                    cnt += 1
+    def __init__(self, log_file, session=None, speed=1.0):
+        sessions = read_uci_session(log_file)
+        if not sessions:
+            raise ValueError('No UCI session found in {}.'.format(log_file))
+        if session is None:
+            session = next(iter(sessions))
         else:
-            moves = '{:4s}  {:<}\n'.format('move', 'score')
-
-        # Get weight for each move
-        if is_found:
-            for _, v in book_data.items():
-                move = v['move']
-                score = v['score']
-                weight = score/total_score
-                moves += '{:4s}   {:<5d}   {:<2.1f}%\n'.format(move, score, 100*weight)
-
-        return moves, is_found
+            # Accept either a pid or a role name.
+            matches = [pid for pid, s in sessions.items()
+                       if session in (pid, s['role'])]
+            if not matches:
+                raise ValueError('Session {} not found in {}.'.format(
+                    session, log_file))
+            session = matches[0]
+        self.records = sessions[session]['records']
+        self.speed = max(1e-6, float(speed))
+        self.gui_lines = queue.Queue()
+
+    def _read_gui(self, stdin):
+        for line in stdin:
+            self.gui_lines.put(line.strip())
+        self.gui_lines.put('quit')
+
+    def _wait_for_gui(self, expected, stdout):
+        """Block until the GUI sends the expected command word."""
+        word = expected.split(' ', 1)[0]
+        while True:
+            line = self.gui_lines.get()
+            if line == 'quit':
+                return False
+            if line.split(' ', 1)[0] == word:
+                return True
+            # Unrecorded handshake: answer it so the GUI does not stall.
+            if line == 'isready':
+                stdout.write('readyok\n')
+                stdout.flush()
+
+    def run(self, stdin=sys.stdin, stdout=sys.stdout):
+        threading.Thread(target=self._read_gui, args=(stdin,),
+                         daemon=True).start()
+        prev_ms = None
+        for ms, direction, text in self.records:
+            if direction == '<':
+                if not self._wait_for_gui(text, stdout):
+                    return
+                prev_ms = ms
+                continue
+            if prev_ms is not None and ms > prev_ms:
+                time.sleep((ms - prev_ms) / 1000 / self.speed)
+            prev_ms = ms
+            stdout.write(text + '\n')
+            stdout.flush()
+        # Recording exhausted: stay responsive until the GUI quits.
+        self._wait_for_gui('quit', stdout)
 
 
 class RunEngine(threading.Thread):
@@ -570,7 +3879,8 @@ class RunEngine(threading.Thread):
                  engine_id_name, max_depth=MAX_DEPTH,
                  base_ms=300000, inc_ms=1000, tc_type='fischer',
                  period_moves=0, is_stream_search_info=True,
-                 existing_engine=None, multipv=1, option_overrides=None):
+                 existing_engine=None, multipv=1, option_overrides=None,
+                 role=None):
         """
         Run engine as opponent or as adviser.
 
@@ -581,6 +3891,7 @@ class RunEngine(threading.Thread):
         :param max_depth:
         :param existing_engine: An existing chess.engine.SimpleEngine instance
             to reuse instead of spawning a new process.
+        :param role: GUI role name, used to tag the UCI session recording.
         """
         threading.Thread.__init__(self)
         self._kill = threading.Event()
@@ -610,6 +3921,7 @@ class RunEngine(threading.Thread):
         self.is_move_delay = True
         # Per-role UCI option overrides applied on top of the engine config.
         self.option_overrides = option_overrides or {}
+        self.role = role
         try:
             self.multipv = max(1, int(multipv))
         except (TypeError, ValueError):
@@ -764,6 +4076,8 @@ class RunEngine(threading.Thread):
                 self.eng_queue.put('bestmove {}'.format(self.bm))
                 return
 
+            uci_session_recorder.register(self.engine, self.role)
+
             # Set engine option values
             try:
                 self.configure_engine()
@@ -983,19 +4297,68 @@ class RunEngine(threading.Thread):
         return ' '.join(short_san_pv)
 
 
+def configure_engine_options(engine, engine_config_file, engine_id_name,
+                             option_overrides=None):
+    """Apply the UCI options of engine_id_name in the engine config file.
+
+    Options whose value differs from the default are set, then the
+    option_overrides of the engine's role; options python-chess manages
+    and options the engine does not have are skipped. Used by the engines
+    of the auto-analyzer and of the evaluation graph.
+    """
+    with open(engine_config_file, 'r') as json_file:
+        data = json.load(json_file)
+        for p in data:
+            if p['name'] != engine_id_name:
+                continue
+            for n in p['options']:
+                if n['type'] == 'button':
+                    continue
+                if n['type'] == 'spin':
+                    user_value = int(n['value'])
+                    default_value = int(n['default'])
+                else:
+                    user_value = n['value']
+                    default_value = n['default']
+                if user_value != default_value:
+                    try:
+                        engine.configure({n['name']: user_value})
+                    except Exception:
+                        logging.exception('Failed to configure engine option.')
+
+    managed = {m.lower() for m in chess.engine.MANAGED_OPTIONS}
+    option_names = {name.lower(): name for name in engine.options}
+    for name, value in (option_overrides or {}).items():
+        lname = name.lower()
+        if lname in managed or lname not in option_names:
+            continue
+        real = option_names[lname]
+        try:
+            opt = engine.options[real]
+            if opt.type == 'spin':
+                value = int(value)
+            elif opt.type == 'check':
+                value = value if isinstance(value, bool) else \
+                    str(value).strip().lower() in ('true', '1', 'yes')
+            engine.configure({real: value})
+        except Exception:
+            logging.exception('Failed to apply override %s.', name)
+
+
 class AutoAnalyzeGame(threading.Thread):
     """Background thread that annotates a game with engine analysis.
 
     Walks the mainline of the supplied game, evaluates each position with the
     configured analysis engine, writes the evaluation as a comment from White's
     point of view, and adds the engine's PV as a sub-variation when it disagrees
-    with the move played in the game.
+    with the move played in the game. The first book_plies moves are book
+    moves; they are marked 'book' instead of being analysed.
     """
 
     def __init__(self, game, engine_config_file, engine_path_and_file,
                  engine_id_name, time_sec, output_queue, cancel_event,
                  max_depth=MAX_DEPTH, option_overrides=None,
-                 output_file=AUTO_ANALYSIS_OUTPUT_FILE):
+                 output_file=AUTO_ANALYSIS_OUTPUT_FILE, book_plies=0):
         threading.Thread.__init__(self)
         self.game = game
         self.engine_config_file = engine_config_file
@@ -1007,6 +4370,7 @@ class AutoAnalyzeGame(threading.Thread):
         self.max_depth = max_depth
         self.option_overrides = option_overrides or {}
         self.output_file = output_file
+        self.book_plies = book_plies  # leading book moves, not analysed
         self.engine = None
         self.daemon = True
 
@@ -1036,43 +4400,8 @@ class AutoAnalyzeGame(threading.Thread):
 
     def _configure_engine(self):
         """Apply UCI options from the engine config and per-role overrides."""
-        with open(self.engine_config_file, 'r') as json_file:
-            data = json.load(json_file)
-            for p in data:
-                if p['name'] != self.engine_id_name:
-                    continue
-                for n in p['options']:
-                    if n['type'] == 'button':
-                        continue
-                    if n['type'] == 'spin':
-                        user_value = int(n['value'])
-                        default_value = int(n['default'])
-                    else:
-                        user_value = n['value']
-                        default_value = n['default']
-                    if user_value != default_value:
-                        try:
-                            self.engine.configure({n['name']: user_value})
-                        except Exception:
-                            logging.exception('Failed to configure engine option.')
-
-        managed = {m.lower() for m in chess.engine.MANAGED_OPTIONS}
-        option_names = {name.lower(): name for name in self.engine.options}
-        for name, value in self.option_overrides.items():
-            lname = name.lower()
-            if lname in managed or lname not in option_names:
-                continue
-            real = option_names[lname]
-            try:
-                opt = self.engine.options[real]
-                if opt.type == 'spin':
-                    value = int(value)
-                elif opt.type == 'check':
-                    value = value if isinstance(value, bool) else \
-                        str(value).strip().lower() in ('true', '1', 'yes')
-                self.engine.configure({real: value})
-            except Exception:
-                logging.exception('Failed to apply override %s.', name)
+        configure_engine_options(self.engine, self.engine_config_file,
+                                 self.engine_id_name, self.option_overrides)
 
     def _configure_runtime_analysis_options(self):
         """Enable analysis-specific UCI options (e.g. UCI_AnalyseMode)."""
@@ -1136,6 +4465,7 @@ class AutoAnalyzeGame(threading.Thread):
             else:
                 self.engine = chess.engine.SimpleEngine.popen_uci(
                     self.engine_path_and_file, cwd=folder)
+            uci_session_recorder.register(self.engine, 'auto_analysis')
             self._configure_engine()
             self._configure_runtime_analysis_options()
             self._clear_existing_annotations()
@@ -1157,6 +4487,17 @@ class AutoAnalyzeGame(threading.Thread):
 
                 current += 1
                 child = node.variations[0]
+                if current <= self.book_plies:
+                    child.comment = 'book'
+                    self.output_queue.put({
+                        'type': 'progress',
+                        'current': current,
+                        'total': total,
+                    })
+                    board.push(child.move)
+                    node = child
+                    continue
+
                 limit = chess.engine.Limit(
                     time=self.time_sec,
                     depth=self.max_depth if self.max_depth != MAX_DEPTH else None)
@@ -1225,6 +4566,431 @@ class AutoAnalyzeGame(threading.Thread):
                     logging.exception('Failed to quit auto-analysis engine.')
 
 
+class ReviewEvalGraphEngine(threading.Thread):
+    """Evaluate the mainline positions of review games for the eval graph.
+
+    One engine process is kept for every game reviewed. It runs with one
+    thread at a lower OS priority, so the other Review engines keep the
+    CPU. request() replaces the job being evaluated, moving to another
+    game drops the rest of the previous one. Evaluations are put on
+    output_queue as (job id, ply, centipawns from White's POV), clamped
+    to REVIEW_EVAL_GRAPH_CP.
+    """
+
+    def __init__(self, engine_config_file, engine_path_and_file,
+                 engine_id_name, output_queue, option_overrides=None):
+        super().__init__(daemon=True)
+        self.engine_config_file = engine_config_file
+        self.engine_path_and_file = engine_path_and_file
+        self.engine_id_name = engine_id_name
+        self.output_queue = output_queue
+        self.option_overrides = option_overrides or {}
+        self.engine = None
+        self.is_failed = False
+        self._jobs = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self._jobs.put(None)
+
+    def request(self, job_id, board, moves, depth):
+        """Evaluate board and the positions after each of moves to depth."""
+        try:
+            while True:
+                self._jobs.get_nowait()
+        except queue.Empty:
+            pass
+        self._jobs.put((job_id, board, moves, depth))
+
+    def _start_engine(self):
+        folder = Path(self.engine_path_and_file).parents[0]
+        if sys_os == 'Windows':
+            self.engine = chess.engine.SimpleEngine.popen_uci(
+                self.engine_path_and_file, cwd=folder,
+                creationflags=subprocess.CREATE_NO_WINDOW |
+                subprocess.BELOW_NORMAL_PRIORITY_CLASS)
+        else:
+            self.engine = chess.engine.SimpleEngine.popen_uci(
+                self.engine_path_and_file, cwd=folder)
+            try:
+                os.setpriority(os.PRIO_PROCESS,
+                               self.engine.protocol.transport.get_pid(),
+                               REVIEW_EVAL_GRAPH_NICE)
+            except Exception:
+                logging.exception('Failed to lower eval graph engine priority.')
+        uci_session_recorder.register(self.engine, 'eval_graph')
+        configure_engine_options(self.engine, self.engine_config_file,
+                                 self.engine_id_name, self.option_overrides)
+        option_names = {name.lower(): name for name in self.engine.options}
+        if 'threads' in option_names:
+            try:
+                self.engine.configure({option_names['threads']: 1})
+            except Exception:
+                logging.exception('Failed to set eval graph engine threads.')
+
+    def _evaluate(self, board, depth):
+        """Returns the clamped evaluation of board from White's POV."""
+        if board.is_checkmate():
+            return -REVIEW_EVAL_GRAPH_CP if board.turn == chess.WHITE \
+                else REVIEW_EVAL_GRAPH_CP
+        if board.is_game_over():
+            return 0
+        info = self.engine.analyse(board, chess.engine.Limit(depth=depth))
+        score = info.get('score')
+        if score is None:
+            return None
+        cp = score.white().score(mate_score=REVIEW_EVAL_GRAPH_CP)
+        return min(REVIEW_EVAL_GRAPH_CP, max(-REVIEW_EVAL_GRAPH_CP, cp))
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                job = self._jobs.get()
+                if job is None:
+                    break
+                job_id, board, moves, depth = job
+                if self.engine is None:
+                    self._start_engine()
+                for ply in range(len(moves) + 1):
+                    if self._stop_event.is_set() or not self._jobs.empty():
+                        break
+                    if ply:
+                        board.push(moves[ply - 1])
+                    self.output_queue.put((job_id, ply, self._evaluate(board, depth)))
+        except Exception:
+            self.is_failed = True
+            logging.exception('Eval graph engine failed.')
+        finally:
+            if self.engine is not None:
+                try:
+                    self.engine.quit()
+                except Exception:
+                    logging.exception('Failed to quit eval graph engine.')
+
+
+class PieceImageCache:
+    """Decoded piece images shared by every board, drag and promotion widget.
+
+    Tk PhotoImages belong to one Tk interpreter, so images are cached per
+    root and per file path. The path carries the image size and theme
+    directory, e.g. Images/60/wK.png.
+    """
+
+    def __init__(self):
+        self._photos = {}  # (root, path) -> tk.PhotoImage
+
+    def get(self, root, path):
+        photo = self._photos.get((root, path))
+        if photo is None:
+            photo = tk.PhotoImage(file=path, master=root)
+            self._photos[(root, path)] = photo
+        return photo
+
+    def piece(self, widget, piece):
+        """Returns the PhotoImage of piece code for the Tk root of widget."""
+        return self.get(widget._root(), images[piece])
+
+    def clear(self):
+        """Forget every image, the widgets showing one keep it alive."""
+        self._photos = {}
+
+
+piece_image_cache = PieceImageCache()
+
+
+def set_button_piece_image(elem, piece):
+    """Show a cached piece image on an sg.Button without decoding a PNG."""
+    photo = piece_image_cache.piece(elem.Widget, piece)
+    elem.Widget.configure(image=photo, width=photo.width(), height=photo.height())
+    elem.Widget.image = photo  # Same reference as sg Button.update keeps
+
+
+def board_to_psg_board(board):
+    """Returns the psg board of a python-chess board, row 0 is rank 8.
+
+    Reads the piece bitboards directly, no FEN round-trip and no per-square
+    piece_at() probe.
+    """
+    psg_board = [[BLANK] * 8 for _ in range(8)]
+    for (piece_type, color), code in PSG_PIECE_CODES.items():
+        for s in chess.scan_forward(board.pieces_mask(piece_type, color)):
+            psg_board[7 - (s >> 3)][s & 7] = code
+    return psg_board
+
+
+def configure_board_square(widget):
+    """Strip borders/gaps from one board square Tk button."""
+    if platform == 'linux':
+        widget.configure(borderwidth=0, bd=0, highlightthickness=0, padx=0, pady=0, relief='flat', width=58, height=58)
+    else:
+        widget.configure(borderwidth=0, bd=0, highlightthickness=0, padx=0, pady=0, relief='flat')
+
+
+class ButtonBoardView:
+    """Incremental renderer for the 8x8 square buttons of one window.
+
+    Keeps the piece and background color last drawn on every square and only
+    touches the Tk widgets of squares whose piece or color changed, so a move
+    repaints 2-4 squares instead of all 64. Every board update of the window
+    must go through this view to keep the cached state in sync.
+
+    The buttons have no layers to draw on, so square highlights and arrows
+    are not supported: set_highlights() and set_arrows() do nothing and
+    has_overlays is False.
+    """
+
+    has_overlays = False
+
+    def __init__(self, window):
+        self.window = window
+        self._elements = {}
+        self._rendered = {}  # (row, col) -> [piece, color]
+
+    def element(self, row, col):
+        elem = self._elements.get((row, col))
+        if elem is None:
+            elem = self.window.find_element(key=(row, col))
+            self._elements[(row, col)] = elem
+        return elem
+
+    def invalidate(self):
+        """Forget the rendered state so the next render repaints everything."""
+        self._rendered = {}
+
+    def set_square(self, row, col, piece=None, color=None):
+        """Draw piece and/or background color on a square if they changed.
+
+        Returns True if the square widget was touched.
+        """
+        state = self._rendered.setdefault((row, col), [None, None])
+        is_new_piece = piece is not None and piece != state[0]
+        is_new_color = color is not None and color != state[1]
+        if not (is_new_piece or is_new_color):
+            return False
+
+        elem = self.element(row, col)
+        if is_new_piece:
+            set_button_piece_image(elem, piece)
+            # A new image resets the button size, restore the square config.
+            try:
+                configure_board_square(elem.Widget)
+            except Exception as e:
+                logging.warning('Failed to configure board square widget (%d, %d): %s', row, col, e)
+            state[0] = piece
+        if is_new_color:
+            elem.Update(button_color=('white', color))
+            state[1] = color
+        return True
+
+    def render(self, psg_board, light_color, dark_color):
+        """Draw psg_board with plain square colors, returns squares touched."""
+        changed = 0
+        for i in range(8):
+            row = psg_board[i]
+            for j in range(8):
+                color = dark_color if (i + j) % 2 else light_color
+                if self.set_square(i, j, row[j], color):
+                    changed += 1
+        return changed
+
+    def set_highlights(self, squares, color=None):
+        """Not supported by the buttons, does nothing."""
+
+    def set_arrows(self, arrows, color=None):
+        """Not supported by the buttons, does nothing."""
+
+
+class CanvasBoardView:
+    """Board drawn on a single Tk canvas instead of 64 square buttons.
+
+    Every square is one rectangle item and one reusable image item, an update
+    only reconfigures the items of the squares that changed. Items are
+    stacked in layers: squares, highlights, pieces, arrows and the dragged
+    piece on top.
+
+    One set of canvas bindings replaces the per-square button bindings. A
+    click writes the (row, col) square key to the window event queue, as a
+    square button would, and a drag writes '__drag_move__' with the source
+    and target squares, as setup_board_drag_drop does for the buttons.
+
+    The orientation is read from get_is_user_white() when the board is
+    drawn, the items are moved to their squares when it changed.
+    """
+
+    DRAG_THRESHOLD_PX = 4
+    HIGHLIGHT_COLOR = '#2b6cb0'
+    ARROW_COLOR = '#3c8c3c'
+    has_overlays = True
+
+    def __init__(self, window, canvas_key, get_is_user_white=lambda: True,
+                 square_px=SQUARE_PX):
+        self.window = window
+        self.canvas = window[canvas_key].TKCanvas
+        self.get_is_user_white = get_is_user_white
+        self.is_user_white = None  # orientation the items are placed for
+        self.square_px = square_px
+        self._rendered = {}  # (row, col) -> [piece, color]
+        self._rect_ids = {}
+        self._piece_ids = {}
+        self._drag = None  # dict of the press/drag in progress
+
+        self.canvas.configure(highlightthickness=0, borderwidth=0)
+        self.canvas.delete('all')
+        # All squares first so that every piece item is above them.
+        for row in range(8):
+            for col in range(8):
+                self._rect_ids[(row, col)] = self.canvas.create_rectangle(
+                    0, 0, square_px, square_px, width=0, tags=('square',))
+        for row in range(8):
+            for col in range(8):
+                self._piece_ids[(row, col)] = self.canvas.create_image(
+                    0, 0, anchor='nw', tags=('piece',))
+        self.update_orientation()
+
+        self.canvas.bind('<ButtonPress-1>', self._on_press)
+        self.canvas.bind('<B1-Motion>', self._on_motion)
+        self.canvas.bind('<ButtonRelease-1>', self._on_release)
+
+    def update_orientation(self):
+        """Place the items for get_is_user_white() if it changed, dropping overlays."""
+        is_user_white = bool(self.get_is_user_white())
+        if is_user_white == self.is_user_white:
+            return
+        self.is_user_white = is_user_white
+        self.canvas.delete('highlight', 'arrow')
+        size = self.square_px
+        for square, item in self._rect_ids.items():
+            x, y = self.square_xy(*square)
+            self.canvas.coords(item, x, y, x + size, y + size)
+        for square, item in self._piece_ids.items():
+            self.canvas.coords(item, *self.square_xy(*square))
+
+    def square_xy(self, row, col):
+        """Returns the canvas x, y of the top left corner of a square."""
+        if not self.is_user_white:
+            row, col = 7 - row, 7 - col
+        return col * self.square_px, row * self.square_px
+
+    def square_at(self, x, y):
+        """Returns the (row, col) under canvas point x, y or None."""
+        col, row = int(x // self.square_px), int(y // self.square_px)
+        if not (0 <= row < 8 and 0 <= col < 8):
+            return None
+        if not self.is_user_white:
+            row, col = 7 - row, 7 - col
+        return row, col
+
+    def invalidate(self):
+        """Forget the rendered state so the next render repaints everything."""
+        self._rendered = {}
+
+    def set_square(self, row, col, piece=None, color=None):
+        """Draw piece and/or background color on a square if they changed.
+
+        Returns True if a canvas item was touched.
+        """
+        self.update_orientation()
+        state = self._rendered.setdefault((row, col), [None, None])
+        is_new_piece = piece is not None and piece != state[0]
+        is_new_color = color is not None and color != state[1]
+        if not (is_new_piece or is_new_color):
+            return False
+
+        if is_new_piece:
+            image = '' if piece == BLANK else piece_image_cache.piece(
+                self.canvas, piece)
+            self.canvas.itemconfigure(self._piece_ids[(row, col)], image=image)
+            state[0] = piece
+        if is_new_color:
+            self.canvas.itemconfigure(self._rect_ids[(row, col)], fill=color)
+            state[1] = color
+        return True
+
+    def render(self, psg_board, light_color, dark_color):
+        """Draw psg_board with plain square colors, returns squares touched."""
+        changed = 0
+        for i in range(8):
+            row = psg_board[i]
+            for j in range(8):
+                color = dark_color if (i + j) % 2 else light_color
+                if self.set_square(i, j, row[j], color):
+                    changed += 1
+        return changed
+
+    def set_highlights(self, squares, color=HIGHLIGHT_COLOR):
+        """Outline squares on the highlight layer, replacing old outlines."""
+        self.update_orientation()
+        self.canvas.delete('highlight')
+        for row, col in squares:
+            x, y = self.square_xy(row, col)
+            self.canvas.create_rectangle(
+                x + 2, y + 2, x + self.square_px - 2, y + self.square_px - 2,
+                outline=color, width=3, tags=('highlight',))
+        self.canvas.tag_lower('highlight', 'piece')
+
+    def set_arrows(self, arrows, color=ARROW_COLOR):
+        """Draw arrows between ((row, col), (row, col)) square pairs."""
+        self.update_orientation()
+        self.canvas.delete('arrow')
+        half = self.square_px // 2
+        for fr, to in arrows:
+            fx, fy = self.square_xy(*fr)
+            tx, ty = self.square_xy(*to)
+            self.canvas.create_line(
+                fx + half, fy + half, tx + half, ty + half, fill=color,
+                width=self.square_px // 8, arrow='last',
+                arrowshape=(self.square_px // 3, self.square_px // 3,
+                            self.square_px // 8),
+                capstyle='round', tags=('arrow',))
+
+    def _on_press(self, event):
+        square = self.square_at(event.x, event.y)
+        if square is None:
+            self._drag = None
+            return
+        self._drag = {'source': square, 'x': event.x, 'y': event.y,
+                      'is_moving': False}
+
+    def _on_motion(self, event):
+        """Move the pressed piece image itself with the cursor."""
+        drag = self._drag
+        if drag is None:
+            return
+        piece = self._rendered.get(drag['source'], [BLANK])[0]
+        if piece in (None, BLANK):
+            return
+        if not drag['is_moving']:
+            if (abs(event.x - drag['x']) < self.DRAG_THRESHOLD_PX and
+                    abs(event.y - drag['y']) < self.DRAG_THRESHOLD_PX):
+                return
+            drag['is_moving'] = True
+            self.canvas.tag_raise(self._piece_ids[drag['source']])
+
+        half = self.square_px // 2
+        self.canvas.coords(self._piece_ids[drag['source']],
+                           event.x - half, event.y - half)
+        target = self.square_at(event.x, event.y)
+        self.set_highlights([target] if target is not None else [])
+
+    def _on_release(self, event):
+        drag, self._drag = self._drag, None
+        if drag is None:
+            return
+        source = drag['source']
+        if not drag['is_moving']:
+            self.window.write_event_value(source, '')
+            return
+
+        # Put the piece image back on its square, a legal move is redrawn
+        # by the __drag_move__ handler.
+        self.canvas.coords(self._piece_ids[source], *self.square_xy(*source))
+        self.set_highlights([])
+        target = self.square_at(event.x, event.y)
+        if target is not None and target != source:
+            self.window.write_event_value('__drag_move__', (source, target))
+
+
 class EasyChessGui:
     queue = queue.Queue()
     is_user_white = True  # White is at the bottom in board layout
@@ -1262,6 +5028,7 @@ class EasyChessGui:
         self.init_game()
         self.fen = None
         self.psg_board = None
+        self.board_view = None
         self.menu_elem = None
 
         # Drag-and-drop state
@@ -1298,10 +5065,17 @@ class EasyChessGui:
         self.is_save_time_left = False
         self.is_save_user_comment = True
         self.is_time_forfeit_enabled = True
+        # Record every UCI line exchanged with the engines to
+        # UCI_SESSION_LOG_FILE (Settings/Game, persisted).
+        self.is_record_uci_session = False
+        # Board backend, one of BOARD_RENDERERS (Settings/Game, persisted).
+        self.board_renderer = 'buttons'
         # Time caps (seconds) for Review-mode analysis and threat searches;
         # user-configurable via Settings/Game and persisted in the settings file.
         self.review_analysis_time_sec = REVIEW_ANALYSIS_TIME_SEC
         self.review_threat_time_sec = REVIEW_THREAT_TIME_SEC
+        # Search depth of the Review evaluation graph, 0 turns it off.
+        self.review_eval_graph_depth = REVIEW_EVAL_GRAPH_DEPTH
         # Auto-analysis defaults to the analysis engine/time, but the user can
         # pick any installed engine and a separate time cap per move.
         self.auto_analysis_engine_id_name = None
@@ -1320,17 +5094,41 @@ class EasyChessGui:
         self.auto_analysis_queue = queue.Queue()
         self.auto_analysis_thread = None
         self.auto_analysis_cancel = threading.Event()
+        self.review_eval_queue = queue.Queue()
+        self.review_eval_engine = None  # ReviewEvalGraphEngine, started in Review
+        self.review_eval_job = 0  # id of the last job requested from it
         self.reset_review_state()
 
     def reset_review_state(self):
         """Reset review mode state."""
         self.review_pgn_file = None
         self.review_games = []
+        self.review_games_loader = None  # PgnGamesLoader filling review_games
+        self.review_position_index = None  # PgnPositionIndex of review_pgn_file
+        self.explorer_pgn_file = ''
+        self.opening_explorer = None  # OpeningExplorer of explorer_pgn_file
+        self.explorer_builder = None  # OpeningExplorerBuilder updating it
+        self.review_explorer_text = None
         self.review_game = None
         self.review_game_index = None
         self.review_move_index = 0
+        self.review_tree = None  # ReviewTree of review_game
+        self.review_prefetcher = None  # ReviewGamePrefetcher, started on first use
+        # Move list window, see show_review_move_window()
+        self.review_move_window = None  # (first, end) ReviewTree segments shown
+        self.review_move_positions = []  # (line, column) of the segments shown
+        self.review_move_base = 0  # segment shown of ReviewTree segment 0
+        self.review_move_starts = []  # (line, column) of the moves shown
+        self.review_move_nodes = []  # their node indexes
+        self.review_move_spans = {}  # node index -> ('line.column', 'line.column')
+        self.review_var_spans = {}  # first node index -> text range
+        # Evaluation graph, see start_review_eval_graph()
+        self.review_eval_moves = None  # mainline moves of the job
+        self.review_eval_scores = []  # evaluation of each mainline ply or None
+        self.review_eval_cursor = None  # graph figure marking the current ply
         self.review_move_labels = []
         self.review_boards = []
+        self.review_book_exit = None  # (ply, move label), see get_book_exit()
         self.review_nodes = []
         self.review_window = None
         self.review_analysis_lines = [''] * REVIEW_ANALYSIS_MULTIPV_LINES
@@ -1398,161 +5196,72 @@ class EasyChessGui:
             self.review_threat_line = ''
             self.review_threat_status = 'Waiting...'
             self.update_review_analysis_panel(self.review_window)
-            self.update_review_threat_panel(self.review_window)
-        else:
-            self.refresh_review_analysis(self.review_window)
-            self.refresh_review_threat(self.review_window)
-
-    def highlight_current_move(self, widget):
-        """Highlights the active move in the Multiline text and scrolls it into view."""
-        widget.tag_remove("current_move", "1.0", "end")
-        widget.tag_remove("current_var_move", "1.0", "end")
-        widget.tag_remove("current_var_block", "1.0", "end")
-
-        current_node = self.review_nodes[self.review_move_index]
-
-        # 1. Determine if the current move is in a variation
-        in_var = False
-        curr = current_node
-        while curr.parent is not None:
-            if curr.parent.variations and curr != curr.parent.variations[0]:
-                in_var = True
-                break
-            curr = curr.parent
-
-        # 2. Highlight active move
-        tag_name = f"move_{self.review_move_index}"
-        ranges = widget.tag_ranges(tag_name)
-        if ranges:
-            if in_var:
-                widget.tag_add("current_var_move", ranges[0], ranges[1])
-            else:
-                widget.tag_add("current_move", ranges[0], ranges[1])
-            widget.see(ranges[0])
-
-        # 3. Highlight parenthetical variation block if in variation
-        if in_var:
-            var_root_idx = None
-            curr = current_node
-            while curr.parent is not None:
-                if curr.parent.variations and curr in curr.parent.variations[1:]:
-                    if curr in self.review_nodes:
-                        var_root_idx = self.review_nodes.index(curr)
-                        break
-                curr = curr.parent
-
-            if var_root_idx is not None:
-                var_tag = f"var_block_{var_root_idx}"
-                var_ranges = widget.tag_ranges(var_tag)
-                if var_ranges:
-                    widget.tag_add("current_var_block", var_ranges[0], var_ranges[1])
-
-    def render_pgn_tree(self, node, board, widget, indent=0, is_var=False):
-        """Recursively render game node and variations into the Tkinter Text widget."""
-
-        def render_only_move(n, b, ind):
-            NAG_SYMBOLS = {
-                1: "!",
-                2: "?",
-                3: "!!",
-                4: "??",
-                5: "!?",
-                6: "?!",
-            }
-            if n.move is None:
-                return b, None
-
-            # 1. Print starting comment, if any
-            if n.starting_comment:
-                comment_text = f"{{{n.starting_comment}}} "
-                widget.insert("insert", comment_text, "comment")
-
-            turn = b.turn
-            fullmove = b.fullmove_number
-            san = b.san(n.move)
-
-            nag_suffix = ""
-            for nag in n.nags:
-                if nag in NAG_SYMBOLS:
-                    nag_suffix += NAG_SYMBOLS[nag]
-
-            idx = len(self.review_nodes)
-            self.review_nodes.append(n)
-            next_b = b.copy()
-            next_b.push(n.move)
-            self.review_boards.append(next_b)
-
-            prefix = ""
-            if turn == chess.WHITE:
-                prefix = f"{fullmove}. "
-            else:
-                if self.first_move_in_line:
-                    prefix = f"{fullmove}... "
-
-            move_text = f"{prefix}{san}{nag_suffix} "
-            tag_name = f"move_{idx}"
-            widget.insert("insert", move_text, (tag_name, "move_link"))
-            widget.tag_bind(tag_name, "<Button-1>", lambda event, i=idx: self.on_move_clicked(i))
-
-            self.first_move_in_line = False
-
-            # 2. Print comment, if any
-            if n.comment:
-                comment_text = f"{{{n.comment}}} "
-                widget.insert("insert", comment_text, "comment")
+            self.update_review_threat_panel(self.review_window)
+        else:
+            self.refresh_review_analysis(self.review_window)
+            self.refresh_review_threat(self.review_window)
 
-            return next_b, idx
+    def highlight_current_move(self, widget, is_scroll=True):
+        """Highlights the active move in the Multiline text and scrolls it into view.
 
-        def render_continuations(n, b, ind):
-            if not n.variations:
+        The text ranges come from the span tables of show_review_move_window(),
+        the window is moved to the move when it is not shown. is_scroll
+        False leaves the view and the window where they are, as after the
+        move list was scrolled: the move is highlighted only if it is shown.
+        """
+        if self.review_move_window is None:
+            return
+        index = self.review_move_index
+        widget.tag_remove("current_move", "1.0", "end")
+        widget.tag_remove("current_var_move", "1.0", "end")
+        widget.tag_remove("current_var_block", "1.0", "end")
+        if index not in self.review_move_spans:
+            if not is_scroll:
                 return
+            self.show_review_move_window(widget, self.review_tree.move_segments[index])
+
+        # 1. Find the first node of the innermost variation holding the move
+        var_root_idx = None
+        i = index
+        while i:
+            node = self.review_nodes[i]
+            if node is not node.parent.variations[0]:
+                var_root_idx = i
+                break
+            i = self.review_boards.parent(i)
 
-            mainline_child = n.variations[0]
-            # 1. Render mainline child's move
-            next_b, idx = render_only_move(mainline_child, b, ind)
-
-            # 2. Render sibling variations (alternatives to mainline child)
-            if len(n.variations) > 1:
-                for var_node in n.variations[1:]:
-                    var_idx = len(self.review_nodes)
-                    start_mark = widget.index("insert")
-
-                    widget.insert("insert", "\n" + "    " * (ind + 1) + "( ")
-                    self.first_move_in_line = True
-                    render_node(var_node, b, ind + 1, True)
-                    widget.insert("insert", " ) ")
-                    self.first_move_in_line = True
-
-                    end_mark = widget.index("insert")
-                    var_tag = f"var_block_{var_idx}"
-                    widget.tag_add(var_tag, start_mark, end_mark)
-
-                # After the last variation, continue the mainline on a fresh
-                # line at the parent's indentation level.
-                if mainline_child.variations:
-                    widget.insert("insert", "\n" + "    " * ind)
-
-            # 3. Render mainline child's continuation
-            render_continuations(mainline_child, next_b, ind)
+        # 2. Highlight active move
+        start, end = self.review_move_spans[index]
+        if var_root_idx is not None:
+            widget.tag_add("current_var_move", start, end)
+        else:
+            widget.tag_add("current_move", start, end)
+        if is_scroll:
+            widget.see(start)
 
-        def render_node(n, b, ind, is_v):
-            next_b, idx = render_only_move(n, b, ind)
-            render_continuations(n, next_b, ind)
+        # 3. Highlight parenthetical variation block if in variation
+        var_span = self.review_var_spans.get(var_root_idx)
+        if var_span is not None:
+            widget.tag_add("current_var_block", *var_span)
 
-        render_node(node, board, indent, is_var)
+    def on_move_list_click(self, event):
+        """Callback of a click on a move of the move list, see render_review_movelist()."""
+        line, col = map(int, event.widget.index(f'@{event.x},{event.y}').split('.'))
+        i = bisect.bisect_right(self.review_move_starts, (line, col)) - 1
+        if i >= 0:
+            self.on_move_clicked(self.review_move_nodes[i])
 
     def render_review_movelist(self, window):
-        """Build and render the entire PGN move list with variations into the Multiline widget."""
+        """Build and render the entire PGN move list with variations into the Multiline widget.
+
+        One binding on 'move_link' maps a click to its move by bisecting
+        the move starts. A long move list is shown a window at a time, see
+        show_review_move_window().
+        """
         if self.review_game is None or 'review_move_list_k' not in window.AllKeysDict:
             return
 
         widget = window['review_move_list_k'].Widget
-        widget.configure(state='normal')
-        widget.delete('1.0', tk.END)
-
-        # Re-initialize index mapping lists
-        self.review_nodes = [self.review_game]
-        self.review_boards = [self.review_game.board()]
 
         # Configure styles
         default_fg = widget.cget("foreground")
@@ -1569,22 +5278,205 @@ class EasyChessGui:
 
         widget.tag_bind("move_link", "<Enter>", lambda event: widget.configure(cursor="hand2"))
         widget.tag_bind("move_link", "<Leave>", lambda event: widget.configure(cursor=""))
+        widget.tag_bind("move_link", "<Button-1>", self.on_move_list_click)
+
+        self.review_move_window = None
+        self.show_review_move_window(
+            widget, self.review_tree.move_segments[self.review_move_index])
+        self.highlight_current_move(widget)
+        self.show_review_eval_graph(window)
 
-        # Insert Start Position
-        widget.insert("insert", "Start Position", ("move_0", "move_link"))
-        widget.tag_bind("move_0", "<Button-1>", lambda event, i=0: self.on_move_clicked(i))
-        widget.insert("insert", "\n\n")
+    def show_review_move_window(self, widget, center):
+        """Show the ReviewTree segments around segment center in the move list.
 
-        self.first_move_in_line = True
-        game = self.review_game
-        if game.variations:
-            # Render from the root so that alternative first moves (e.g. an
-            # engine-best line for move 1) appear inline after the mainline
-            # first move instead of at the end of the move list.
-            self.render_pgn_tree(game, game.board(), widget, 0, False)
+        At most REVIEW_MOVE_LIST_SEGMENTS segments are in the widget; an
+        ellipsis marks moves left out. The text is inserted at once and the
+        tags are added in bulk. Text ranges of the moves and variations shown
+        are kept in self.review_move_spans and self.review_var_spans. Returns
+        False if the window did not change.
+        """
+        tree = self.review_tree
+        count = len(tree.segments)
+        lo = max(0, min(center - REVIEW_MOVE_LIST_SEGMENTS // 2,
+                        count - REVIEW_MOVE_LIST_SEGMENTS))
+        hi = min(count, lo + REVIEW_MOVE_LIST_SEGMENTS)
+        if (lo, hi) == self.review_move_window:
+            return False
+        self.review_move_window = (lo, hi)
+
+        # Alternative first moves (e.g. an engine-best line for move 1)
+        # appear inline after the mainline first move, see ReviewTree.
+        segments = [('Start Position', 'move', 0), ('\n\n', 'text', None)]
+        if lo:
+            segments.append(('... ', 'text', None))
+        base = len(segments) - lo  # widget segment of tree segment i is i + base
+        segments += tree.segments[lo:hi]
+        if hi < count:
+            segments.append((' ...', 'text', None))
+        positions = tk_text_positions([text for text, _, _ in segments])
+        self.review_move_positions = positions
+        self.review_move_base = base
 
+        widget.configure(state='normal')
+        widget.delete('1.0', tk.END)
+        widget.insert('1.0', ''.join([text for text, _, _ in segments]))
+        ranges = {'move': [], 'comment': []}
+        self.review_move_starts = []
+        self.review_move_nodes = []
+        self.review_move_spans = {}
+        for i, (_, kind, value) in enumerate(segments):
+            if kind in ranges:
+                start, end = positions[i], positions[i + 1]
+                ranges[kind] += [f'{start[0]}.{start[1]}', f'{end[0]}.{end[1]}']
+                if kind == 'move':
+                    self.review_move_starts.append(start)
+                    self.review_move_nodes.append(value)
+                    self.review_move_spans[value] = tuple(ranges[kind][-2:])
+        widget.tag_add('move_link', *ranges['move'])
+        if ranges['comment']:
+            widget.tag_add('comment', *ranges['comment'])
+        self.review_var_spans = {}
+        for var_index, first, end in tree.var_spans:
+            if first < hi and end > lo:
+                (l1, c1) = positions[max(first, lo) + base]
+                (l2, c2) = positions[min(end, hi) + base]
+                self.review_var_spans[var_index] = (f'{l1}.{c1}', f'{l2}.{c2}')
         widget.configure(state='disabled')
-        self.highlight_current_move(widget)
+        return True
+
+    def poll_review_move_list(self, window):
+        """Move the move list window when it is scrolled to one of its ends."""
+        window_range = self.review_move_window
+        if window_range is None or 'review_move_list_k' not in window.AllKeysDict:
+            return
+        lo, hi = window_range
+        if lo == 0 and hi == len(self.review_tree.segments):
+            return
+        widget = window['review_move_list_k'].Widget
+        first, last = widget.yview()
+        if first <= REVIEW_MOVE_LIST_EDGE and lo > 0:
+            anchor = lo
+        elif last >= 1 - REVIEW_MOVE_LIST_EDGE and hi < len(self.review_tree.segments):
+            anchor = hi - 1
+        else:
+            return
+        if self.show_review_move_window(widget, anchor):
+            line, col = self.review_move_positions[anchor + self.review_move_base]
+            widget.see(f'{line}.{col}')
+            self.highlight_current_move(widget, is_scroll=False)
+
+    def start_review_eval_graph(self):
+        """Evaluate the mainline of the review game for the evaluation graph.
+
+        The positions are evaluated by self.review_eval_engine, which is
+        started on first use and restarted if the analysis engine changed.
+        A new job replaces the previous game's, a game with the same
+        mainline keeps its evaluations.
+        """
+        game = self.review_game
+        moves = [node.move for node in game.mainline()]
+        engine = self.review_eval_engine
+        if moves == self.review_eval_moves and engine is not None \
+                and engine.is_alive():
+            return
+        self.review_eval_job += 1
+        self.review_eval_moves = moves
+        self.review_eval_scores = [None] * (len(moves) + 1)
+        if self.review_eval_graph_depth <= 0 or not self.analysis_path_and_file:
+            return
+        if engine is not None and (
+                not engine.is_alive()
+                or engine.engine_path_and_file != self.analysis_path_and_file
+                or engine.engine_id_name != self.analysis_id_name):
+            engine.stop()
+            engine = None
+        if engine is None:
+            engine = ReviewEvalGraphEngine(
+                self.engine_config_file, self.analysis_path_and_file,
+                self.analysis_id_name, self.review_eval_queue,
+                option_overrides=self.get_role_options(
+                    'analysis', self.analysis_id_name))
+            engine.start()
+            self.review_eval_engine = engine
+        engine.request(self.review_eval_job, game.board(), moves,
+                       self.review_eval_graph_depth)
+
+    def stop_review_eval_graph(self):
+        """Stop the evaluation graph engine when leaving Review mode."""
+        if self.review_eval_engine is not None:
+            self.review_eval_engine.stop()
+            self.review_eval_engine = None
+        self.review_eval_moves = None
+
+    def review_eval_point(self, ply):
+        """Returns the graph point of the evaluation of mainline ply."""
+        last = max(1, len(self.review_eval_scores) - 1)
+        return ply * REVIEW_EVAL_GRAPH_SIZE[0] / last, self.review_eval_scores[ply]
+
+    def draw_review_eval_segments(self, graph, ply):
+        """Draw the graph lines to ply from its evaluated neighbours."""
+        scores = self.review_eval_scores
+        for a, b in ((ply - 1, ply), (ply, ply + 1)):
+            if 0 <= a and b < len(scores) and scores[a] is not None \
+                    and scores[b] is not None:
+                graph.draw_line(self.review_eval_point(a), self.review_eval_point(b),
+                                color='black', width=2)
+
+    def show_review_eval_graph(self, window):
+        """Draw the evaluation graph of the review game from scratch."""
+        if 'review_eval_graph_k' not in window.AllKeysDict:
+            return
+        self.start_review_eval_graph()
+        graph = window['review_eval_graph_k']
+        graph.erase()
+        width = REVIEW_EVAL_GRAPH_SIZE[0]
+        graph.draw_rectangle((0, 0), (width, -REVIEW_EVAL_GRAPH_CP),
+                             fill_color='#d0d0d0', line_width=0)
+        graph.draw_line((0, 0), (width, 0), color='gray')
+        for ply in range(1, len(self.review_eval_scores)):
+            self.draw_review_eval_segments(graph, ply)
+        self.review_eval_cursor = None
+        self.update_review_eval_cursor(window)
+
+    def update_review_eval_cursor(self, window):
+        """Mark the ply of the current position on the evaluation graph."""
+        if 'review_eval_graph_k' not in window.AllKeysDict \
+                or not self.review_eval_scores:
+            return
+        graph = window['review_eval_graph_k']
+        if self.review_eval_cursor is not None:
+            graph.delete_figure(self.review_eval_cursor)
+        node = self.review_nodes[self.review_move_index]
+        ply = min(node.ply() - self.review_game.ply(),
+                  len(self.review_eval_scores) - 1)
+        x = self.review_eval_point(ply)[0]
+        self.review_eval_cursor = graph.draw_line(
+            (x, -REVIEW_EVAL_GRAPH_CP), (x, REVIEW_EVAL_GRAPH_CP), color='red')
+
+    def poll_review_eval_graph(self, window):
+        """Add the evaluations that came in since the last poll to the graph."""
+        graph = window['review_eval_graph_k'] \
+            if 'review_eval_graph_k' in window.AllKeysDict else None
+        while True:
+            try:
+                job_id, ply, cp = self.review_eval_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job_id != self.review_eval_job or cp is None:
+                continue
+            self.review_eval_scores[ply] = cp
+            if graph is not None:
+                self.draw_review_eval_segments(graph, ply)
+
+    def on_review_eval_graph_click(self, point):
+        """Go to the mainline position under a click on the evaluation graph."""
+        x = point[0] if point else None
+        if x is None or self.review_tree is None:
+            return
+        mainline = self.review_tree.mainline
+        last = len(mainline) - 1
+        ply = min(last, max(0, round(x * max(1, last) / REVIEW_EVAL_GRAPH_SIZE[0])))
+        self.on_move_clicked(mainline[ply])
 
     def update_game(self, mc: int, user_move: str, time_left: int, user_comment: str):
         """Saves moves in the game.
@@ -1639,6 +5531,9 @@ class EasyChessGui:
         if flip:
             self.is_user_white = not self.is_user_white
 
+        # The new board decodes the images it shows again, the old window
+        # is closed below.
+        piece_image_cache.clear()
         layout = self.build_main_layout(self.is_user_white)
 
         w = sg.Window(
@@ -1664,9 +5559,204 @@ class EasyChessGui:
         window.Close()
         return w
 
+    def build_polyglot_book(self):
+        """Book -> Build Book: write a polyglot book from PGN files.
+
+        The build runs in a PolyglotBookBuilder thread; the dialog shows its
+        progress and Cancel stops it, leaving an existing book unchanged.
+        """
+        win_title = BOX_TITLE + '/Build Book'
+        layout = [
+            [sg.T('PGN files', size=(12, 1)),
+             sg.Input(size=(40, 1), key='pgn_files_k'),
+             sg.FilesBrowse(file_types=PGN_FILE_TYPES)],
+            [sg.T('Book file', size=(12, 1)),
+             sg.Input('Book/my_book.bin', size=(40, 1), key='book_file_k'),
+             sg.FileSaveAs(file_types=(('Polyglot Book', '*.bin'),))],
+            [sg.T('Max ply', size=(12, 1)),
+             sg.Spin([t for t in range(1, 101)], initial_value=BOOK_BUILD_MAX_PLY,
+                     size=(6, 1), key='max_ply_k'),
+             sg.T('Min Elo', size=(8, 1),
+                  tooltip='Both players must be rated at least this, 0 for any.'),
+             sg.Input('0', size=(6, 1), key='min_elo_k'),
+             sg.T('Min games', size=(9, 1),
+                  tooltip='Leave out moves played in fewer games.'),
+             sg.Input('1', size=(6, 1), key='min_games_k')],
+            [sg.T('Results', size=(12, 1)),
+             sg.CBox('1-0', default=True, key='result_1-0'),
+             sg.CBox('1/2-1/2', default=True, key='result_1/2-1/2'),
+             sg.CBox('0-1', default=True, key='result_0-1')],
+            [sg.Text('Status:', size=(60, 1), key='status_k', relief='sunken')],
+            [sg.Button('Build'), sg.Cancel()]
+        ]
+        w = sg.Window(win_title, layout, icon=ico_path[platform]['pecg'])
+        builder = None
+        t1 = 0
+        while True:
+            e, v = w.Read(timeout=100)
+            if e is None or e == 'Cancel':
+                if builder is not None:
+                    builder.stop()
+                    builder.join()
+                break
+
+            if builder is not None:
+                if not builder.is_done:
+                    if builder.phase.startswith('parse'):
+                        status = f'Status: {builder.phase}, game {builder.done} of {builder.total}'
+                    else:
+                        status = f'Status: {builder.phase} ...'
+                    w['status_k'].Update(status)
+                    continue
+                elapse = int(time.perf_counter() - t1)
+                if builder.is_failed:
+                    w['status_k'].Update('Status: Failed to build the book, see pecg_log.txt.')
+                else:
+                    w['status_k'].Update(
+                        f'Status: {builder.entries} entries written to '
+                        f'{builder.book_file}. Done! in {elapse}s')
+                builder = None
+                w['Build'].Update(disabled=False)
+
+            if e == 'Build':
+                pgn_files = [f for f in v['pgn_files_k'].split(';') if f]
+                book_file = v['book_file_k'].strip()
+                results = [r for r in ('1-0', '1/2-1/2', '0-1') if v['result_' + r]]
+                missing = [f for f in pgn_files if not os.path.isfile(f)]
+                if not pgn_files or missing or not book_file or not results:
+                    w['status_k'].Update('Status: Choose existing PGN files, a book file '
+                                         'and at least one result.')
+                    continue
+                try:
+                    max_ply, min_elo, min_games = (
+                        int(v[k]) for k in ('max_ply_k', 'min_elo_k', 'min_games_k'))
+                except ValueError:
+                    w['status_k'].Update('Status: Max ply, Min Elo and Min games must be numbers.')
+                    continue
+                builder = PolyglotBookBuilder(
+                    pgn_files, book_file, max_ply=max_ply, min_elo=min_elo,
+                    results=results, min_games=max(1, min_games))
+                builder.start()
+                t1 = time.perf_counter()
+                w['Build'].Update(disabled=True)
+        w.Close()
+
+    def run_pgn_tool(self, tool):
+        """Tools -> PGN -> Merge, Split, Sort or Deduplicate a PGN database.
+
+        Convert to Database and Export Database go between a PGN and a
+        .pecgdb game database. The operation runs in a PgnToolRunner thread;
+        the dialog shows its progress and Cancel stops it. All but Split
+        replace the output file only when they finish.
+        """
+        win_title = BOX_TITLE + '/' + tool
+        if tool == 'Merge':
+            layout = [[sg.T('PGN files', size=(12, 1)),
+                       sg.Input(size=(40, 1), key='pgn_k'),
+                       sg.FilesBrowse(file_types=PGN_FILE_TYPES)]]
+        elif tool == 'Export Database':
+            layout = [[sg.T('Database', size=(12, 1)),
+                       sg.Input(size=(40, 1), key='pgn_k'),
+                       sg.FileBrowse(file_types=PECGDB_FILE_TYPES)]]
+        else:
+            layout = [[sg.T('PGN', size=(12, 1)),
+                       sg.Input(size=(40, 1), key='pgn_k'),
+                       sg.FileBrowse(file_types=PGN_FILE_TYPES)]]
+        if tool == 'Split':
+            layout += [[sg.T('Folder', size=(12, 1)),
+                        sg.Input(size=(40, 1), key='out_k'), sg.FolderBrowse()],
+                       [sg.T('Split by', size=(12, 1)),
+                        sg.Combo(['player', 'event', 'year'], default_value='player',
+                                 readonly=True, key='by_k')]]
+        elif tool == 'Convert to Database':
+            layout += [[sg.T('Database', size=(12, 1)),
+                        sg.Input(size=(40, 1), key='out_k'),
+                        sg.FileSaveAs(file_types=PECGDB_FILE_TYPES)]]
+        else:
+            layout += [[sg.T('Output PGN', size=(12, 1)),
+                        sg.Input(size=(40, 1), key='out_k'),
+                        sg.FileSaveAs(file_types=PGN_FILE_TYPES)]]
+        if tool == 'Sort':
+            layout += [[sg.T('Sort by', size=(12, 1)),
+                        sg.Combo(['date', 'eco'], default_value='date',
+                                 readonly=True, key='by_k')]]
+        layout += [[sg.Text('Status:', size=(60, 1), key='status_k', relief='sunken')],
+                   [sg.Button('Run'), sg.Cancel()]]
+
+        w = sg.Window(win_title, layout, icon=ico_path[platform]['pecg'])
+        runner = None
+        t1 = 0
+        while True:
+            e, v = w.Read(timeout=100)
+            if e is None or e == 'Cancel':
+                if runner is not None:
+                    runner.stop()
+                    runner.join()
+                break
+
+            if runner is not None:
+                if not runner.is_done:
+                    status = f'Status: {runner.phase}, game {runner.done}'
+                    if runner.total:
+                        status += f' of {runner.total}'
+                    w['status_k'].Update(status)
+                    continue
+                elapse = int(time.perf_counter() - t1)
+                result = runner.result
+                if runner.is_failed:
+                    status = f'Status: {tool} failed, see pecg_log.txt.'
+                elif tool == 'Merge':
+                    status = f'Status: {result} files merged.'
+                elif tool == 'Split':
+                    status = f'Status: {result[0]} games written to {result[1]} files.'
+                elif tool == 'Sort':
+                    status = f'Status: {result} games sorted.'
+                elif tool == 'Convert to Database':
+                    status = f'Status: {result} games converted.'
+                elif tool == 'Export Database':
+                    status = f'Status: {result} games exported.'
+                else:
+                    status = f'Status: {result[1]} duplicates of {result[0]} games removed.'
+                if not runner.is_failed:
+                    status += f' Done! in {elapse}s'
+                w['status_k'].Update(status)
+                runner = None
+                w['Run'].Update(disabled=False)
+
+            if e == 'Run':
+                pgn_files = [f for f in v['pgn_k'].split(';') if f]
+                out = v['out_k'].strip()
+                if not pgn_files or not all(os.path.isfile(f) for f in pgn_files) or not out:
+                    w['status_k'].Update('Status: Choose existing input files and an output.')
+                    continue
+                if os.path.abspath(out) in [os.path.abspath(f) for f in pgn_files]:
+                    w['status_k'].Update('Status: The output must not be an input file.')
+                    continue
+                if tool == 'Merge':
+                    runner = PgnToolRunner(merge_pgn_files, pgn_files, out)
+                elif tool == 'Split':
+                    if not os.path.isdir(out):
+                        w['status_k'].Update('Status: Choose an existing folder.')
+                        continue
+                    runner = PgnToolRunner(split_pgn_file, pgn_files[0], out, v['by_k'])
+                elif tool == 'Sort':
+                    runner = PgnToolRunner(sort_pgn_file, pgn_files[0], out, v['by_k'])
+                elif tool == 'Convert to Database':
+                    if not out.lower().endswith(PECGDB_SUFFIX):
+                        out += PECGDB_SUFFIX
+                    runner = PgnToolRunner(convert_pgn_to_db, pgn_files[0], out)
+                elif tool == 'Export Database':
+                    runner = PgnToolRunner(export_db_to_pgn, pgn_files[0], out)
+                else:
+                    runner = PgnToolRunner(dedup_pgn_file, pgn_files[0], out)
+                runner.start()
+                t1 = time.perf_counter()
+                w['Run'].Update(disabled=True)
+        w.Close()
+
     def delete_player(self, name, pgn, que):
         """
-        Delete games of player name in pgn.
+        Delete games of player name in pgn, see delete_player_games().
 
         :param name:
         :param pgn:
@@ -1674,54 +5764,20 @@ class EasyChessGui:
         :return:
         """
         logging.info('Enters delete_player()')
+        logging.info(f'Deleting player {name}.')
 
-        pgn_path = Path(pgn)
-        folder_path = pgn_path.parents[0]
-
-        file = PurePath(pgn)
-        pgn_file = file.name
-
-        # Create backup of orig
-        backup = pgn_file + '.backup'
-        backup_path = Path(folder_path, backup)
-        backup_path.touch()
-        origfile_text = Path(pgn).read_text()
-        backup_path.write_text(origfile_text)
-        logging.info(f'backup copy {backup_path} is successfully created.')
-
-        # Define output file
-        output = 'out_' + pgn_file
-        output_path = Path(folder_path, output)
-        logging.info(f'output {output_path} is successfully created.')
+        def progress(phase, games):
+            que.put('Delete, {}, processing game {}'.format(name, games))
 
-        logging.info(f'Deleting player {name}.')
-        gcnt = 0
-
-        # read pgn and save each game if player name to be deleted is not in
-        # the game, either white or black.
-        with open(output_path, 'a') as f:
-            with open(pgn_path) as h:
-                game = chess.pgn.read_game(h)
-                while game:
-                    gcnt += 1
-                    que.put('Delete, {}, processing game {}'.format(
-                        name, gcnt))
-                    wp = game.headers['White']
-                    bp = game.headers['Black']
-
-                    # If this game has no player with name to be deleted
-                    if wp != name and bp != name:
-                        f.write('{}\n\n'.format(game))
-                    game = chess.pgn.read_game(h)
-
-        if output_path.exists():
-            logging.info(f'Deleting player {name} is successful.')
-
-            # Delete the orig file and rename the current output to orig file
-            pgn_path.unlink()
-            logging.info('Delete orig pgn file')
-            output_path.rename(pgn_path)
-            logging.info('Rename output to orig pgn file')
+        try:
+            _, deleted = delete_player_games(pgn, name, progress)
+            if deleted:
+                logging.info(f'backup copy {pgn}.backup is successfully created.')
+                logging.info(f'Deleting player {name} is successful, {deleted} games deleted.')
+            else:
+                logging.info(f'Player {name} has no games in {pgn}.')
+        except Exception:
+            logging.exception(f'Failed to delete player {name}.')
 
         que.put('Done')
 
@@ -1729,18 +5785,13 @@ class EasyChessGui:
         logging.info('Enters get_players()')
         players = []
         games = 0
-        with open(pgn) as h:
-            while True:
-                headers = chess.pgn.read_headers(h)
-                if headers is None:
-                    break
+        for _, _, headers in scan_pgn_games(pgn):
+            wp = headers.get('White', '?')
+            bp = headers.get('Black', '?')
 
-                wp = headers['White']
-                bp = headers['Black']
-
-                players.append(wp)
-                players.append(bp)
-                games += 1
+            players.append(wp)
+            players.append(bp)
+            games += 1
 
         p = list(set(players))
         ret = [p, games]
@@ -1938,6 +5989,15 @@ class EasyChessGui:
         return min(REVIEW_ANALYSIS_TIME_MAX,
                    max(REVIEW_ANALYSIS_TIME_MIN, value))
 
+    def _read_eval_graph_depth(self, value, fallback):
+        """Parse and clamp the eval graph depth, falling back if invalid."""
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            logging.info('Invalid eval graph depth %r; keeping %s.', value, fallback)
+            return fallback
+        return min(REVIEW_EVAL_GRAPH_DEPTH_MAX, max(0, value))
+
     def load_settings(self):
         """Load persisted Settings/Game values from the settings file.
 
@@ -1957,10 +6017,18 @@ class EasyChessGui:
             self.is_save_time_left = bool(data['is_save_time_left'])
         if 'is_time_forfeit_enabled' in data:
             self.is_time_forfeit_enabled = bool(data['is_time_forfeit_enabled'])
+        if 'is_record_uci_session' in data:
+            self.is_record_uci_session = bool(data['is_record_uci_session'])
+            self.apply_uci_session_recording()
+        if data.get('board_renderer') in BOARD_RENDERERS:
+            self.board_renderer = data['board_renderer']
         for key in ('review_analysis_time_sec', 'review_threat_time_sec'):
             if key in data:
                 setattr(self, key,
                         self._read_review_time(data[key], getattr(self, key)))
+        if 'review_eval_graph_depth' in data:
+            self.review_eval_graph_depth = self._read_eval_graph_depth(
+                data['review_eval_graph_depth'], self.review_eval_graph_depth)
         if 'adviser_movetime_sec' in data:
             self.adviser_movetime_sec = self._read_review_time(
                 data['adviser_movetime_sec'], self.adviser_movetime_sec)
@@ -1976,18 +6044,29 @@ class EasyChessGui:
         if 'review_pgn_file' in data:
             self.review_pgn_file = data['review_pgn_file']
             if self.review_pgn_file and os.path.isfile(self.review_pgn_file):
-                try:
-                    self.review_games, _ = self.load_pgn_games(self.review_pgn_file)
-                except Exception:
-                    logging.exception('Failed to auto-load PGN games from saved path.')
+                self.set_review_games_loader(
+                    self.start_review_games_loader(self.review_pgn_file))
+        if data.get('explorer_pgn_file'):
+            self.explorer_pgn_file = data['explorer_pgn_file']
+            self.start_opening_explorer(self.explorer_pgn_file)
+
+    def apply_uci_session_recording(self):
+        """Start or stop the UCI session recorder to match the setting."""
+        if self.is_record_uci_session:
+            uci_session_recorder.start()
+        else:
+            uci_session_recorder.stop()
 
     def save_settings(self):
         """Persist Settings/Game values to the settings file."""
         data = {
             'is_save_time_left': self.is_save_time_left,
             'is_time_forfeit_enabled': self.is_time_forfeit_enabled,
+            'is_record_uci_session': self.is_record_uci_session,
+            'board_renderer': self.board_renderer,
             'review_analysis_time_sec': self.review_analysis_time_sec,
             'review_threat_time_sec': self.review_threat_time_sec,
+            'review_eval_graph_depth': self.review_eval_graph_depth,
             'opp_id_name': self.opp_id_name,
             'adviser_id_name': self.adviser_id_name,
             'analysis_id_name': self.analysis_id_name,
@@ -1997,6 +6076,7 @@ class EasyChessGui:
             'auto_analysis_time_sec': self.auto_analysis_time_sec,
             'role_engine_options': self.role_engine_options,
             'review_pgn_file': self.review_pgn_file,
+            'explorer_pgn_file': self.explorer_pgn_file,
         }
         try:
             with open(self.settings_file, 'w') as json_file:
@@ -2621,78 +6701,23 @@ class EasyChessGui:
 
     def fen_to_psg_board(self, window):
         """ Update psg_board based on FEN """
-        psgboard = []
-
         # Get piece locations only to build psg board
         pc_locations = self.fen.split()[0]
-
-        board = chess.BaseBoard(pc_locations)
-        old_r = None
-
-        for s in chess.SQUARES:
-            r = chess.square_rank(s)
-
-            if old_r is None:
-                piece_r = []
-            elif old_r != r:
-                psgboard.append(piece_r)
-                piece_r = []
-            elif s == 63:
-                psgboard.append(piece_r)
-
-            try:
-                pc = board.piece_at(s ^ 56)
-            except Exception:
-                pc = None
-                logging.exception('Failed to get piece.')
-
-            if pc is not None:
-                pt = pc.piece_type
-                c = pc.color
-                if c:
-                    if pt == chess.PAWN:
-                        piece_r.append(PAWNW)
-                    elif pt == chess.KNIGHT:
-                        piece_r.append(KNIGHTW)
-                    elif pt == chess.BISHOP:
-                        piece_r.append(BISHOPW)
-                    elif pt == chess.ROOK:
-                        piece_r.append(ROOKW)
-                    elif pt == chess.QUEEN:
-                        piece_r.append(QUEENW)
-                    elif pt == chess.KING:
-                        piece_r.append(KINGW)
-                else:
-                    if pt == chess.PAWN:
-                        piece_r.append(PAWNB)
-                    elif pt == chess.KNIGHT:
-                        piece_r.append(KNIGHTB)
-                    elif pt == chess.BISHOP:
-                        piece_r.append(BISHOPB)
-                    elif pt == chess.ROOK:
-                        piece_r.append(ROOKB)
-                    elif pt == chess.QUEEN:
-                        piece_r.append(QUEENB)
-                    elif pt == chess.KING:
-                        piece_r.append(KINGB)
-
-            # Else if pc is None or square is empty
-            else:
-                piece_r.append(BLANK)
-
-            old_r = r
-
-        self.psg_board = psgboard
+        self.psg_board = board_to_psg_board(chess.BaseBoard(pc_locations))
         self.redraw_board(window)
 
     def change_square_color(self, window, row, col):
         """
         Change the color of a square based on square row and col.
         """
-        btn_sq = window.find_element(key=(row, col))
         is_dark_square = True if (row + col) % 2 else False
         bd_sq_color = self.move_sq_dark_color if is_dark_square else self.move_sq_light_color
-        btn_sq.Update(button_color=('white', bd_sq_color))
+        self.get_board_view(window).set_square(row, col, color=bd_sq_color)
+
+    def restore_square_color(self, window, row, col):
+        """Restore the plain board color of a square."""
+        color = self.sq_dark_color if (row + col) % 2 else self.sq_light_color
+        self.get_board_view(window).set_square(row, col, color=color)
 
     def relative_row(self, s, stm):
         """
@@ -2726,18 +6751,24 @@ class EasyChessGui:
         """
         Redraw board at start and afte a move.
 
+        Only squares whose piece or color differs from what is already
+        shown are updated, see ButtonBoardView.
+
         :param window:
         :return:
         """
-        for i in range(8):
-            for j in range(8):
-                color = self.sq_dark_color if (i + j) % 2 else \
-                        self.sq_light_color
-                piece_image = images[self.psg_board[i][j]]
-                elem = window.find_element(key=(i, j))
-                elem.Update(button_color=('white', color),
-                            image_filename=piece_image, )
-        self.configure_board_widgets(window)
+        self.get_board_view(window).render(
+            self.psg_board, self.sq_light_color, self.sq_dark_color)
+
+    def get_board_view(self, window):
+        """Returns the incremental board view of window, create it if needed."""
+        if self.board_view is None or self.board_view.window is not window:
+            if window.find_element(BOARD_CANVAS_KEY, silent_on_error=True) is not None:
+                self.board_view = CanvasBoardView(
+                    window, BOARD_CANVAS_KEY, lambda: self.is_user_white)
+            else:
+                self.board_view = ButtonBoardView(window)
+        return self.board_view
 
     def configure_board_widgets(self, window):
         """Configure board square Tkinter buttons to ensure no gaps or borders."""
@@ -2747,10 +6778,7 @@ class EasyChessGui:
                 elem = window.find_element(key=(i, j), silent_on_error=True)
                 if elem is not None and elem.Widget is not None:
                     try:
-                        if platform == 'linux':
-                            elem.Widget.configure(borderwidth=0, bd=0, highlightthickness=0, padx=0, pady=0, relief='flat', width=58, height=58)
-                        else:
-                            elem.Widget.configure(borderwidth=0, bd=0, highlightthickness=0, padx=0, pady=0, relief='flat')
+                        configure_board_square(elem.Widget)
                         configured_count += 1
                     except Exception as e:
                         logging.warning('Failed to configure board square widget (%d, %d): %s', i, j, e)
@@ -2765,6 +6793,10 @@ class EasyChessGui:
         self._widget_to_square = {}
         self._drag_window = window
         window.refresh()
+        if window.find_element(BOARD_CANVAS_KEY, silent_on_error=True) is not None:
+            # The canvas board binds its own click and drag events.
+            self.get_board_view(window)
+            return
         self.configure_board_widgets(window)
         for i in range(8):
             for j in range(8):
@@ -2803,10 +6835,10 @@ class EasyChessGui:
             try:
                 root = self._drag_window.TKroot
                 # Lift the piece: blank the source square image only.
-                self._drag_window.find_element(key=(row, col)).Update(
-                    image_filename=images[BLANK])
-                self._drag_photo = tk.PhotoImage(
-                    file=images[self._drag_piece], master=root)
+                self.get_board_view(self._drag_window).set_square(
+                    row, col, piece=BLANK)
+                self._drag_photo = piece_image_cache.get(
+                    root, images[self._drag_piece])
                 ghost = tk.Toplevel(root)
                 ghost.overrideredirect(True)
                 ghost.attributes('-topmost', True)
@@ -2870,8 +6902,8 @@ class EasyChessGui:
         # cancelled drag keeps the piece on its origin square.
         if had_ghost and drag_piece is not None:
             try:
-                self._drag_window.find_element(key=source).Update(
-                    image_filename=images[drag_piece])
+                self.get_board_view(self._drag_window).set_square(
+                    *source, piece=drag_piece)
             except Exception:
                 logging.exception('Failed to restore dragged piece image.')
 
@@ -2894,13 +6926,17 @@ class EasyChessGui:
             self._drag_window.write_event_value(
                 '__drag_move__', (source, target_square))
 
-    def render_square(self, image, key, location):
-        """ Returns an RButton (Read Button) with image image """
+    def render_square(self, key, location):
+        """Returns an RButton (Read Button) without an image.
+
+        The piece image is set from the shared image cache once the window
+        is finalized, see set_button_piece_image().
+        """
         if (location[0] + location[1]) % 2:
             color = self.sq_dark_color  # Dark square
         else:
             color = self.sq_light_color
-        return sg.RButton('', image_filename=image, size=(1, 1),
+        return sg.RButton('', size=(1, 1),
                           border_width=0, button_color=('white', color),
                           pad=(0, 0), key=key)
 
@@ -2916,12 +6952,11 @@ class EasyChessGui:
 
         psg_promote_board = copy.deepcopy(white_init_promote_board) if stm else copy.deepcopy(black_init_promote_board)
 
-        # Loop through board and create buttons with images.
+        # Loop through board and create buttons, the piece images are
+        # taken from the shared image cache once the window exists.
         for i in range(1):
             for j in range(4):
-                piece_image = images[psg_promote_board[i][j]]
-                row.append(self.render_square(piece_image, key=(i, j),
-                                              location=(i, j)))
+                row.append(self.render_square(key=(i, j), location=(i, j)))
 
             board_layout.append(row)
 
@@ -2929,8 +6964,14 @@ class EasyChessGui:
                                  board_layout,
                                  default_button_element_size=(12, 1),
                                  auto_size_buttons=False,
+                                 finalize=True,
                                  icon=ico_path[platform]['pecg'])
 
+        for i in range(1):
+            for j in range(4):
+                set_button_piece_image(promo_window.find_element(key=(i, j)),
+                                       psg_promote_board[i][j])
+
         while True:
             button, value = promo_window.Read(timeout=0)
             if button is None:
@@ -3296,7 +7337,8 @@ class EasyChessGui:
                             period_moves=0,
                             is_stream_search_info=True,
                             option_overrides=self.get_role_options(
-                                'adviser', self.adviser_id_name)
+                                'adviser', self.adviser_id_name),
+                            role='adviser'
                         )
                         search.get_board(board)
                         search.daemon = True
@@ -3512,11 +7554,7 @@ class EasyChessGui:
                             # If a click-based move was in progress, restore
                             # the color of the previously selected square
                             if move_state == 1:
-                                prev_color = self.sq_dark_color \
-                                    if (move_from[0] + move_from[1]) % 2 \
-                                    else self.sq_light_color
-                                window.find_element(key=move_from).Update(
-                                    button_color=('white', prev_color))
+                                self.restore_square_color(window, *move_from)
 
                             # Set up state as if source square was clicked
                             move_from = drag_from
@@ -3554,15 +7592,11 @@ class EasyChessGui:
                             is_promote = False
                             move_to = button
                             to_row, to_col = move_to
-                            button_square = window.find_element(key=(fr_row, fr_col))
 
                             # If move is cancelled, pressing same button twice
                             if move_to == move_from:
-                                # Restore the color of the pressed board square
-                                color = self.sq_dark_color if (to_row + to_col) % 2 else self.sq_light_color
-
                                 # Restore the color of the fr square
-                                button_square.Update(button_color=('white', color))
+                                self.restore_square_color(window, fr_row, fr_col)
                                 move_state = 0
                                 continue
 
@@ -3657,11 +7691,9 @@ class EasyChessGui:
                             # Else if move is illegal
                             else:
                                 move_state = 0
-                                color = self.sq_dark_color \
-                                    if (move_from[0] + move_from[1]) % 2 else self.sq_light_color
 
                                 # Restore the color of the fr square
-                                button_square.Update(button_color=('white', color))
+                                self.restore_square_color(window, *move_from)
                                 continue
 
                 if (is_new_game or is_exit_game or is_exit_app or
@@ -3695,7 +7727,8 @@ class EasyChessGui:
                         period_moves=board.fullmove_number,
                         existing_engine=persistent_engine,
                         option_overrides=self.get_role_options(
-                            'opponent', self.opp_id_name)
+                            'opponent', self.opp_id_name),
+                        role='opponent'
                     )
                     search.get_board(board)
                     search.daemon = True
@@ -3964,26 +7997,41 @@ class EasyChessGui:
         with open(self.pecg_auto_save_game, mode='a+') as f:
             f.write('{}\n\n'.format(self.game))
 
-    def load_pgn_games(self, pgn, max_games=REVIEW_MAX_DISPLAY_GAMES):
-        """Load review game headers up to a display limit."""
-        games = []
-        is_truncated = False
-        with open(pgn, encoding='utf-8', errors='replace') as h:
-            while len(games) < max_games:
-                offset = h.tell()
-                headers = chess.pgn.read_headers(h)
-                if headers is None:
-                    break
-                games.append({'offset': offset, 'headers': headers})
-
-            if len(games) == max_games and chess.pgn.read_headers(h) is not None:
-                is_truncated = True
-
-        return games, is_truncated
+    def start_review_games_loader(self, pgn_file):
+        """Index pgn_file in the background, returns the PgnGamesLoader.
 
-    def load_review_game(self, pgn, game_entry):
-        """Load a single review game from its file offset."""
-        with open(pgn, encoding='utf-8', errors='replace') as h:
+        A .pecgdb game database gets a PecgDbGamesLoader instead.
+        """
+        if pgn_file.lower().endswith(PECGDB_SUFFIX):
+            loader = PecgDbGamesLoader(pgn_file)
+        else:
+            loader = PgnGamesLoader(pgn_file)
+        loader.start()
+        return loader
+
+    def set_review_games_loader(self, loader):
+        """Make loader the source of self.review_games, stop the old one."""
+        if self.review_games_loader is not None \
+                and self.review_games_loader is not loader:
+            self.review_games_loader.stop()
+            self.review_position_index = None
+            # Its prepared games are of the old loader.
+            self.stop_review_prefetcher()
+        self.review_games_loader = loader
+        self.review_games = loader.games if loader is not None else []
+
+    def load_review_game(self, pgn, game_entry, loader=None):
+        """Load a single review game from its file offset.
+
+        The game is read by loader, by default the review games loader when
+        it reads pgn; this is the only way to read a game of a database.
+        """
+        if loader is None and self.review_games_loader is not None \
+                and self.review_games_loader.pgn_file == pgn:
+            loader = self.review_games_loader
+        if loader is not None:
+            return loader.read_game(game_entry)
+        with open_pgn(pgn) as h:
             h.seek(game_entry['offset'])
             return chess.pgn.read_game(h)
 
@@ -3997,191 +8045,480 @@ class EasyChessGui:
         date = headers.get('Date', '?')
         return f'{index + 1:>3}. {white} vs {black} | {result} | {event} | {date}'
 
-    def select_review_game(self, pgn_file=None, games=None):
-        """Ask user to select a game from a pgn file."""
-        if games is None:
-            games = []
-
-        selected_games = games
-        selected_pgn = pgn_file or ''
-        is_truncated = False
+    def select_review_game(self, pgn_file=None, game_indexes=None):
+        """Ask user to select a game from a pgn file.
 
-        # Auto-load games if a valid PGN file path is passed but no games are loaded yet
-        if selected_pgn and not selected_games:
-            if os.path.isfile(selected_pgn):
-                try:
-                    selected_games, is_truncated = self.load_pgn_games(selected_pgn)
-                except Exception:
-                    logging.exception(f'Failed to auto-load PGN games from {selected_pgn}')
+        Games are indexed by a background PgnGamesLoader and the list fills
+        while the dialog is open; only the visible rows are built, see
+        VirtualListbox. The loader of the chosen file becomes the source of
+        self.review_games and keeps indexing after the dialog closes.
 
-        selection_list = [
-            self.get_review_game_text(game, index)
-            for index, game in enumerate(selected_games)
-        ]
+        The filter fields query the loader's PgnHeaderFilter; the list then
+        shows the matching games only. game_indexes limits the list of
+        pgn_file to those games, the filter then narrows them further.
+        """
+        selected_pgn = pgn_file or ''
+        loader = None
+        if self.review_games_loader is not None \
+                and self.review_games_loader.pgn_file == selected_pgn:
+            loader = self.review_games_loader
+        elif selected_pgn and os.path.isfile(selected_pgn):
+            loader = self.start_review_games_loader(selected_pgn)
 
         layout = [
             [sg.Text('PGN', size=(4, 1)),
              sg.Input(default_text=selected_pgn, key='pgn_k', expand_x=True, enable_events=True),
              sg.FileBrowse()],
             [sg.Button('Display Games', expand_x=True)],
+            [sg.Text('Player', size=(6, 1)), sg.Input(key='filter_player_k', size=(18, 1)),
+             sg.Text('White', size=(6, 1)), sg.Input(key='filter_white_k', size=(18, 1)),
+             sg.Text('Black', size=(6, 1)), sg.Input(key='filter_black_k', size=(18, 1))],
+            [sg.Text('Event', size=(6, 1)), sg.Input(key='filter_event_k', size=(18, 1)),
+             sg.Text('ECO', size=(6, 1)), sg.Input(key='filter_eco_k', size=(18, 1)),
+             sg.Text('Result', size=(6, 1)),
+             sg.Combo(['', '1-0', '0-1', '1/2-1/2', '*'], default_value='',
+                      key='filter_result_k', readonly=True, size=(16, 1))],
+            [sg.Text('Date', size=(6, 1),
+                     tooltip='YYYY, YYYY.MM or YYYY.MM.DD'),
+             sg.Input(key='filter_date_from_k', size=(10, 1)), sg.Text('to'),
+             sg.Input(key='filter_date_to_k', size=(10, 1)),
+             sg.Text('Elo', size=(4, 1), tooltip='Both players are within the range.'),
+             sg.Input(key='filter_elo_min_k', size=(5, 1)), sg.Text('to'),
+             sg.Input(key='filter_elo_max_k', size=(5, 1)),
+             sg.Push(), sg.Button('Filter'), sg.Button('Clear Filter')],
             [sg.Text('Status: Load a PGN, select a game, then press OK.',
                      key='status_k', relief='sunken', expand_x=True)],
-            [sg.Listbox(selection_list, size=(74, 12), key='game_k',
-                        expand_x=True)],
+            [sg.Listbox([], size=(74, REVIEW_GAME_LIST_ROWS), key='game_k',
+                        expand_x=True, enable_events=True, no_scrollbar=True),
+             sg.Slider(range=(0, 0), orientation='v', key='game_scroll_k',
+                       size=(REVIEW_GAME_LIST_ROWS - 1, 15), resolution=1,
+                       enable_events=True, disable_number_display=True)],
             [sg.Button('OK'), sg.Cancel()]
         ]
 
         w = sg.Window('Review/Load PGN', layout,
                       icon=ico_path[platform]['pecg'], finalize=True)
 
-        # Update initial selection and status message if games are loaded
-        if selected_games:
-            w['game_k'].Update(selection_list, set_to_index=[0])
-            if is_truncated:
-                w['status_k'].Update(
-                    f'Status: Showing first {len(selected_games)} games only. Select one and press OK.')
-            else:
-                w['status_k'].Update(
-                    f'Status: Loaded {len(selected_games)} game(s). Select one and press OK.')
+        # Indexes of the games matching the filter, None shows every game.
+        base_view = list(game_indexes) if game_indexes is not None else None
+        view = base_view
+        query = None
+        query_time = 0
+
+        def game_text(index):
+            game_index = view[index] if view is not None else index
+            return self.get_review_game_text(loader.games[game_index], game_index)
 
+        game_list = VirtualListbox(w, 'game_k', 'game_scroll_k',
+                                   REVIEW_GAME_LIST_ROWS, game_text)
+        shown_status = None
         selected_game = None
+        # Path typed into pgn_k, loaded REVIEW_PGN_INPUT_DEBOUNCE_SEC after
+        # the last keystroke instead of on every key.
+        typed_pgn = None
+        typed_time = 0
 
         while True:
             e, v = w.Read(timeout=50)
             if e is None or e == 'Cancel':
                 break
 
-            if e == 'Display Games' or e == 'pgn_k':
-                new_pgn = v['pgn_k']
+            if game_list.handle_event(e, v):
+                continue
+
+            if e == 'pgn_k':
+                typed_pgn, typed_time = v['pgn_k'], time.time()
+                continue
+
+            if e == 'Display Games' or (
+                    e == sg.TIMEOUT_KEY and typed_pgn is not None
+                    and time.time() - typed_time >= REVIEW_PGN_INPUT_DEBOUNCE_SEC):
+                new_pgn = v['pgn_k'] if e == 'Display Games' else typed_pgn
+                typed_pgn = None
                 if not new_pgn:
                     if e == 'Display Games':
                         w['status_k'].Update('Status: Please choose a PGN file.')
                     continue
 
                 # For auto-loading via typing/browsing event, only proceed if it exists as a file
-                if e == 'pgn_k' and not os.path.isfile(new_pgn):
+                if not os.path.isfile(new_pgn):
+                    if e == 'Display Games':
+                        w['status_k'].Update(
+                            'Status: Failed to read PGN file. Check the file path and encoding.')
                     continue
 
+                # Never run two loaders on one file, they would both write
+                # its index: keep a loader already reading it, and let a
+                # replaced loader finish before the next one starts.
+                if loader is None or loader.pgn_file != new_pgn or loader.is_failed:
+                    if loader is not None and loader is not self.review_games_loader:
+                        loader.stop()
+                        loader.join()
+                    if self.review_games_loader is not None \
+                            and self.review_games_loader.pgn_file == new_pgn \
+                            and not self.review_games_loader.is_failed:
+                        loader = self.review_games_loader
+                    else:
+                        loader = self.start_review_games_loader(new_pgn)
                 selected_pgn = new_pgn
-                try:
-                    selected_games, is_truncated = self.load_pgn_games(selected_pgn)
-                except (FileNotFoundError, OSError, UnicodeError) as exc:
-                    logging.exception(
-                        f'Failed to load pgn games from {selected_pgn}: {exc}')
-                    w['status_k'].Update(
-                        'Status: Failed to read PGN file. Check the file path and encoding.')
-                    selected_games = []
-                    w['game_k'].Update([])
-                    continue
-
-                if not selected_games:
-                    w['status_k'].Update('Status: No games found in PGN file.')
-                    w['game_k'].Update([])
-                    continue
+                view = base_view = None
+                game_list.set_count(0)
+                shown_status = None
+                continue
 
-                selection_list = [
-                    self.get_review_game_text(game, index)
-                    for index, game in enumerate(selected_games)
-                ]
-                w['game_k'].Update(selection_list, set_to_index=[0])
-                if is_truncated:
-                    w['status_k'].Update(
-                        f'Status: Showing first {len(selected_games)} games only. Select one and press OK.')
+            if e in ('Filter', 'Clear Filter'):
+                if e == 'Clear Filter':
+                    for key in ('player', 'white', 'black', 'event', 'eco',
+                                'result', 'date_from', 'date_to', 'elo_min',
+                                'elo_max'):
+                        w['filter_{}_k'.format(key)].Update('')
+                    query = None
                 else:
-                    w['status_k'].Update(
-                        f'Status: Loaded {len(selected_games)} game(s). Select one and press OK.')
+                    try:
+                        query = self.read_review_filter(v)
+                    except ValueError:
+                        w['status_k'].Update('Status: Elo must be a number.')
+                        continue
+                view = base_view
+                if query is not None and loader is not None:
+                    view = self.search_review_games(loader, query, base_view)
+                    query_time = time.time()
+                game_list.set_count(0)
+                shown_status = None
                 continue
 
             if e == 'OK':
-                try:
-                    selected_text = v['game_k'][0]
-                except IndexError:
+                if loader is None or game_list.selected is None:
                     w['status_k'].Update('Status: Please select a game.')
                     continue
-
+                selected_index = game_list.selected
+                if view is not None:
+                    selected_index = view[selected_index]
+                prepared = self.take_prefetched_review_game(loader, selected_index)
+                tree = None
                 try:
-                    selected_index = int(selected_text.split('.', 1)[0]) - 1
-                except (IndexError, ValueError):
-                    w['status_k'].Update('Status: Please select a valid game.')
-                    continue
-                if not 0 <= selected_index < len(selected_games):
-                    w['status_k'].Update('Status: Please select a valid game.')
-                    continue
-                selected_game_obj = self.load_review_game(
-                    selected_pgn, selected_games[selected_index])
+                    if prepared is not None:
+                        selected_game_obj, tree = prepared
+                    else:
+                        selected_game_obj = self.load_review_game(
+                            selected_pgn, loader.games[selected_index], loader)
+                except Exception:
+                    logging.exception('Failed to load game %d of %s.',
+                                      selected_index, selected_pgn)
+                    selected_game_obj = None
                 if selected_game_obj is None:
                     w['status_k'].Update('Status: Failed to load selected game.')
                     continue
 
+                self.set_review_games_loader(loader)
                 selected_game = {
                     'pgn_file': selected_pgn,
-                    'games': selected_games,
+                    'games': loader.games,
                     'game_index': selected_index,
-                    'game': selected_game_obj
+                    'game': selected_game_obj,
+                    'tree': tree
                 }
                 break
 
+            # Timeout: show the games indexed so far.
+            if loader is None:
+                continue
+            is_done = loader.is_done
+            if view is None:
+                game_list.set_count(len(loader.games))
+            else:
+                # Games still being indexed are matched about once a second.
+                if query is not None \
+                        and loader.header_filter.count < len(loader.games) \
+                        and time.time() - query_time >= 1.0:
+                    view = self.search_review_games(loader, query, base_view)
+                    query_time = time.time()
+                game_list.set_count(len(view))
+            if loader.is_failed:
+                status = 'Status: Failed to read PGN file. Check the file path and encoding.'
+            elif not is_done:
+                status = f'Status: Indexing, {game_list.count} game(s) so far. ' \
+                         'Select one and press OK.'
+            elif view is not None and query is None:
+                status = f'Status: Position found in {len(view)} game(s).'
+            elif view is not None:
+                status = f'Status: Filter matches {len(view)} of {len(loader.games)} game(s).'
+            elif not game_list.count:
+                status = 'Status: No games found in PGN file.'
+            else:
+                status = f'Status: Loaded {game_list.count} game(s). Select one and press OK.'
+            if status != shown_status:
+                w['status_k'].Update(status)
+                shown_status = status
+
+        if loader is not None and loader is not self.review_games_loader:
+            loader.stop()
+            loader.join()
         w.Close()
         return selected_game
 
-    def traverse_review_game(self, node, current_board, indent, is_var):
-        """Recursively traverse game tree to build flat list of moves, boards, and nodes."""
-
-        def traverse_only_move(n, b, ind, is_v):
-            if n.move is None:
-                return b
+    def search_review_games(self, loader, query, base_view=None):
+        """Returns the games of loader matching query, within base_view if given."""
+        view = loader.header_filter.search(**query)
+        if base_view is not None:
+            base = set(base_view)
+            view = [i for i in view if i in base]
+        return view
 
-            # 1. Add starting comment to label if present
-            start_comment = f"{{{n.starting_comment}}} " if n.starting_comment else ""
+    def get_review_position_index(self, loader):
+        """Returns the PgnPositionIndex of the loader's PGN, None if cancelled.
 
-            turn = b.turn
-            fullmove = b.fullmove_number
-            san = b.san(n.move)
-            prefix = f'{fullmove}. ' if turn == chess.WHITE else f'{fullmove}... '
+        The index is brought up to date by a PgnPositionIndexBuilder while a
+        progress window is shown; Cancel keeps the games indexed so far for
+        the next time.
+        """
+        position_index = self.review_position_index
+        if position_index is not None \
+                and position_index.pgn_file == loader.pgn_file \
+                and position_index.count == len(loader.games):
+            return position_index
+
+        builder = PgnPositionIndexBuilder(loader.index)
+        builder.start()
+        layout = [
+            [sg.Text('Indexing positions...', key='status_k', size=(44, 1))],
+            [sg.ProgressBar(max(1, builder.total), orientation='h',
+                            size=(30, 16), key='progress_k')],
+            [sg.Cancel()]
+        ]
+        w = sg.Window('Find Position', layout, icon=ico_path[platform]['pecg'],
+                      finalize=True, modal=True)
+        while not builder.is_done:
+            e, _ = w.Read(timeout=100)
+            if e is None or e == 'Cancel':
+                builder.stop()
+                w['status_k'].Update('Stopping...')
+                w.Refresh()
+                builder.join()
+                break
+            w['progress_k'].UpdateBar(builder.done, max(1, builder.total))
+            w['status_k'].Update(
+                f'Indexing positions, game {builder.done} of {builder.total}...')
+        w.Close()
 
-            # 2. Add ending comment to label if present
-            end_comment = f" {{{n.comment}}}" if n.comment else ""
+        if builder.is_failed:
+            sg.Popup('Failed to index the positions of the PGN file.',
+                     title=BOX_TITLE, icon=ico_path[platform]['pecg'])
+            return None
+        if builder.position_index.count < builder.total:
+            return None
+        self.review_position_index = builder.position_index
+        return builder.position_index
 
-            if is_v:
-                label = '    ' * ind + f'( {start_comment}{prefix}{san}{end_comment} )'
-            else:
-                label = '    ' * ind + f'{start_comment}{prefix}{san}{end_comment}'
+    def find_review_position(self):
+        """Let the user pick a game of the review PGN that reached the current position.
 
-            next_b = b.copy()
-            next_b.push(n.move)
+        Positions are looked up by polyglot key in the PgnPositionIndex, so
+        transpositions are found too. Returns the select_review_game()
+        result with the ply where the position was first reached, or None.
+        """
+        loader = self.review_games_loader
+        if loader is None or not self.review_boards:
+            sg.Popup('Load a PGN game first.', title=BOX_TITLE,
+                     icon=ico_path[platform]['pecg'])
+            return None
+        if not loader.is_done or loader.is_failed:
+            sg.Popup('The PGN file is still being indexed, try again in a moment.',
+                     title=BOX_TITLE, icon=ico_path[platform]['pecg'])
+            return None
+        if loader.index is None:
+            sg.Popup('Find Position needs a PGN file, export the database to PGN first.',
+                     title=BOX_TITLE, icon=ico_path[platform]['pecg'])
+            return None
 
-            self.review_move_labels.append(label)
-            self.review_boards.append(next_b)
-            self.review_nodes.append(n)
-            return next_b
+        position_index = self.get_review_position_index(loader)
+        if position_index is None:
+            return None
+        board = self.review_boards[self.review_move_index]
+        first_ply = {}
+        for game_index, ply in position_index.find(chess.polyglot.zobrist_hash(board)):
+            first_ply.setdefault(game_index, ply)
+        if not first_ply:
+            sg.Popup('No game in this PGN reached the position.',
+                     title=BOX_TITLE, icon=ico_path[platform]['pecg'])
+            return None
 
-        def traverse_continuations(n, b, ind):
-            if not n.variations:
-                return
+        selected_game = self.select_review_game(loader.pgn_file, sorted(first_ply))
+        if selected_game is not None and selected_game['pgn_file'] == loader.pgn_file:
+            selected_game['ply'] = first_ply.get(selected_game['game_index'])
+        return selected_game
 
-            mainline_child = n.variations[0]
-            next_b = traverse_only_move(mainline_child, b, ind, False)
+    def start_opening_explorer(self, pgn_file):
+        """Build or refresh the opening explorer of pgn_file in the background.
 
-            if len(n.variations) > 1:
-                for var_node in n.variations[1:]:
-                    traverse_node(var_node, b, ind + 1, True)
+        The current explorer is closed first, its file may be replaced.
+        """
+        if self.explorer_builder is not None:
+            self.explorer_builder.stop()
+            self.explorer_builder = None
+        if self.opening_explorer is not None:
+            self.opening_explorer.close()
+            self.opening_explorer = None
+        if pgn_file and os.path.isfile(pgn_file):
+            self.explorer_builder = OpeningExplorerBuilder(pgn_file)
+            self.explorer_builder.start()
+
+    def poll_opening_explorer(self, window):
+        """Adopt the explorer of a finished builder and refresh the Explorer tab."""
+        builder = self.explorer_builder
+        if builder is None or not builder.is_done:
+            return
+        self.explorer_builder = None
+        if builder.is_failed:
+            sg.Popup(f'Failed to build the opening explorer of {builder.pgn_file}.',
+                     title=BOX_TITLE, icon=ico_path[platform]['pecg'])
+        elif builder.explorer.records or builder.explorer.count:
+            self.opening_explorer = builder.explorer
+        if window is not None:
+            self.update_review_explorer(window)
+
+    def get_opening_explorer_text(self, board):
+        """Returns the Explorer tab text for board."""
+        builder = self.explorer_builder
+        if builder is not None:
+            if builder.phase == 'index':
+                return 'Indexing games of the explorer PGN...'
+            return f'Building explorer, {builder.done} of {builder.total} games...'
+        if self.opening_explorer is None:
+            return 'Choose a PGN with Game -> Explorer PGN.'
+
+        moves = self.opening_explorer.lookup(board)
+        if not moves:
+            return 'No games with this position.'
+        lines = [f"{'Move':<7}{'Games':>7} {'White':>5} {'Draw':>5} {'Black':>5} {'Elo':>5}  Last"]
+        for stats in moves:
+            games = stats['games']
+            try:
+                san = board.san(stats['move'])
+            except Exception:
+                san = stats['move'].uci()
+            date = str(stats['date']) if stats['date'] else ''
+            if date:
+                date = '{}.{}.{}'.format(date[:4], date[4:6], date[6:]).replace('.00', '.??')
+            lines.append('{:<7}{:>7} {:>4}% {:>4}% {:>4}% {:>5}  {}'.format(
+                san, games, round(100 * stats['white'] / games),
+                round(100 * stats['draws'] / games),
+                round(100 * stats['black'] / games),
+                stats['elo'] or '', date))
+        return '\n'.join(lines)
+
+    def update_review_explorer(self, window):
+        """Show the explorer statistics of the current review position."""
+        board = self.review_boards[self.review_move_index]
+        text = self.get_opening_explorer_text(board)
+        if text != self.review_explorer_text:
+            window['review_explorer_k'].Update(text)
+            self.review_explorer_text = text
 
-            traverse_continuations(mainline_child, next_b, ind)
+    def open_review_game(self, window, selected_game):
+        """Show a select_review_game() result in the review window.
 
-        def traverse_node(n, b, ind, is_v):
-            next_b = traverse_only_move(n, b, ind, is_v)
-            traverse_continuations(n, next_b, ind)
+        With a 'ply' in selected_game the mainline position at that ply is
+        shown instead of the start position.
+        """
+        self.review_pgn_file = selected_game['pgn_file']
+        self.review_games = selected_game['games']
+        self.prepare_review_game(
+            selected_game['game'], selected_game['game_index'],
+            selected_game.get('tree'))
+        ply = selected_game.get('ply')
+        if ply:
+            for i, node in enumerate(self.review_nodes):
+                if node.ply() == ply and node.is_mainline():
+                    self.review_move_index = i
+                    break
+        self.render_review_movelist(window)
+        self.update_review_window(window)
+        self.reset_review_engines_for_new_game(window)
+        self.save_settings()
+        self.prefetch_review_games()
 
-        traverse_node(node, current_board, indent, is_var)
+    def prefetch_review_games(self):
+        """Have the games before and after the review game prepared in the background."""
+        loader = self.review_games_loader
+        if loader is None or self.review_game_index is None \
+                or loader.pgn_file != self.review_pgn_file:
+            return
+        if self.review_prefetcher is None or not self.review_prefetcher.is_alive():
+            self.stop_review_prefetcher()
+            self.review_prefetcher = ReviewGamePrefetcher()
+            self.review_prefetcher.start()
+        self.review_prefetcher.request(
+            loader, (self.review_game_index + 1, self.review_game_index - 1))
+
+    def stop_review_prefetcher(self):
+        """Stop the review game prefetcher and wait for the game it is preparing."""
+        if self.review_prefetcher is not None:
+            self.review_prefetcher.stop()
+            self.review_prefetcher.join()
+            self.review_prefetcher = None
+
+    def take_prefetched_review_game(self, loader, game_index):
+        """Returns the prefetched (game, ReviewTree) of a game, None if not ready."""
+        if self.review_prefetcher is None:
+            return None
+        return self.review_prefetcher.take(loader, game_index)
 
-    def prepare_review_game(self, game, game_index=None):
-        """Prepare move list and board positions for review."""
+    def step_review_game(self, window, step):
+        """Game -> Next Game / Previous Game: open the game step places away."""
+        loader = self.review_games_loader
+        if loader is None or self.review_game_index is None \
+                or loader.pgn_file != self.review_pgn_file:
+            return
+        game_index = self.review_game_index + step
+        if not 0 <= game_index < len(loader.games):
+            return
+        prepared = self.take_prefetched_review_game(loader, game_index)
+        if prepared is None:
+            try:
+                game = self.load_review_game(loader.pgn_file, loader.games[game_index], loader)
+            except Exception:
+                logging.exception('Failed to load game %d of %s.',
+                                  game_index, loader.pgn_file)
+                game = None
+            if game is None:
+                return
+            prepared = (game, None)
+        self.open_review_game(window, {
+            'pgn_file': loader.pgn_file,
+            'games': loader.games,
+            'game_index': game_index,
+            'game': prepared[0],
+            'tree': prepared[1]
+        })
+
+    def read_review_filter(self, values):
+        """Returns the PgnHeaderFilter.search() criteria of the picker, None if empty.
+
+        Raises ValueError if an Elo field is not a number.
+        """
+        query = {key: values['filter_{}_k'.format(key)].strip()
+                 for key in ('player', 'white', 'black', 'event', 'eco',
+                             'result', 'date_from', 'date_to')}
+        for key in ('elo_min', 'elo_max'):
+            value = values['filter_{}_k'.format(key)].strip()
+            query[key] = int(value) if value else 0
+        return query if any(query.values()) else None
+
+    def prepare_review_game(self, game, game_index=None, tree=None):
+        """Prepare move list and board positions for review.
+
+        The ReviewTree built here, or tree when prefetched, also holds the
+        move list text rendered by render_review_movelist().
+        """
         self.review_game = game
         self.review_game_index = game_index
         self.review_move_index = 0
-        self.review_move_labels = ['Start position']
-        self.review_boards = [game.board()]
-        self.review_nodes = [game]
+        self.review_tree = tree if tree is not None else ReviewTree(game)
+        self.review_move_window = None
+        self.review_move_labels = self.review_tree.labels
+        self.review_boards = self.review_tree.boards
+        self.review_nodes = self.review_tree.nodes
         self.review_analysis_lines = [''] * REVIEW_ANALYSIS_MULTIPV_LINES
         self.review_analysis_status = 'Analysis stopped'
         self.review_analysis_enabled = False
@@ -4191,17 +8528,48 @@ class EasyChessGui:
         self.review_threat_enabled = False
         self.review_threat_stale = False
 
-        if game.variations:
-            # Mainline starts at variations[0]
-            self.traverse_review_game(game.variations[0], game.board(), 0, False)
-            # Alternative starting moves (variations) start at variations[1:]
-            for var_node in game.variations[1:]:
-                self.traverse_review_game(var_node, game.board(), 1, True)
+        self.review_book_exit = self.get_book_exit(game)
+
+    def get_book_exit(self, game):
+        """Returns (ply, move label) of the first mainline move of game that
+        is in neither reference book.
+
+        The ply is len(mainline) + 1 when every move is a book move, and the
+        result is None when no reference book exists or game has no moves. All positions are
+        probed at once with BookRegistry.probe_keys().
+        """
+        book_files = [f for f in (self.computer_book_file, self.human_book_file)
+                      if os.path.isfile(f)]
+        if not book_files:
+            return None
+        board = game.board()
+        keys, moves, labels = [], [], []
+        for move in game.mainline_moves():
+            keys.append(chess.polyglot.zobrist_hash(board))
+            moves.append(encode_book_move(board, move))
+            labels.append('{}{} {}'.format(
+                board.fullmove_number, '.' if board.turn else '...', board.san(move)))
+            board.push(move)
+        if not moves:
+            return None
+        book_moves = [set() for _ in keys]
+        for book_file in book_files:
+            for i, found in enumerate(book_registry.probe_keys(book_file, keys)):
+                book_moves[i].update(found)
+        for ply, (move, found) in enumerate(zip(moves, book_moves), 1):
+            if move not in found:
+                return ply, labels[ply - 1]
+        return len(moves) + 1, ''
 
     def set_board_from_board_state(self, window, board):
-        """Update the GUI board from a python-chess board."""
+        """Update the GUI board from a python-chess board.
+
+        The board view only repaints the squares that differ from the
+        previous position.
+        """
         self.fen = board.fen()
-        self.fen_to_psg_board(window)
+        self.psg_board = board_to_psg_board(board)
+        self.redraw_board(window)
 
     def clear_queue(self, work_queue):
         """Remove all queued messages."""
@@ -4347,7 +8715,8 @@ class EasyChessGui:
             existing_engine=self.review_analysis_engine,
             multipv=REVIEW_ANALYSIS_MULTIPV_LINES,
             option_overrides=self.get_role_options(
-                'analysis', self.analysis_id_name)
+                'analysis', self.analysis_id_name),
+            role='analysis'
         )
         search.get_board(self.review_boards[self.review_move_index].copy(stack=False))
         search.is_move_delay = False
@@ -4536,7 +8905,8 @@ class EasyChessGui:
             self.auto_analysis_cancel,
             self.max_depth,
             option_overrides=self.get_role_options(
-                'auto_analysis', config['engine_id_name'])
+                'auto_analysis', config['engine_id_name']),
+            book_plies=self.review_book_exit[0] - 1 if self.review_book_exit else 0
         )
         self.auto_analysis_thread.start()
         window['_gamestatus_'].Update(
@@ -4799,7 +9169,8 @@ class EasyChessGui:
             existing_engine=self.review_threat_engine,
             multipv=1,
             option_overrides=self.get_role_options(
-                'threat', self.threat_id_name)
+                'threat', self.threat_id_name),
+            role='threat'
         )
         search.get_board(threat_board)
         search.is_move_delay = False
@@ -4881,6 +9252,12 @@ class EasyChessGui:
             f"Event: {headers.get('Event', '?')}",
             f"Date: {headers.get('Date', '?')}    Result: {headers.get('Result', '*')}"
         ])
+        if self.review_book_exit is not None:
+            ply, label = self.review_book_exit
+            if label:
+                header_text += f'\nBook: leaves book at ply {ply}, {label}'
+            else:
+                header_text += '\nBook: every move is a book move'
 
         if self.review_pgn_file:
             window['review_pgn_k'].Update(self.review_pgn_file)
@@ -4898,6 +9275,7 @@ class EasyChessGui:
         # Highlight the current move in the multiline
         if 'review_move_list_k' in window.AllKeysDict:
             self.highlight_current_move(window['review_move_list_k'].Widget)
+        self.update_review_eval_cursor(window)
 
         # Update book moves for the current position.
         board = self.review_boards[self.review_move_index]
@@ -4910,12 +9288,26 @@ class EasyChessGui:
                     book_text = all_moves
                     break
         window['review_book_k'].Update(book_text if book_text else 'no book moves')
+        self.update_review_explorer(window)
 
         self.set_board_from_board_state(
             window, self.review_boards[self.review_move_index])
+        self.show_review_last_move(window, board)
         self.update_review_analysis_panel(window)
         self.update_review_threat_panel(window)
 
+    def show_review_last_move(self, window, board):
+        """Draw the move that led to board as an arrow (canvas board only)."""
+        view = self.get_board_view(window)
+        if not view.has_overlays:
+            return
+        arrows = []
+        if board.move_stack:
+            move = board.peek()
+            arrows.append(((self.get_row(move.from_square), self.get_col(move.from_square)),
+                           (self.get_row(move.to_square), self.get_col(move.to_square))))
+        view.set_arrows(arrows)
+
     def build_review_layout(self, is_user_white=True):
         """Create review mode layout with navigation controls."""
         sg.change_look_and_feel(self.gui_theme)
@@ -4934,7 +9326,11 @@ class EasyChessGui:
                                                        disabled=True, expand_x=True, expand_y=True)]], font=FONT_BASE),
                  sg.Tab('Book moves', [[sg.Multiline('', do_not_clear=True, autoscroll=False, size=(52, 4),
                                                      font=FONT_BASE, key='review_book_k',
-                                                     disabled=True, expand_x=True, expand_y=True)]], font=FONT_BASE)]
+                                                     disabled=True, expand_x=True, expand_y=True)]], font=FONT_BASE),
+                 sg.Tab('Explorer', [[sg.Multiline('', do_not_clear=True, autoscroll=False, size=(52, 4),
+                                                   font=FONT_BASE, key='review_explorer_k',
+                                                   disabled=True, wrap_lines=False,
+                                                   expand_x=True, expand_y=True)]], font=FONT_BASE)]
             ], font=FONT_BASE, key='review_tab_group_k', expand_x=True)],
             [sg.Text('Move list', size=(18, 1), font=FONT_BASE)],
             [sg.Multiline('', do_not_clear=True, autoscroll=False,
@@ -4983,12 +9379,24 @@ class EasyChessGui:
             [[nav_buttons, sg.Push(), toggle_buttons]],
             expand_x=True, pad=(0, 0))
 
+        # Evaluation of every mainline position from White's side, filled in
+        # by the eval graph engine; Black's half is shaded.
+        eval_graph = sg.Graph(
+            canvas_size=REVIEW_EVAL_GRAPH_SIZE,
+            graph_bottom_left=(0, -REVIEW_EVAL_GRAPH_CP),
+            graph_top_right=(REVIEW_EVAL_GRAPH_SIZE[0], REVIEW_EVAL_GRAPH_CP),
+            background_color='white', key='review_eval_graph_k',
+            enable_events=True, pad=(0, 0),
+            tooltip='Evaluation of the mainline from White\'s side.\n'
+                    'Click to go to a position.')
+
         board_column = [
             # pad=(0, 0) so the board column's width is exactly the board (no
             # extra side padding); the expand_x button_bar then matches the
             # board's left and right edges precisely.
             [sg.Column(board_layout, pad=(0, 0))],
-            [button_bar]
+            [button_bar],
+            [eval_graph]
         ]
 
         layout = [
@@ -5002,6 +9410,7 @@ class EasyChessGui:
     def create_review_window(self, location=None):
         """Create a review window."""
         layout = self.build_review_layout(self.is_user_white)
+        self.review_explorer_text = None
         window = sg.Window(
             '{} {}'.format(APP_NAME, APP_VERSION),
             layout,
@@ -5096,12 +9505,18 @@ class EasyChessGui:
         self.review_window = review_window
         self.render_review_movelist(review_window)
         self.update_review_window(review_window)
+        self.prefetch_review_games()
 
         while True:
             button, value = review_window.Read(timeout=50)
             self.poll_review_analysis(review_window)
             self.poll_review_threat(review_window)
             self.poll_auto_analysis(review_window)
+            self.poll_opening_explorer(review_window)
+            self.poll_review_move_list(review_window)
+            self.poll_review_eval_graph(review_window)
+            if self.explorer_builder is not None:
+                self.update_review_explorer(review_window)
 
             # Skip timeout events as analysis updates are processed by
             # poll_review_analysis() and poll_review_threat() called earlier.
@@ -5124,6 +9539,8 @@ class EasyChessGui:
                 self.cancel_auto_analysis(review_window)
                 self.close_review_analysis()
                 self.close_review_threat()
+                self.stop_review_eval_graph()
+                self.stop_review_prefetcher()
                 review_window.Close()
                 self.review_window = None
                 sys.exit(0)
@@ -5136,36 +9553,41 @@ class EasyChessGui:
                 self.show_help_topic(button)
                 continue
 
-            if button == 'Load PGN::review_load_pgn_k':
+            if button in ('Load PGN::review_load_pgn_k',
+                          'Select Game::review_select_game_k'):
                 selected_game = self.select_review_game(
-                    self.review_pgn_file, self.review_games)
-                if selected_game is None:
-                    continue
+                    self.review_pgn_file)
+                if selected_game is not None:
+                    self.open_review_game(review_window, selected_game)
+                continue
 
-                self.review_pgn_file = selected_game['pgn_file']
-                self.review_games = selected_game['games']
-                self.prepare_review_game(
-                    selected_game['game'], selected_game['game_index'])
-                self.render_review_movelist(review_window)
-                self.update_review_window(review_window)
-                self.reset_review_engines_for_new_game(review_window)
-                self.save_settings()
+            if button in ('Next Game::review_next_game_k',
+                          'Previous Game::review_prev_game_k'):
+                self.step_review_game(
+                    review_window, 1 if button == 'Next Game::review_next_game_k' else -1)
                 continue
 
-            if button == 'Select Game::review_select_game_k':
-                selected_game = self.select_review_game(
-                    self.review_pgn_file, self.review_games)
-                if selected_game is None:
-                    continue
+            if button == 'review_eval_graph_k':
+                self.on_review_eval_graph_click(value[button])
+                continue
 
-                self.review_pgn_file = selected_game['pgn_file']
-                self.review_games = selected_game['games']
-                self.prepare_review_game(
-                    selected_game['game'], selected_game['game_index'])
-                self.render_review_movelist(review_window)
-                self.update_review_window(review_window)
-                self.reset_review_engines_for_new_game(review_window)
-                self.save_settings()
+            if button == 'Explorer PGN::review_explorer_pgn_k':
+                explorer_pgn = sg.popup_get_file(
+                    'PGN database for the opening explorer',
+                    title='Explorer PGN', default_path=self.explorer_pgn_file,
+                    file_types=PGN_FILE_TYPES,
+                    icon=ico_path[platform]['pecg'])
+                if explorer_pgn:
+                    self.explorer_pgn_file = explorer_pgn
+                    self.start_opening_explorer(explorer_pgn)
+                    self.update_review_explorer(review_window)
+                    self.save_settings()
+                continue
+
+            if button == 'Find Position::review_find_position_k':
+                selected_game = self.find_review_position()
+                if selected_game is not None:
+                    self.open_review_game(review_window, selected_game)
                 continue
 
             if button == 'Auto-Analyze Game::review_auto_analyze_k':
@@ -5290,6 +9712,8 @@ class EasyChessGui:
 
         self.close_review_analysis()
         self.close_review_threat()
+        self.stop_review_eval_graph()
+        self.stop_review_prefetcher()
         review_window.Close()
         self.review_window = None
         self.reset_review_run_state()
@@ -5338,13 +9762,20 @@ class EasyChessGui:
             step = -1
             file_char_name = file_char_name[::-1]
 
-        # Loop through the board and create buttons with images
+        if self.board_renderer == 'canvas':
+            # The squares and pieces are drawn by CanvasBoardView.
+            board_layout.append([sg.Canvas(
+                size=(BOARD_PX, BOARD_PX), key=BOARD_CANVAS_KEY, pad=(0, 0),
+                background_color=self.sq_light_color)])
+            return board_layout
+
+        # Loop through the board and create buttons, redraw_board() shows
+        # the pieces from the shared image cache once the window exists.
         for i in range(start, end, step):
             # Row numbers at left of board is blank
             row = []
             for j in range(start, end, step):
-                piece_image = images[self.psg_board[i][j]]
-                row.append(self.render_square(piece_image, key=(i, j), location=(i, j)))
+                row.append(self.render_square(key=(i, j), location=(i, j)))
             board_layout.append(row)
 
         return board_layout
@@ -5483,6 +9914,11 @@ class EasyChessGui:
         :return:
         """
         engine_id_name = None
+
+        # Load persisted Settings/Game values (checkboxes, review times,
+        # board backend) before the board layout is built.
+        self.load_settings()
+
         layout = self.build_main_layout(True)
 
         # Use white layout as default window
@@ -5495,9 +9931,6 @@ class EasyChessGui:
         # Read user config file, if missing create and new one
         self.check_user_config_file()
 
-        # Load persisted Settings/Game values (checkboxes, review times).
-        self.load_settings()
-
         # If engine config file (pecg_engines.json) is missing, then create it.
         self.check_engine_config_file()
         self.engine_id_name_list = self.get_engine_id_name_list()
@@ -5538,6 +9971,16 @@ class EasyChessGui:
                 logging.info('Quit app from main loop, X is pressed.')
                 break
 
+            # Mode: Neutral, Tools -> PGN operations
+            if button in ('Merge::pgn_tool_k', 'Split::pgn_tool_k',
+                          'Sort::pgn_tool_k', 'Deduplicate::pgn_tool_k',
+                          'Convert to Database::pgn_tool_k',
+                          'Export Database::pgn_tool_k'):
+                window.Hide()
+                self.run_pgn_tool(button.split('::')[0])
+                window.UnHide()
+                continue
+
             # Mode: Neutral, Delete player
             if button == 'Delete Player::delete_player_k':
                 win_title = 'Tools/Delete Player'
@@ -6184,6 +10627,12 @@ class EasyChessGui:
                 continue
 
             # Mode: Neutral, Allow user to change book settings
+            if button == 'Build Book::build_book_k':
+                window.Hide()
+                self.build_polyglot_book()
+                window.UnHide()
+                continue
+
             if button == 'Set Book::book_set_k':
                 # Backup current values, we will restore these value in case
                 # the user presses cancel or X button
@@ -6274,12 +10723,35 @@ class EasyChessGui:
                                          REVIEW_ANALYSIS_TIME_MAX)),
                      sg.Input(default_text=str(self.review_threat_time_sec),
                               key='review_threat_time_k', size=(6, 1))],
+                    [sg.Text('Review eval graph depth', size=(24, 1),
+                             tooltip='Search depth of each position in the\n' +
+                                     'Review evaluation graph (0 to {},\n'.format(
+                                         REVIEW_EVAL_GRAPH_DEPTH_MAX) +
+                                     '0 turns the graph off).'),
+                     sg.Input(default_text=str(self.review_eval_graph_depth),
+                              key='review_eval_graph_depth_k', size=(6, 1))],
+                    [sg.CBox('Record UCI engine sessions',
+                             key='record_uci_session_k',
+                             default=self.is_record_uci_session,
+                             tooltip='Write every UCI line exchanged with\n' +
+                                     'the engines to {}.\n'.format(
+                                         UCI_SESSION_LOG_FILE) +
+                                     'Replay it with --replay-uci.')],
+                    [sg.Text('Board renderer', size=(24, 1),
+                             tooltip='buttons: one button per square.\n' +
+                                     'canvas: the whole board is drawn on\n' +
+                                     'one canvas, faster redraw and drag.'),
+                     sg.Combo(list(BOARD_RENDERERS),
+                              default_value=self.board_renderer,
+                              key='board_renderer_k', readonly=True,
+                              size=(10, 1))],
                     [sg.OK(), sg.Cancel()],
                 ]
 
                 w = sg.Window(win_title, layout,
                               icon=ico_path[platform]['pecg'])
                 window.Hide()
+                is_new_renderer = False
 
                 while True:
                     e, v = w.Read(timeout=10)
@@ -6294,11 +10766,22 @@ class EasyChessGui:
                         self.review_threat_time_sec = self._read_review_time(
                             v['review_threat_time_k'],
                             self.review_threat_time_sec)
+                        self.review_eval_graph_depth = self._read_eval_graph_depth(
+                            v['review_eval_graph_depth_k'],
+                            self.review_eval_graph_depth)
+                        self.is_record_uci_session = v['record_uci_session_k']
+                        self.apply_uci_session_recording()
+                        is_new_renderer = v['board_renderer_k'] != self.board_renderer \
+                            and v['board_renderer_k'] in BOARD_RENDERERS
+                        if is_new_renderer:
+                            self.board_renderer = v['board_renderer_k']
                         self.save_settings()
                         break
 
                 window.UnHide()
                 w.Close()
+                if is_new_renderer:
+                    window = self.create_new_window(window)
                 continue
 
             # Mode: Neutral, Change theme
@@ -6407,7 +10890,33 @@ class EasyChessGui:
         window.Close()
 
 
+def replay_uci_session(argv):
+    """Run as a stand-in UCI engine that replays a recorded session.
+
+    Usage: python_easy_chess_gui.py --replay-uci LOG [--session PID|ROLE]
+    [--speed FACTOR]. Install the command as an engine (or popen it from a
+    benchmark script) to reproduce a user's engine output exactly.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='python_easy_chess_gui.py')
+    parser.add_argument('--replay-uci', required=True, metavar='LOG',
+                        help='UCI session log written by the recorder')
+    parser.add_argument('--session', default=None,
+                        help='engine pid or role to replay (default: first)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='replay speed factor, e.g. 100 for 100x')
+    args = parser.parse_args(argv)
+    UciSessionReplayer(args.replay_uci, args.session, args.speed).run()
+
+
 def main():
+    # The position index workers start the frozen exe again on Windows.
+    multiprocessing.freeze_support()
+
+    if '--replay-uci' in sys.argv[1:]:
+        replay_uci_session(sys.argv[1:])
+        return
+
     if sys.platform == 'win32':
         try:
             import ctypes
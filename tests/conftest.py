@@ -0,0 +1,29 @@
+import logging
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The app configures logging to truncate pecg_log.txt when it is imported
+# unless the root logger has a handler.
+logging.getLogger().addHandler(logging.NullHandler())
+
+DATA_DIR = os.path.join(ROOT, 'tests', 'data')
+
+
+@pytest.fixture
+def games_pgn():
+    """Path of the sample PGN, 8 games with comments, NAGs and variations."""
+    return os.path.join(DATA_DIR, 'games.pgn')
+
+
+@pytest.fixture
+def write_pgn(tmp_path):
+    """Returns a function writing bytes to a PGN file in tmp_path."""
+    def write(data, name='games.pgn'):
+        path = tmp_path / name
+        path.write_bytes(data)
+        return str(path)
+    return write
@@ -0,0 +1,97 @@
+"""CanvasBoardView square placement, on a stand-in for the Tk canvas."""
+import python_easy_chess_gui as pecg
+
+
+class Canvas:
+    """Records the items of a Tk canvas: their coordinates, options and tags."""
+
+    def __init__(self):
+        self.items = {}  # id -> {'coords': [...], 'tags': (...), ...}
+
+    def _create(self, coords, tags=(), **options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, coords=list(coords), tags=tuple(tags))
+        return item
+
+    def create_rectangle(self, *coords, **options):
+        return self._create(coords, **options)
+
+    def create_image(self, *coords, **options):
+        return self._create(coords, **options)
+
+    def create_line(self, *coords, **options):
+        return self._create(coords, **options)
+
+    def coords(self, item, *coords):
+        self.items[item]['coords'] = list(coords)
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+
+    def delete(self, *tags):
+        for item, options in list(self.items.items()):
+            if 'all' in tags or set(tags) & set(options['tags']):
+                del self.items[item]
+
+    def tagged(self, tag):
+        return [options for options in self.items.values() if tag in options['tags']]
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, func):
+        pass
+
+    def tag_lower(self, *args):
+        pass
+
+    def tag_raise(self, *args):
+        pass
+
+
+class Element:
+    def __init__(self):
+        self.TKCanvas = Canvas()
+
+
+def make_view(orientation):
+    window = {pecg.BOARD_CANVAS_KEY: Element()}
+    view = pecg.CanvasBoardView(window, pecg.BOARD_CANVAS_KEY, lambda: orientation[0])
+    return view, window[pecg.BOARD_CANVAS_KEY].TKCanvas
+
+
+def test_orientation_is_read_when_drawing():
+    orientation = [True]
+    view, canvas = make_view(orientation)
+    size = view.square_px
+    rect = canvas.items[view._rect_ids[(0, 1)]]
+    assert rect['coords'] == [size, 0, 2 * size, size]
+    assert view.square_at(size + 1, 1) == (0, 1)
+
+    view.set_arrows([((6, 4), (4, 4))])
+    assert len(canvas.tagged('arrow')) == 1
+    orientation[0] = False
+    view.set_square(0, 1, color='#000000')
+    # Row 0 (rank 8) is now at the bottom, files from h to a.
+    assert rect['coords'] == [6 * size, 7 * size, 7 * size, 8 * size]
+    assert canvas.items[view._piece_ids[(0, 1)]]['coords'] == [6 * size, 7 * size]
+    assert view.square_at(6 * size + 1, 7 * size + 1) == (0, 1)
+    assert canvas.tagged('arrow') == []
+
+
+def test_button_view_has_no_overlays():
+    view = pecg.ButtonBoardView(window=None)
+    assert not view.has_overlays
+    assert view.set_highlights([(0, 0)]) is None
+    assert view.set_arrows([((0, 0), (1, 1))]) is None
+
+
+def test_board_buttons_are_created_without_images():
+    # The piece images come from the shared cache, see set_button_piece_image().
+    gui = pecg.EasyChessGui('Reddit', '', '', '', '', '', False, False, 8)
+    for is_user_white in (True, False):
+        layout = gui.create_board(is_user_white)
+        buttons = [elem for row in layout for elem in row]
+        assert sorted(button.Key for button in buttons) == [
+            (i, j) for i in range(8) for j in range(8)]
+        assert all(button.ImageFilename is None for button in buttons)
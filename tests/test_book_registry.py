@@ -0,0 +1,156 @@
+"""BookRegistry probes against chess.polyglot readers of small generated books."""
+import io
+import os
+
+import chess
+import chess.pgn
+import chess.polyglot
+import pytest
+
+import python_easy_chess_gui as pecg
+
+
+def write_book(book_file, entries):
+    """Write (key, move, weight) entries as a polyglot book, sorted by key."""
+    with open(book_file, 'wb') as h:
+        for key, move, weight in sorted(entries, key=lambda entry: entry[0]):
+            h.write(chess.polyglot.ENTRY_STRUCT.pack(key, move, weight, 0))
+
+
+def game_entries(games_pgn, max_ply=12):
+    """Returns (key, move, weight) of the sample games' opening moves,
+    every third entry of weight 0."""
+    entries = set()
+    with open(games_pgn, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                break
+            board = game.board()
+            for move in list(game.mainline_moves())[:max_ply]:
+                entries.add((chess.polyglot.zobrist_hash(board),
+                             pecg.encode_book_move(board, move)))
+                board.push(move)
+    return [(key, move, i % 3 and i) for i, (key, move) in enumerate(sorted(entries))]
+
+
+@pytest.fixture
+def registry():
+    registry = pecg.BookRegistry()
+    yield registry
+    registry.close()
+
+
+def test_probe_keys_matches_find_all(tmp_path, games_pgn, registry):
+    book_file = str(tmp_path / 'book.bin')
+    entries = game_entries(games_pgn)
+    # A position with only an entry of weight 0.
+    entries.append((0x1234, 0x0123, 0))
+    write_book(book_file, entries)
+    keys = [key for key, _, _ in entries]
+    keys += [0, 0x1234, 2 ** 64 - 1] + keys[:5]
+    assert any(not weight for _, _, weight in entries)
+
+    with chess.polyglot.open_reader(book_file) as reader:
+        expected = [[entry.raw_move for entry in reader.find_all(key)] for key in keys]
+    assert registry.probe_keys(book_file, keys) == expected
+    assert registry.probe_keys(book_file, [0x1234]) == [[]]
+    assert registry.probe_keys(str(tmp_path / 'missing.bin'), keys[:2]) == [[], []]
+
+
+def test_weight_0_moves_are_not_book_moves(tmp_path):
+    book_file = str(tmp_path / 'book.bin')
+    game = chess.pgn.read_game(io.StringIO('1. e4 e5 2. Nf3 *'))
+    board = game.board()
+    moves = list(game.mainline_moves())
+    entries = []
+    for move, weight in zip(moves, [1, 0, 1]):
+        entries.append((chess.polyglot.zobrist_hash(board),
+                        pecg.encode_book_move(board, move), weight))
+        board.push(move)
+    write_book(book_file, entries)
+    gui = pecg.EasyChessGui('Reddit', '', '', '', book_file, '', False, False, 8)
+    gui.prepare_review_game(game)
+    assert gui.review_book_exit == (2, gui.review_move_labels[2])
+    pecg.book_registry.close(book_file)
+
+
+def start_boards(count):
+    """Returns count positions after the first moves of the starting position."""
+    board = chess.Board()
+    boards = []
+    for move in sorted(board.legal_moves, key=lambda move: move.uci())[:count]:
+        board.push(move)
+        boards.append(board.copy())
+        board.pop()
+    return boards
+
+
+def book_moves(board, weights):
+    """Returns entries of board's first legal moves with weights."""
+    moves = sorted(board.legal_moves, key=lambda move: move.uci())
+    key = chess.polyglot.zobrist_hash(board)
+    return [(key, pecg.encode_book_move(board, move), weight)
+            for move, weight in zip(moves, weights)]
+
+
+def test_moves_cache_is_bounded(tmp_path):
+    book_file = str(tmp_path / 'book.bin')
+    boards = start_boards(5)
+    write_book(book_file, [e for board in boards for e in book_moves(board, [1])])
+    registry = pecg.BookRegistry(max_positions=3)
+    try:
+        for board in boards:
+            assert len(registry.moves(book_file, board)) == 1
+        assert len(registry._moves) == 3
+        assert [key[2] for key in registry._moves] == [
+            chess.polyglot.zobrist_hash(board) for board in boards[2:]]
+        # A hit is the most recently used entry.
+        registry.moves(book_file, boards[2])
+        registry.moves(book_file, boards[0])
+        assert [key[2] for key in registry._moves] == [
+            chess.polyglot.zobrist_hash(board) for board in (boards[4], boards[2], boards[0])]
+    finally:
+        registry.close()
+
+
+@pytest.mark.parametrize('weights', [[1, 5], [7, 2, 3]])
+def test_changed_book_is_opened_again(monkeypatch, tmp_path, registry, weights):
+    # Same size with another mtime, or another size.
+    monkeypatch.setattr(pecg, 'BOOK_STAT_INTERVAL_SEC', 0)
+    book_file = str(tmp_path / 'book.bin')
+    board = chess.Board()
+    write_book(book_file, book_moves(board, [4, 3]))
+    with chess.polyglot.open_reader(book_file) as old_reader:
+        old = [(entry.move, entry.weight) for entry in old_reader.find_all(board)]
+    assert registry.moves(book_file, board) == old
+    key = chess.polyglot.zobrist_hash(board)
+    assert registry.probe_keys(book_file, [key]) == [[m for _, m, _ in book_moves(board, [4, 3])]]
+    reader = registry._readers[os.path.abspath(book_file)][0]
+
+    stat = os.stat(book_file)
+    write_book(book_file, book_moves(board, weights))
+    os.utime(book_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    with chess.polyglot.open_reader(book_file) as new_reader:
+        new = [(entry.move, entry.weight) for entry in new_reader.find_all(board)]
+    assert new != old
+    assert registry.moves(book_file, board) == new
+    assert reader.mmap.closed
+    assert registry.probe_keys(book_file, [key]) == [
+        [m for _, m, _ in book_moves(board, weights)]]
+
+    os.remove(book_file)
+    assert registry.moves(book_file, board) == []
+    assert not registry._readers
+
+
+def test_book_is_checked_every_interval(monkeypatch, tmp_path, registry):
+    monkeypatch.setattr(pecg, 'BOOK_STAT_INTERVAL_SEC', 3600)
+    book_file = str(tmp_path / 'book.bin')
+    board = chess.Board()
+    write_book(book_file, book_moves(board, [1]))
+    assert len(registry.moves(book_file, board)) == 1
+    write_book(book_file, book_moves(board, [1, 1]))
+    assert len(registry.moves(book_file, board)) == 1
+    registry.close(book_file)
+    assert len(registry.moves(book_file, board)) == 2
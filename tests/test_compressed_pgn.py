@@ -0,0 +1,101 @@
+"""Compressed PGN reading from checkpoints against the plain PGN."""
+import bz2
+import gzip
+import lzma
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+COMPRESS = {'gz': gzip.compress, 'bz2': bz2.compress, 'xz': lzma.compress}
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # Several reads per file and a checkpoint every few games.
+    monkeypatch.setattr(pecg, 'PGN_READ_BYTES', 512)
+    monkeypatch.setattr(pecg, 'PGN_CHECKPOINT_BYTES', 1500)
+
+
+@pytest.fixture
+def plain_data(games_pgn):
+    with open(games_pgn, 'rb') as h:
+        return h.read()
+
+
+@pytest.fixture(params=sorted(COMPRESS))
+def compressed_pgn(request, tmp_path, games_pgn, plain_data):
+    """The sample games, each in its own gzip member, bz2 stream or xz stream."""
+    codec = request.param
+    ends = [end for _, end, _ in pecg.scan_pgn_games(games_pgn)]
+    path = str(tmp_path / f'games.pgn.{codec}')
+    with open(path, 'wb') as h:
+        for start, end in zip([0] + ends, ends):
+            h.write(COMPRESS[codec](plain_data[start:end]))
+    return path
+
+
+def read_games(h, offsets):
+    games = []
+    for offset in offsets:
+        h.seek(offset)
+        games.append(str(chess.pgn.read_game(h)))
+    return games
+
+
+def test_index_matches_plain_pgn(tmp_path, compressed_pgn, plain_data):
+    plain_file = str(tmp_path / 'games.pgn')
+    with open(plain_file, 'wb') as h:
+        h.write(plain_data)
+    plain = pecg.PgnIndex(plain_file)
+    plain.update()
+    index = pecg.PgnIndex(compressed_pgn)
+    index.update()
+    assert index.is_complete()
+    assert index.games == plain.games
+    assert index.checkpoints[0][0] == 0
+    assert len(index.checkpoints) > 2
+
+    loaded = pecg.PgnIndex(compressed_pgn)
+    assert loaded.load()
+    assert loaded.games == index.games
+    assert loaded.checkpoints == index.checkpoints
+
+
+def test_bytes_from_every_checkpoint(compressed_pgn, plain_data):
+    index = pecg.PgnIndex(compressed_pgn)
+    index.update()
+    for offset, _ in index.checkpoints:
+        for start in (offset, offset + 7):
+            chunks = list(pecg.iter_pgn_bytes(compressed_pgn, start, index.checkpoints))
+            assert chunks[0][0] == start
+            assert b''.join(data for _, data in chunks) == plain_data[start:]
+
+
+def test_games_read_from_checkpoints(games_pgn, compressed_pgn):
+    index = pecg.PgnIndex(compressed_pgn)
+    index.update()
+    offsets = [g['offset'] for g in index.games]
+    with open(games_pgn, encoding='utf-8') as h:
+        expected = read_games(h, offsets)
+    # Forward seeks decompress on, backward seeks restart from a checkpoint.
+    for order in (offsets, offsets[::-1], offsets[::2] + offsets[1::2]):
+        with pecg.open_pgn(compressed_pgn, index.checkpoints) as h:
+            assert read_games(h, order) == [expected[offsets.index(o)] for o in order]
+
+
+def test_scan_from_a_game_start(compressed_pgn):
+    index = pecg.PgnIndex(compressed_pgn)
+    index.update()
+    games = list(pecg.scan_pgn_games(compressed_pgn))
+    start = index.games[5]['offset']
+    assert list(pecg.scan_pgn_games(compressed_pgn, start, index.checkpoints)) == games[5:]
+
+
+@pytest.mark.parametrize('compressed_pgn', ['xz'], indirect=True)
+def test_xz_blocks_are_checkpoints(compressed_pgn):
+    # gzip members and bz2 streams are only found while scanning.
+    checkpoints = pecg.pgn_checkpoints(compressed_pgn)
+    assert len(checkpoints) == 8
+    assert checkpoints == sorted(checkpoints)
@@ -0,0 +1,95 @@
+"""Tools -> PGN -> Delete Player rewriting the PGN in place."""
+import gzip
+import os
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+PLAYER = 'Carlsen, Magnus'
+
+
+@pytest.fixture
+def pgn_data(games_pgn):
+    """The sample games with PLAYER as White and as Black."""
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    return data + b'\n' + (
+        b'[Event "Rematch"]\n[White "Nakamura, Hikaru"]\n[Black "Carlsen, Magnus"]\n'
+        b'[Result "0-1"]\n\n1. e4 e5 0-1\n\n')
+
+
+def kept_bytes(pgn_file, data):
+    """Returns the bytes of the games of data without PLAYER's games."""
+    return b''.join(data[start:end] for start, end, headers in pecg.scan_pgn_games(pgn_file)
+                    if PLAYER not in (headers.get('White'), headers.get('Black')))
+
+
+def test_games_are_deleted(write_pgn, pgn_data):
+    pgn_file = write_pgn(pgn_data)
+    expected = kept_bytes(pgn_file, pgn_data)
+    inode = os.stat(pgn_file).st_ino
+    assert pecg.delete_player_games(pgn_file, PLAYER) == (9, 2)
+
+    with open(pgn_file, 'rb') as h:
+        assert h.read() == expected
+    with open(pgn_file + '.backup', 'rb') as h:
+        assert h.read() == pgn_data
+    # The original file is the backup.
+    assert os.stat(pgn_file + '.backup').st_ino == inode
+    assert sorted(os.listdir(os.path.dirname(pgn_file))) == ['games.pgn', 'games.pgn.backup']
+    with open(pgn_file, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                break
+            assert PLAYER not in (game.headers['White'], game.headers['Black'])
+
+
+def test_old_backup_is_replaced(write_pgn, pgn_data):
+    pgn_file = write_pgn(pgn_data)
+    write_pgn(b'old backup', 'games.pgn.backup')
+    assert pecg.delete_player_games(pgn_file, 'Ju, Wenjun') == (9, 1)
+    with open(pgn_file + '.backup', 'rb') as h:
+        assert h.read() == pgn_data
+
+
+@pytest.mark.parametrize('name', ['Nobody', 'carlsen, magnus', 'Carlsen'])
+def test_no_match_leaves_the_file(write_pgn, pgn_data, name):
+    pgn_file = write_pgn(pgn_data)
+    stat = os.stat(pgn_file)
+    assert pecg.delete_player_games(pgn_file, name) == (9, 0)
+    with open(pgn_file, 'rb') as h:
+        assert h.read() == pgn_data
+    assert (os.stat(pgn_file).st_ino, os.stat(pgn_file).st_mtime_ns) == (
+        stat.st_ino, stat.st_mtime_ns)
+    assert os.listdir(os.path.dirname(pgn_file)) == ['games.pgn']
+
+
+def test_compressed_pgn_stays_compressed(write_pgn, pgn_data):
+    compressed = gzip.compress(pgn_data)
+    pgn_file = write_pgn(compressed, 'games.pgn.gz')
+    expected = kept_bytes(pgn_file, pgn_data)
+    progress = []
+    assert pecg.delete_player_games(pgn_file, PLAYER, lambda *args: progress.append(args)) \
+        == (9, 2)
+    with open(pgn_file, 'rb') as h:
+        assert gzip.decompress(h.read()) == expected
+    with open(pgn_file + '.backup', 'rb') as h:
+        assert h.read() == compressed
+    assert all(phase == 'scan' for phase, _ in progress)
+
+
+def test_failed_copy_leaves_the_file(monkeypatch, write_pgn, pgn_data):
+    def copy_pgn_games(pgn_file, ranges, out):
+        out.write(b'partial')
+        raise OSError('disk full')
+
+    monkeypatch.setattr(pecg, 'copy_pgn_games', copy_pgn_games)
+    pgn_file = write_pgn(pgn_data)
+    with pytest.raises(OSError):
+        pecg.delete_player_games(pgn_file, PLAYER)
+    with open(pgn_file, 'rb') as h:
+        assert h.read() == pgn_data
+    assert os.listdir(os.path.dirname(pgn_file)) == ['games.pgn']
@@ -0,0 +1,41 @@
+"""configure_engine_options() with the UCI test engine."""
+import json
+import os
+import sys
+
+import chess.engine
+
+import python_easy_chess_gui as pecg
+
+TEST_ENGINE = [sys.executable, os.path.join(os.path.dirname(__file__), 'uci_test_engine.py')]
+
+
+def write_config(tmp_path, hash_value):
+    config_file = str(tmp_path / 'pecg_engines.json')
+    with open(config_file, 'w') as h:
+        json.dump([{'name': 'UciTestEngine', 'options': [
+            {'name': 'Hash', 'type': 'spin', 'default': 16, 'value': hash_value,
+             'min': 1, 'max': 1024}]}], h)
+    return config_file
+
+
+def configured(monkeypatch, tmp_path, hash_value, engine_id_name, option_overrides=None):
+    """Returns the options configure_engine_options() sets on the test engine."""
+    config_file = write_config(tmp_path, hash_value)
+    with chess.engine.SimpleEngine.popen_uci(TEST_ENGINE) as engine:
+        sent = []
+        monkeypatch.setattr(engine, 'configure', sent.append)
+        pecg.configure_engine_options(engine, config_file, engine_id_name, option_overrides)
+        return sent
+
+
+def test_config_value_then_role_override(monkeypatch, tmp_path):
+    assert configured(monkeypatch, tmp_path, 32, 'UciTestEngine') == [{'Hash': 32}]
+    # Managed options and options the engine does not have are left out.
+    assert configured(monkeypatch, tmp_path, 32, 'UciTestEngine', {
+        'hash': '64', 'MultiPV': 3, 'Threads': 2}) == [{'Hash': 32}, {'Hash': 64}]
+
+
+def test_default_values_are_not_sent(monkeypatch, tmp_path):
+    assert configured(monkeypatch, tmp_path, 16, 'UciTestEngine') == []
+    assert configured(monkeypatch, tmp_path, 32, 'Other Engine') == []
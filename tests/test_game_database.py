@@ -0,0 +1,146 @@
+"""PecgDatabase conversion round trip against python-chess."""
+import json
+import shutil
+import struct
+import sys
+from array import array
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+MAINLINE_GAMES = (
+    b'\n[Event "Promotion"]\n[White "A"]\n[Black "B"]\n[Result "*"]\n'
+    b'[Annotator "none"]\n\n'
+    b'1. e4 d5 2. exd5 c6 3. dxc6 Nf6 4. cxb7 Nbd7 5. bxa8=N e5 6. Nf3 Bc5 7. Bc4 O-O 8. O-O *\n\n'
+    b'[Event "Setup"]\n[Result "1-0"]\n[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]\n'
+    b'[SetUp "1"]\n\n1. a8=Q+ Kd7 1-0\n')
+
+
+def movetext(game):
+    return game.accept(chess.pgn.StringExporter(headers=False))
+
+
+@pytest.fixture
+def pgn_file(tmp_path, games_pgn):
+    path = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, path)
+    with open(path, 'ab') as h:
+        h.write(MAINLINE_GAMES)
+    return path
+
+
+@pytest.fixture
+def python_chess_games(pgn_file):
+    games = []
+    with open(pgn_file, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                return games
+            games.append(game)
+
+
+@pytest.fixture
+def database(tmp_path, pgn_file):
+    db_file = str(tmp_path / ('games' + pecg.PECGDB_SUFFIX))
+    assert pecg.convert_pgn_to_db(pgn_file, db_file) == 10
+    database = pecg.PecgDatabase(db_file)
+    database.open()
+    yield database
+    database.close()
+
+
+def assert_same_games(games, expected):
+    assert len(games) == len(expected)
+    for game, expected_game in zip(games, expected):
+        assert dict(game.headers) == dict(expected_game.headers)
+        assert movetext(game) == movetext(expected_game)
+
+
+def test_read_game_matches_python_chess(database, python_chess_games):
+    assert database.count == 10
+    assert_same_games([database.read_game(i) for i in range(10)], python_chess_games)
+    with pytest.raises(IndexError):
+        database.read_game(10)
+
+
+def test_mainline_games_are_move_codes(database):
+    kinds = list(database._sections['kinds'])
+    assert kinds == [pecg.PECGDB_KIND_TEXT] * 8 + [pecg.PECGDB_KIND_MOVES] * 2
+    moves = list(database.read_game(8).mainline_moves())
+    assert chess.Move.from_uci('b7a8n') in moves
+    assert moves[-2:] == [chess.Move.from_uci('e8g8'), chess.Move.from_uci('e1g1')]
+
+
+def test_games_list_index_headers(database, python_chess_games):
+    expected = [{k: v for k, v in game.headers.items() if k in pecg.PGN_INDEX_HEADERS}
+                for game in python_chess_games]
+    games = pecg.PecgDbGames(database)
+    assert len(games) == 10
+    assert [g['headers'] for g in games[:]] == expected
+    assert games[-1] == {'offset': 9, 'headers': expected[-1]}
+
+
+def test_chunks_from_worker_processes(monkeypatch, tmp_path, pgn_file, python_chess_games):
+    monkeypatch.setattr(pecg, 'PECGDB_CHUNK_GAMES', 3)
+    db_file = str(tmp_path / 'chunks.pecgdb')
+    assert pecg.convert_pgn_to_db(pgn_file, db_file) == 10
+    database = pecg.PecgDatabase(db_file)
+    database.open()
+    try:
+        assert_same_games([database.read_game(i) for i in range(10)], python_chess_games)
+    finally:
+        database.close()
+
+
+def test_other_byte_order(tmp_path, database, python_chess_games):
+    # The file of a writer with the other byte order.
+    with open(database.db_file, 'rb') as h:
+        data = bytearray(h.read())
+    length = struct.unpack('<Q', data[-16:-8])[0]
+    meta = json.loads(data[-16 - length:-16])
+    for offset, size, typecode in meta['sections'].values():
+        if typecode != 'B':
+            values = array(typecode, data[offset:offset + size])
+            values.byteswap()
+            data[offset:offset + size] = values.tobytes()
+    moves_offset = meta['sections']['moves'][0]
+    ends = list(database._sections['moves_end'])
+    for i, kind in enumerate(database._sections['kinds']):
+        if kind == pecg.PECGDB_KIND_MOVES:
+            start, end = moves_offset + (ends[i - 1] if i else 0), moves_offset + ends[i]
+            codes = array('H', data[start:end])
+            codes.byteswap()
+            data[start:end] = codes.tobytes()
+    meta['byteorder'] = 'big' if sys.byteorder == 'little' else 'little'
+    meta = json.dumps(meta).encode('utf-8')
+    db_file = str(tmp_path / 'swapped.pecgdb')
+    with open(db_file, 'wb') as h:
+        h.write(data[:-16 - length] + meta + struct.pack('<Q8s', len(meta), pecg.PECGDB_MAGIC))
+
+    swapped = pecg.PecgDatabase(db_file)
+    swapped.open()
+    try:
+        assert_same_games([swapped.read_game(i) for i in range(10)], python_chess_games)
+        assert [swapped.index_headers(i) for i in range(10)] == [
+            database.index_headers(i) for i in range(10)]
+    finally:
+        swapped.close()
+
+
+def test_export_round_trip(tmp_path, database, python_chess_games):
+    out_file = str(tmp_path / 'exported.pgn')
+    database.close()
+    assert pecg.export_db_to_pgn(database.db_file, out_file) == 10
+    with open(out_file, encoding='utf-8') as h:
+        exported = [chess.pgn.read_game(h) for _ in range(10)]
+        assert chess.pgn.read_game(h) is None
+    assert_same_games(exported, python_chess_games)
+
+
+def test_not_a_database(write_pgn):
+    database = pecg.PecgDatabase(write_pgn(b'[Event "A"]\n\n1. e4 *\n' * 10))
+    with pytest.raises(ValueError):
+        database.open()
@@ -0,0 +1,178 @@
+"""PgnHeaderFilter searches against a scan of the headers read by python-chess."""
+import os
+import random
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+PLAYERS = ['Carlsen, Magnus', 'Nakamura, Hikaru', 'Polgar, Judit', 'Müller, Jörg',
+           'O"Brien, Sean', 'Anand, Viswanathan']
+EVENTS = ['Tata Steel', 'Candidates', 'Olympiad', 'Club Blitz', '']
+DATES = ['1990.??.??', '1990.05.??', '1990.05.17', '1991.12.31', '2010.01.10',
+         '????.??.??', '2024', None]
+ELOS = ['2500', '1990', '2851', '0', '?', '', None]
+RESULTS = ['1-0', '0-1', '1/2-1/2', '*']
+
+
+def generated_games(count, seed=1):
+    """Returns PGN bytes of count games with random headers and no moves."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(count):
+        result = rnd.choice(RESULTS)
+        headers = [('Event', rnd.choice(EVENTS)), ('Date', rnd.choice(DATES)),
+                   ('White', rnd.choice(PLAYERS)), ('Black', rnd.choice(PLAYERS)),
+                   ('Result', result), ('WhiteElo', rnd.choice(ELOS)),
+                   ('BlackElo', rnd.choice(ELOS)),
+                   ('ECO', rnd.choice(['A10', 'B13', 'B28', 'C16', None]))]
+        out.append(''.join(f'[{name} "{value}"]\n' for name, value in headers
+                           if value is not None) + f'\n{result}\n\n')
+    return ''.join(out).encode('utf-8')
+
+
+def read_all_headers(pgn_file):
+    with open(pgn_file, encoding='utf-8') as h:
+        headers = []
+        while True:
+            game_headers = chess.pgn.read_headers(h)
+            if game_headers is None:
+                return headers
+            headers.append(dict(game_headers))
+
+
+def date_key(date, fill):
+    """YYYYMMDD of a PGN date, unknown month and day as fill, 0 without a year."""
+    parts = (date or '').split('.') + ['', '']
+    if not parts[0].isdigit():
+        return 0
+    month, day = (int(p) if p.isdigit() else fill for p in parts[1:3])
+    return int(parts[0]) * 10000 + month * 100 + day
+
+
+def elo(value):
+    return int(value) if (value or '').isdigit() else 0
+
+
+def scan(all_headers, white='', black='', player='', event='', eco='', result='',
+         date_from='', date_to='', elo_min=0, elo_max=0):
+    """Returns the indexes of the games matching the criteria, one by one."""
+    def has(headers, field, text):
+        return text.strip().lower() in headers.get(field, '').lower()
+
+    matches = []
+    for i, h in enumerate(all_headers):
+        if white and not has(h, 'White', white):
+            continue
+        if black and not has(h, 'Black', black):
+            continue
+        if player and not (has(h, 'White', player) or has(h, 'Black', player)):
+            continue
+        if event and not has(h, 'Event', event):
+            continue
+        if eco and not h.get('ECO', '').lower().startswith(eco.strip().lower()):
+            continue
+        if result and h.get('Result', '*') != result:
+            continue
+        if date_from or date_to:
+            key = date_key(h.get('Date'), 0)
+            if not key or key < date_key(date_from, 0) or (
+                    date_to and key > date_key(date_to, 99)):
+                continue
+        if elo_min or elo_max:
+            if not all(max(1, elo_min) <= elo(h.get(f)) <= (elo_max or 65535)
+                       for f in ('WhiteElo', 'BlackElo')):
+                continue
+        matches.append(i)
+    return matches
+
+
+QUERIES = [
+    {},
+    {'white': 'carlsen'},
+    {'black': ' KASPAROV '},
+    {'player': 'müller'},
+    {'player': 'o"brien', 'result': '*'},
+    {'player': 'an', 'event': 'tata'},
+    {'event': 'candidates', 'white': 'anand'},
+    {'eco': 'b'},
+    {'eco': 'B2'},
+    {'eco': '13'},
+    {'result': '1/2-1/2'},
+    {'result': '0-1', 'elo_min': 2000},
+    {'date_from': '1990'},
+    {'date_to': '1990'},
+    {'date_from': '1990', 'date_to': '1990'},
+    {'date_from': '1990.05', 'date_to': '1990.05'},
+    {'date_from': '1990.05.17', 'date_to': '1990.05.17'},
+    {'date_from': '1990.06', 'date_to': '2010.01.10'},
+    {'date_from': '2015.06.15', 'result': '1-0'},
+    {'elo_min': 2500},
+    {'elo_max': 2000},
+    {'elo_min': 1990, 'elo_max': 2517},
+    {'elo_min': 2500, 'date_to': '2013', 'player': 'a'},
+    {'white': 'nobody'},
+]
+
+
+def random_queries(count, seed=2):
+    rnd = random.Random(seed)
+    choices = {'white': ['carl', 'a', 'ju'], 'black': ['n', 'so'], 'player': ['polgar', 'i'],
+               'event': ['olymp', 'c'], 'eco': ['a', 'c1'], 'result': RESULTS,
+               'date_from': ['1990', '1990.05.??', '2012.03'],
+               'date_to': ['1990.05', '1991', '2016.07.16'],
+               'elo_min': [1990, 2500, 2600], 'elo_max': [2500, 2851]}
+    return [{name: rnd.choice(values) for name, values in choices.items()
+             if rnd.random() < 0.3} for _ in range(count)]
+
+
+@pytest.fixture(scope='module')
+def pgn_file(tmp_path_factory):
+    # More games than a key sort is put off for, see PgnHeaderFilter._sorted_keys().
+    path = tmp_path_factory.mktemp('filter') / 'games.pgn'
+    with open(os.path.join(os.path.dirname(__file__), 'data', 'games.pgn'), 'rb') as h:
+        path.write_bytes(h.read() + b'\n' + generated_games(1500))
+    return str(path)
+
+
+@pytest.fixture(scope='module')
+def prepared(pgn_file):
+    """Returns (PgnHeaderFilter, python-chess headers) of pgn_file."""
+    index = pecg.PgnIndex(pgn_file)
+    index.update()
+    header_filter = pecg.PgnHeaderFilter(index.games)
+    header_filter.prepare()
+    return header_filter, read_all_headers(pgn_file)
+
+
+@pytest.mark.parametrize('query', QUERIES + random_queries(60))
+def test_search_matches_a_header_scan(prepared, query):
+    header_filter, all_headers = prepared
+    assert header_filter.count == len(all_headers) == 1508
+    assert header_filter.search(**query) == scan(all_headers, **query)
+
+
+def test_update_matches_a_rebuild(monkeypatch, tmp_path, pgn_file):
+    monkeypatch.setattr(pecg, 'PGN_FILTER_BATCH_GAMES', 97)
+    with open(pgn_file, 'rb') as h:
+        data = h.read()
+    games = list(pecg.scan_pgn_games(pgn_file))
+    growing_file = str(tmp_path / 'growing.pgn')
+    queries = QUERIES + random_queries(20)
+
+    index = pecg.PgnIndex(growing_file)
+    header_filter = pecg.PgnHeaderFilter(index.games)
+    # Sorted keys for the first 1200 games, then unsorted tails.
+    for end in (1200, 1300, 1508):
+        with open(growing_file, 'wb') as h:
+            h.write(data[:games[end - 1][1]])
+        index.update()
+        header_filter.update()
+        assert header_filter.count == end
+        rebuilt = pecg.PgnHeaderFilter(list(index.games))
+        all_headers = read_all_headers(growing_file)
+        for query in queries:
+            expected = scan(all_headers, **query)
+            assert header_filter.search(**query) == expected
+            assert rebuilt.search(**query) == expected
@@ -0,0 +1,122 @@
+"""OpeningExplorer against statistics counted with python-chess."""
+import shutil
+
+import chess
+import chess.pgn
+import chess.polyglot
+import pytest
+
+import python_easy_chess_gui as pecg
+
+CASTLING_GAME = (
+    b'\n[Event "Castling"]\n[Date "2020.05.01"]\n[Result "1/2-1/2"]\n'
+    b'[WhiteElo "2600"]\n\n'
+    b'1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 5. d3 O-O 1/2-1/2\n')
+
+
+def book_move(board, move):
+    """Returns move with castling as king takes rook, as polyglot stores it."""
+    if board.is_castling(move):
+        rook_file = 7 if board.is_kingside_castling(move) else 0
+        return chess.Move(move.from_square,
+                          chess.square(rook_file, chess.square_rank(move.from_square)))
+    return move
+
+
+def python_chess_stats(pgn_file, max_ply=pecg.EXPLORER_MAX_PLY):
+    """Returns {fen: {move: [games, white, draws, black, elo sum, elos, date]}}."""
+    outcomes = {'1-0': (1, 0, 0), '1/2-1/2': (0, 1, 0), '0-1': (0, 0, 1)}
+    stats = {}
+    with open(pgn_file, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                return stats
+            outcome = outcomes.get(game.headers.get('Result'))
+            if outcome is None:
+                continue
+            elos = [int(game.headers[tag]) for tag in ('WhiteElo', 'BlackElo')
+                    if game.headers.get(tag, '').isdigit()]
+            date = pecg.pgn_date_key(game.headers.get('Date'))
+            board = game.board()
+            for move in list(game.mainline_moves())[:max_ply]:
+                entry = stats.setdefault(board.fen(), {}).setdefault(
+                    book_move(board, move), [0, 0, 0, 0, 0, 0, 0])
+                for i, value in enumerate((1, *outcome, sum(elos), len(elos))):
+                    entry[i] += value
+                entry[6] = max(entry[6], date)
+                board.push(move)
+
+
+def assert_lookup_matches(explorer, stats):
+    for fen, moves in stats.items():
+        expected = {
+            move: {'games': s[0], 'white': s[1], 'draws': s[2], 'black': s[3],
+                   'elo': s[4] // s[5] if s[5] else 0, 'date': s[6]}
+            for move, s in moves.items()}
+        found = explorer.lookup(chess.Board(fen))
+        assert {m.pop('move'): m for m in found} == expected
+        assert [m['games'] for m in found] == sorted(
+            [m['games'] for m in found], reverse=True)
+
+
+@pytest.fixture
+def pgn_file(tmp_path, games_pgn):
+    path = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, path)
+    with open(path, 'ab') as h:
+        h.write(CASTLING_GAME)
+    return path
+
+
+def build_explorer(pgn_file):
+    pgn_index = pecg.PgnIndex(pgn_file)
+    pgn_index.update()
+    explorer = pecg.OpeningExplorer(pgn_file)
+    explorer.load(pgn_index)
+    explorer.build(pgn_index)
+    return pgn_index, explorer
+
+
+@pytest.mark.parametrize('chunk_games', [2000, 4])
+def test_lookup_matches_python_chess(monkeypatch, pgn_file, chunk_games):
+    # Small chunks are aggregated in worker processes and merged.
+    monkeypatch.setattr(pecg, 'EXPLORER_CHUNK_GAMES', chunk_games)
+    _, explorer = build_explorer(pgn_file)
+    try:
+        assert explorer.count == 9
+        assert_lookup_matches(explorer, python_chess_stats(pgn_file))
+        assert explorer.lookup(chess.Board('8/8/8/8/8/8/8/K1k5 w - - 0 1')) == []
+    finally:
+        explorer.close()
+
+
+def test_castling_is_king_takes_rook(pgn_file):
+    _, explorer = build_explorer(pgn_file)
+    board = chess.Board('r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQ1RK1 b kq - 0 5')
+    try:
+        assert [m['move'] for m in explorer.lookup(board)] == [chess.Move.from_uci('e8h8')]
+    finally:
+        explorer.close()
+
+
+def test_appended_games_are_merged(pgn_file):
+    with open(pgn_file, 'rb') as h:
+        data = h.read()
+    games = list(pecg.scan_pgn_games(pgn_file))
+    with open(pgn_file, 'wb') as h:
+        h.write(data[:games[4][0]])
+    build_explorer(pgn_file)[1].close()
+    with open(pgn_file, 'ab') as h:
+        h.write(data[games[4][0]:])
+
+    pgn_index = pecg.PgnIndex(pgn_file)
+    pgn_index.update()
+    explorer = pecg.OpeningExplorer(pgn_file)
+    try:
+        assert explorer.load(pgn_index)
+        assert explorer.count == 4
+        assert explorer.build(pgn_index) == 5
+        assert_lookup_matches(explorer, python_chess_stats(pgn_file))
+    finally:
+        explorer.close()
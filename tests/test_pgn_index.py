@@ -0,0 +1,99 @@
+"""PgnIndex against chess.pgn.read_headers()."""
+import os
+import shutil
+
+import chess.pgn
+
+import python_easy_chess_gui as pecg
+
+
+class _TextLines:
+    """readline() of a binary file that keeps tell() a byte offset."""
+
+    def __init__(self, h):
+        self.h = h
+
+    def readline(self):
+        return self.h.readline().decode('utf-8')
+
+
+def python_chess_games(pgn_file):
+    """Returns [(offset, headers)] of the games as read by python-chess."""
+    games = []
+    with open(pgn_file, 'rb') as h:
+        while True:
+            offset = h.tell()
+            headers = chess.pgn.read_headers(_TextLines(h))
+            if headers is None:
+                return games
+            games.append((offset, dict(headers)))
+
+
+def index_headers(headers):
+    return {k: v for k, v in headers.items() if k in pecg.PGN_INDEX_HEADERS}
+
+
+def test_update_indexes_every_game(tmp_path, games_pgn):
+    pgn_file = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, pgn_file)
+    index = pecg.PgnIndex(pgn_file)
+    assert not index.load()
+    assert index.update() == 8
+    assert index.is_complete()
+    assert [(g['offset'], g['headers']) for g in index.games] == [
+        (offset, index_headers(headers))
+        for offset, headers in python_chess_games(pgn_file)]
+    with open(pgn_file, encoding='utf-8') as h:
+        h.seek(index.games[7]['offset'])
+        game = chess.pgn.read_game(h)
+    assert game.headers['White'] == 'Müller, Jörg'
+
+
+def test_saved_index_is_reused(tmp_path, games_pgn):
+    pgn_file = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, pgn_file)
+    index = pecg.PgnIndex(pgn_file)
+    index.update()
+    assert os.path.isfile(pgn_file + pecg.PGN_INDEX_SUFFIX)
+
+    loaded = pecg.PgnIndex(pgn_file)
+    assert loaded.load()
+    assert loaded.games == index.games
+    assert loaded.is_complete()
+    assert loaded.update() == 0
+
+
+def test_appended_games_are_indexed_from_the_end(tmp_path, games_pgn):
+    pgn_file = str(tmp_path / 'games.pgn')
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    cut = python_chess_games(games_pgn)[4][0]
+    with open(pgn_file, 'wb') as h:
+        h.write(data[:cut])
+    pecg.PgnIndex(pgn_file).update()
+    with open(pgn_file, 'ab') as h:
+        h.write(data[cut:])
+
+    index = pecg.PgnIndex(pgn_file)
+    assert index.load()
+    assert len(index.games) == 4
+    assert index.update() == 4
+    assert [g['offset'] for g in index.games] == [
+        offset for offset, _ in python_chess_games(pgn_file)]
+
+
+def test_changed_file_is_indexed_again(tmp_path, games_pgn):
+    # The change is in the PGN_INDEX_TAIL_BYTES checked before reuse.
+    pgn_file = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, pgn_file)
+    pecg.PgnIndex(pgn_file).update()
+    with open(pgn_file, 'r+b') as h:
+        data = h.read().replace(b'Sean', b'Sian')
+        h.seek(0)
+        h.write(data)
+    os.utime(pgn_file, ns=(0, 0))
+
+    index = pecg.PgnIndex(pgn_file)
+    assert not index.load()
+    index.update()
+    assert index.games[7]['headers']['Black'] == 'O"Brien, Sian'
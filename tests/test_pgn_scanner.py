@@ -0,0 +1,99 @@
+"""scan_pgn_games() against chess.pgn.read_headers()."""
+import io
+import random
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+
+def text_handle(data):
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8', errors='replace')
+
+
+def read_all_headers(data):
+    handle = text_handle(data)
+    headers = []
+    while True:
+        game_headers = chess.pgn.read_headers(handle)
+        if game_headers is None:
+            return headers
+        headers.append(dict(game_headers))
+
+
+def assert_scan_matches_python_chess(path, data):
+    games = list(pecg.scan_pgn_games(path))
+    assert [headers for _, _, headers in games] == read_all_headers(data)
+    for start, end, _ in games:
+        # read_headers from the game's start stops at the game's end.
+        handle = text_handle(data[start:])
+        chess.pgn.read_headers(handle)
+        assert handle.read() == text_handle(data[end:]).read()
+
+
+UNUSUAL_PGN = {
+    'semicolon comment with brace': (
+        b'[Event "A"]\n\n1. e4 ; a { in a comment\n1... e5 *\n\n'
+        b'[Event "B"]\n\n1. d4 *\n'),
+    'stray closing brace': (
+        b'[Event "A"]\n\n1. e4 } e5 *\n\n[Event "B"]\n\n1. d4 *\n'),
+    'indented tag line': (
+        b'[Event "A"]\n  [White "x"]\n\n1. e4 *\n\n  [Event "B"]\n1. d4 *\n'),
+    'game without tags after a game': (
+        b'[Event "A"]\n\n1. e4 *\n\n1. d4 d5 *\n\n[Event "C"]\n\n1. c4 *\n'),
+    'tag line right after movetext': (
+        b'[Event "A"]\n\n1. e4 *\n[Event "B"]\n\n1. d4 *\n'),
+    'blank line in a brace comment': (
+        b'[Event "A"]\n\n1. e4 { one\n\n[Event "not a tag"]\n} e5 *\n\n'
+        b'[Event "B"]\n\n1. d4 *\n'),
+    'escape and comment lines': (
+        b'% escape\n; comment\n[Event "A"]\n% escape {\n[Site "s"]\n\n'
+        b'1. e4\n% escape {\n1... e5 *\n\n[Event "B"]\n\n1. d4 *\n'),
+    'crlf line ends': (
+        b'[Event "A"]\r\n[White "w"]\r\n\r\n1. e4 *\r\n\r\n[Event "B"]\r\n\r\n1. d4 *\r\n'),
+    'lone carriage return': (
+        b'[Event "A"]\r[White "w"]\r\r1. e4 *\r\r[Event "B"]\r\r1. d4 *\r'),
+    'unicode space line': (
+        b'[Event "A"]\n\n1. e4 *\n\xe3\x80\x80\n[Event "B"]\n\n1. d4 *\n'),
+    'escaped quote in tag': (
+        b'[Event "A \\"B\\" C"]\n[White "x"] \n\n1. e4 *\n'),
+    'one blank line between tags': (
+        b'[Event "A"]\n\n[White "w"]\n\n\n1. e4 *\n'),
+    'no final newline': b'[Event "A"]\n\n1. e4 *',
+    'only comments': b'; nothing\n% here\n\n',
+}
+
+
+@pytest.mark.parametrize('name', sorted(UNUSUAL_PGN))
+def test_unusual_pgn(write_pgn, name):
+    data = UNUSUAL_PGN[name]
+    assert_scan_matches_python_chess(write_pgn(data), data)
+
+
+def test_sample_games(games_pgn):
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    assert_scan_matches_python_chess(games_pgn, data)
+    assert len(list(pecg.scan_pgn_games(games_pgn))) == 8
+
+
+def test_scan_from_a_game_start(games_pgn):
+    games = list(pecg.scan_pgn_games(games_pgn))
+    assert list(pecg.scan_pgn_games(games_pgn, games[3][0])) == games[3:]
+
+
+PIECES = [
+    '[Event "A"]\n', '[White "x \\"q\\" y"]\n', '  [Black "z"]\n', '[Bad tag]\n',
+    '\n', '\n', '\r\n', '1. e4 e5 ', '{ c [x] }', ' { open\n', '}', '; c {\n',
+    '% e {\n', '2. Nf3 ', ' 1-0\n', '[Site "s"]\r\n', ' \n', '\t\n', '(1. d4) ',
+    '*\n', '[Date "d"]', 'a\rb ', '\x1c\n', '[Event "é"]\n', '　 ',
+]
+
+
+def test_random_pgn(write_pgn):
+    rng = random.Random(1)
+    for _ in range(300):
+        data = ''.join(rng.choice(PIECES)
+                       for _ in range(rng.randint(1, 40))).encode('utf-8')
+        assert_scan_matches_python_chess(write_pgn(data), data)
@@ -0,0 +1,118 @@
+"""Tools -> PGN merge, split, sort and deduplicate, checked with python-chess."""
+import gzip
+import os
+import re
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+
+def read_games(pgn_file):
+    """Returns the games of a PGN, plain or compressed, read by python-chess."""
+    games = []
+    with pecg.open_pgn(pgn_file) as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                return games
+            games.append(game)
+
+
+def split_file(value):
+    """Returns the file name split_pgn_file() gives to value in games.pgn."""
+    return 'games-{}.pgn'.format(re.sub(r'[^\w.-]+', '_', value).strip('._'))
+
+
+def game_texts(pgn_file):
+    return [str(game) for game in read_games(pgn_file)]
+
+
+@pytest.fixture
+def sample_games(games_pgn):
+    return read_games(games_pgn)
+
+
+def test_merge(tmp_path, games_pgn, write_pgn):
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    ranges = [(start, end) for start, end, _ in pecg.scan_pgn_games(games_pgn)]
+    # A BOM and no final newline in the first file, the second compressed.
+    first = write_pgn(b'\xef\xbb\xbf' + data[:ranges[3][1]].rstrip(), 'first.pgn')
+    second = str(tmp_path / 'second.pgn.gz')
+    with gzip.open(second, 'wb') as h:
+        h.write(data[ranges[3][1]:])
+    out_file = str(tmp_path / 'merged.pgn')
+
+    assert pecg.merge_pgn_files([first, second], out_file) == 2
+    assert game_texts(out_file) == game_texts(games_pgn)
+    assert len(list(pecg.scan_pgn_games(out_file))) == 8
+
+
+@pytest.mark.parametrize('by', ['player', 'event', 'year'])
+def test_split(monkeypatch, tmp_path, games_pgn, sample_games, by):
+    # Output files are closed and opened again for appending.
+    monkeypatch.setattr(pecg, 'PGN_SPLIT_OPEN_FILES', 2)
+    out_dir = tmp_path / 'split'
+    out_dir.mkdir()
+    games, files = pecg.split_pgn_file(games_pgn, str(out_dir), by)
+
+    expected = {}
+    for game in sample_games:
+        for value in pecg.pgn_split_values(game.headers, by):
+            expected.setdefault(value, []).append(str(game))
+    assert (games, files) == (8, len(expected))
+    assert sorted(os.listdir(out_dir)) == sorted(split_file(v) for v in expected)
+    for value, texts in expected.items():
+        assert game_texts(str(out_dir / split_file(value))) == texts
+
+
+def test_split_compressed_keeps_the_codec(tmp_path, games_pgn):
+    pgn_file = str(tmp_path / 'games.pgn.gz')
+    with open(games_pgn, 'rb') as h, gzip.open(pgn_file, 'wb') as out:
+        out.write(h.read())
+    out_dir = tmp_path / 'split'
+    out_dir.mkdir()
+    assert pecg.split_pgn_file(pgn_file, str(out_dir), 'event')[0] == 8
+    assert all(name.endswith('.pgn.gz') for name in os.listdir(out_dir))
+
+
+@pytest.mark.parametrize('by', ['date', 'eco'])
+@pytest.mark.parametrize('run_bytes', [64 << 20, 2000])
+def test_sort(monkeypatch, tmp_path, games_pgn, write_pgn, by, run_bytes):
+    # Several runs are merged with small PGN_SORT_RUN_BYTES.
+    monkeypatch.setattr(pecg, 'PGN_SORT_RUN_BYTES', run_bytes)
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    games = [data[start:end] for start, end, _ in pecg.scan_pgn_games(games_pgn)]
+    undated = b'[Event "No date"]\n[Result "*"]\n\n1. e4 *\n\n'
+    pgn_file = write_pgn(b''.join(games[:0:-1] + [undated, games[0]]))
+    out_file = str(tmp_path / 'sorted.pgn')
+    assert pecg.sort_pgn_file(pgn_file, out_file, by) == 9
+
+    def key(game):
+        date = pecg.pgn_date_key(game.headers.get('Date')) or 0xffffffff
+        eco = game.headers.get('ECO', '') if by == 'eco' else ''
+        return eco or '\uffff', date
+    assert game_texts(out_file) == [str(g) for g in sorted(read_games(pgn_file), key=key)]
+    assert game_texts(out_file)[-1] == str(read_games(pgn_file)[-2])
+
+
+@pytest.mark.parametrize('digest', [None, lambda key: 1, lambda key: len(key) & 1],
+                         ids=['blake2b', 'one digest', 'two digests'])
+def test_dedup(monkeypatch, tmp_path, games_pgn, sample_games, write_pgn, digest):
+    # Games with the same digest are only dropped when they are the same.
+    if digest is not None:
+        monkeypatch.setattr(pecg, 'pgn_game_digest', digest)
+    with open(games_pgn, 'rb') as h:
+        data = h.read()
+    # Copies without comments and variations, or with other case and spacing.
+    exporter = chess.pgn.StringExporter(comments=False, variations=False)
+    copy = sample_games[2].accept(exporter).encode('utf-8')
+    renamed = data.split(b'\n\n[')[0].replace(b'Carlsen, Magnus', b'carlsen,  MAGNUS')
+    pgn_file = write_pgn(data + b'\n' + copy + b'\n\n' + renamed + b'\n\n' + copy + b'\n')
+    out_file = str(tmp_path / 'dedup.pgn')
+
+    assert pecg.dedup_pgn_file(pgn_file, out_file) == (11, 3)
+    assert game_texts(out_file) == game_texts(games_pgn)
@@ -0,0 +1,92 @@
+"""PolyglotBookBuilder books read back with chess.polyglot."""
+import shutil
+
+import chess
+import chess.pgn
+import chess.polyglot
+import pytest
+
+import python_easy_chess_gui as pecg
+
+CASTLING_GAME = (
+    b'\n[Event "Castling"]\n[Result "0-1"]\n\n'
+    b'1. e4 e5 2. Nf3 Nc6 3. Bc4 Bc5 4. O-O Nf6 5. d3 O-O 0-1\n')
+
+
+def python_chess_weights(pgn_file, max_ply, min_games=1):
+    """Returns {fen: {move: weight}}, 2 per win and 1 per draw of the mover."""
+    points = {'1-0': (2, 0), '1/2-1/2': (1, 1), '0-1': (0, 2)}
+    stats = {}
+    with open(pgn_file, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                break
+            if game.headers.get('Result') not in points:
+                continue
+            white, black = points[game.headers['Result']]
+            board = game.board()
+            for move in list(game.mainline_moves())[:max_ply]:
+                entry = stats.setdefault(board.fen(), {}).setdefault(move, [0, 0])
+                entry[0] += 1
+                entry[1] += white if board.turn == chess.WHITE else black
+                board.push(move)
+    return {fen: {move: weight for move, (games, weight) in moves.items()
+                  if games >= min_games and weight}
+            for fen, moves in stats.items()}
+
+
+@pytest.fixture
+def pgn_file(tmp_path, games_pgn):
+    path = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, path)
+    with open(path, 'ab') as h:
+        h.write(CASTLING_GAME)
+    return path
+
+
+def build_book(pgn_files, book_file, **kwargs):
+    builder = pecg.PolyglotBookBuilder(pgn_files, book_file, **kwargs)
+    builder.run()
+    assert not builder.is_failed
+    return builder
+
+
+@pytest.mark.parametrize('max_ply, min_games', [(pecg.BOOK_BUILD_MAX_PLY, 1), (12, 2)])
+def test_book_matches_python_chess(tmp_path, pgn_file, max_ply, min_games):
+    book_file = str(tmp_path / 'book.bin')
+    builder = build_book([pgn_file], book_file, max_ply=max_ply, min_games=min_games)
+    weights = python_chess_weights(pgn_file, max_ply, min_games)
+    assert builder.entries == sum(len(moves) for moves in weights.values())
+
+    with chess.polyglot.open_reader(book_file) as reader:
+        keys = [entry.key for entry in reader]
+        assert keys == sorted(keys)
+        for fen, moves in weights.items():
+            entries = list(reader.find_all(chess.Board(fen)))
+            assert {entry.move: entry.weight for entry in entries} == moves
+            assert [entry.weight for entry in entries] == sorted(
+                [entry.weight for entry in entries], reverse=True)
+
+
+def test_castling_move_is_read_back(tmp_path, pgn_file):
+    book_file = str(tmp_path / 'book.bin')
+    build_book([pgn_file], book_file)
+    board = chess.Board('r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQ1RK1 b kq - 0 5')
+    with chess.polyglot.open_reader(book_file) as reader:
+        entry = reader.find(board)
+    assert entry.move == chess.Move.from_uci('e8g8')
+    assert entry.weight == 2
+
+
+def test_several_pgn_files_are_added_up(tmp_path, pgn_file):
+    other_file = str(tmp_path / 'other.pgn')
+    shutil.copy(pgn_file, other_file)
+    book_file = str(tmp_path / 'book.bin')
+    build_book([pgn_file, other_file], book_file)
+    weights = python_chess_weights(pgn_file, pecg.BOOK_BUILD_MAX_PLY)
+    with chess.polyglot.open_reader(book_file) as reader:
+        for fen, moves in weights.items():
+            assert {entry.move: entry.weight
+                    for entry in reader.find_all(chess.Board(fen))} == {
+                move: 2 * weight for move, weight in moves.items()}
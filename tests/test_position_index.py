@@ -0,0 +1,94 @@
+"""PgnPositionIndex against chess.polyglot.zobrist_hash()."""
+import shutil
+
+import chess.pgn
+import chess.polyglot
+import pytest
+
+import python_easy_chess_gui as pecg
+
+
+def python_chess_positions(pgn_file):
+    """Returns {key: [(game, ply), ...]} of the first ply of every mainline position."""
+    positions = {}
+    with open(pgn_file, encoding='utf-8') as h:
+        game_number = 0
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                return positions
+            board = game.board()
+            seen = set()
+            for ply, move in enumerate([None] + list(game.mainline_moves())):
+                if move is not None:
+                    board.push(move)
+                key = chess.polyglot.zobrist_hash(board)
+                if key not in seen:
+                    seen.add(key)
+                    positions.setdefault(key, []).append((game_number, ply))
+            game_number += 1
+
+
+@pytest.fixture
+def pgn_file(tmp_path, games_pgn):
+    path = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, path)
+    return path
+
+
+def build_index(pgn_file):
+    pgn_index = pecg.PgnIndex(pgn_file)
+    pgn_index.update()
+    position_index = pecg.PgnPositionIndex(pgn_file)
+    position_index.load(pgn_index)
+    position_index.build(pgn_index)
+    return pgn_index, position_index
+
+
+@pytest.mark.parametrize('chunk_games', [1000, 3])
+def test_find_matches_zobrist_hash(monkeypatch, pgn_file, chunk_games):
+    # Small chunks are parsed in worker processes, one segment each.
+    monkeypatch.setattr(pecg, 'POSITION_INDEX_CHUNK_GAMES', chunk_games)
+    _, position_index = build_index(pgn_file)
+    assert len(position_index.segments) == -(-8 // chunk_games)
+    for key, hits in python_chess_positions(pgn_file).items():
+        assert position_index.find(key) == hits
+    assert position_index.find(0) == []
+
+
+def test_saved_index_is_reused(pgn_file):
+    pgn_index, position_index = build_index(pgn_file)
+    loaded = pecg.PgnPositionIndex(pgn_file)
+    assert loaded.load(pgn_index)
+    assert loaded.count == 8
+    assert loaded.segments == position_index.segments
+    assert loaded.build(pgn_index) == 0
+
+
+def test_appended_games_go_to_a_new_segment(pgn_file):
+    with open(pgn_file, 'rb') as h:
+        data = h.read()
+    games = list(pecg.scan_pgn_games(pgn_file))
+    with open(pgn_file, 'wb') as h:
+        h.write(data[:games[5][0]])
+    build_index(pgn_file)
+    with open(pgn_file, 'ab') as h:
+        h.write(data[games[5][0]:])
+
+    _, position_index = build_index(pgn_file)
+    assert position_index.count == 8
+    assert len(position_index.segments) == 2
+    for key, hits in python_chess_positions(pgn_file).items():
+        assert position_index.find(key) == hits
+
+
+def test_changed_pgn_makes_the_index_stale(pgn_file):
+    build_index(pgn_file)
+    with open(pgn_file, 'r+b') as h:
+        data = h.read().replace(b'Sean', b'Sian')
+        h.seek(0)
+        h.write(data)
+
+    pgn_index = pecg.PgnIndex(pgn_file)
+    pgn_index.update()
+    assert not pecg.PgnPositionIndex(pgn_file).load(pgn_index)
@@ -0,0 +1,239 @@
+"""The Review move list text, its span tables and click mapping, on a stand-in Tk Text."""
+import io
+
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+from test_review_tree import NESTED_GAME, sample_games  # noqa: F401
+
+
+class Text:
+    """The text, tags and view of a Tk Text widget, '@x,y' being column x of line y."""
+
+    def __init__(self):
+        self.text = ''
+        self.tags = {}
+        self.view = (0.0, 1.0)
+        self.seen = None
+
+    def offset(self, index):
+        line, col = map(int, index.split('.'))
+        lines = self.text.split('\n')
+        return sum(len(text) + 1 for text in lines[:line - 1]) + col
+
+    def get(self, start, end):
+        return self.text[self.offset(start):self.offset(end)]
+
+    def index(self, spec):
+        x, y = spec[1:].split(',')
+        return f'{y}.{x}'
+
+    def insert(self, index, text):
+        assert index == '1.0' and not self.text
+        self.text = text
+
+    def delete(self, start, end):
+        self.text = ''
+        self.tags = {}
+
+    def tag_add(self, tag, *ranges):
+        pairs = self.tags.setdefault(tag, [])
+        pairs += zip(ranges[::2], ranges[1::2])
+
+    def tag_remove(self, tag, start, end):
+        self.tags.pop(tag, None)
+
+    def tagged(self, tag):
+        return [self.get(start, end) for start, end in self.tags.get(tag, [])]
+
+    def see(self, index):
+        self.seen = index
+
+    def yview(self):
+        return self.view
+
+    def configure(self, **options):
+        pass
+
+
+class Event:
+    def __init__(self, widget, line, col):
+        self.widget, self.x, self.y = widget, col, line
+
+
+def review(game):
+    """Returns an EasyChessGui reviewing game with its move list in a Text."""
+    gui = pecg.EasyChessGui('Reddit', '', '', '', '', '', False, False, 8)
+    gui.prepare_review_game(game)
+    widget = Text()
+    gui.show_review_move_window(widget, gui.review_tree.move_segments[0])
+    return gui, widget
+
+
+def move_text(gui, index):
+    """Returns the SAN and NAG symbols of node index as the move list shows them."""
+    node = gui.review_nodes[index]
+    san = node.parent.board().san(node.move)
+    return san + ''.join(pecg.REVIEW_NAG_SYMBOLS.get(nag, '') for nag in node.nags)
+
+
+@pytest.mark.parametrize('texts', [
+    [],
+    ['1. e4 ', 'e5 '],
+    ['{a\ncomment} ', '\n    ( ', '1... c5 ', ' ) ', '\n', '\n\n', 'x'],
+    ['\n', 'ab\ncd\n', 'é ', '{♞} '],
+])
+def test_text_positions(texts):
+    joined = ''.join(texts)
+    offsets = [sum(len(text) for text in texts[:i]) for i in range(len(texts) + 1)]
+    expected = []
+    for offset in offsets:
+        before = joined[:offset]
+        expected.append((before.count('\n') + 1, len(before) - before.rfind('\n') - 1))
+    assert pecg.tk_text_positions(texts) == expected
+
+
+def test_text_positions_count_utf16_before_tk9(monkeypatch):
+    monkeypatch.setattr(pecg.tk, 'TkVersion', 8.6)
+    assert pecg.tk_text_positions(['{\U0001f600} ', 'e4']) == [(1, 0), (1, 5), (1, 7)]
+    monkeypatch.setattr(pecg.tk, 'TkVersion', 9.0)
+    assert pecg.tk_text_positions(['{\U0001f600} ', 'e4']) == [(1, 0), (1, 4), (1, 6)]
+
+
+def test_spans_cover_the_moves(sample_games):
+    for game in sample_games:
+        gui, widget = review(game)
+        tree = gui.review_tree
+        assert widget.text == 'Start Position\n\n' + ''.join(t for t, _, _ in tree.segments)
+        assert sorted(gui.review_move_spans) == list(range(len(tree.nodes)))
+        assert widget.get(*gui.review_move_spans[0]) == 'Start Position'
+        for i in range(1, len(tree.nodes)):
+            text = widget.get(*gui.review_move_spans[i])
+            assert text == tree.segments[tree.move_segments[i]][0]
+            assert text.split()[-1] == move_text(gui, i)
+        assert widget.tagged('move_link') == [
+            widget.get(*gui.review_move_spans[i]) for i in gui.review_move_nodes]
+        assert widget.tagged('comment') == [t for t, kind, _ in tree.segments if kind == 'comment']
+        for first_node, first, end in tree.var_spans:
+            assert widget.get(*gui.review_var_spans[first_node]) == ''.join(
+                t for t, _, _ in tree.segments[first:end])
+
+
+def test_click_maps_to_the_move(sample_games):
+    for game in sample_games:
+        gui, widget = review(game)
+        clicked = []
+        gui.on_move_clicked = clicked.append
+        expected = []
+        for i, (start, end) in gui.review_move_spans.items():
+            line, col = map(int, start.split('.'))
+            last = int(end.split('.')[1]) - 1
+            for click_col in (col, (col + last) // 2, last):
+                gui.on_move_list_click(Event(widget, line, click_col))
+                expected.append(i)
+        assert clicked == expected
+
+
+def test_current_move_highlight():
+    gui, widget = review(chess.pgn.read_game(io.StringIO(NESTED_GAME)))
+    mainline = gui.review_tree.mainline
+    gui.review_move_index = mainline[2]
+    gui.highlight_current_move(widget)
+    assert widget.tagged('current_move') == ['1... e5! ']
+    assert 'current_var_block' not in widget.tags
+    assert widget.seen == gui.review_move_spans[mainline[2]][0]
+
+    # 1... Nf6 in the variation 1. d4 d5 (1... Nf6 2. c4) of 1. e4.
+    nf6 = next(i for i in range(1, len(gui.review_nodes)) if move_text(gui, i) == 'Nf6')
+    gui.review_move_index = nf6
+    gui.highlight_current_move(widget)
+    assert 'current_move' not in widget.tags
+    assert widget.tagged('current_var_move') == ['1... Nf6 ']
+    assert widget.tagged('current_var_block') == ['\n        ( 1... Nf6 2. c4  ) ']
+
+
+class Element:
+    def __init__(self, widget):
+        self.Widget = widget
+
+
+class Window:
+    def __init__(self, widget):
+        self.AllKeysDict = {'review_move_list_k': Element(widget)}
+
+    def __getitem__(self, key):
+        return self.AllKeysDict[key]
+
+
+def long_game(plies=400):
+    """Returns a game of knight moves back and forth, every move commented."""
+    game = chess.pgn.Game()
+    node = game
+    moves = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    for ply in range(plies):
+        node = node.add_variation(chess.Move.from_uci(moves[ply % 4]), comment=f'ply {ply + 1}')
+    return game
+
+
+@pytest.fixture
+def long_review(monkeypatch):
+    monkeypatch.setattr(pecg, 'REVIEW_MOVE_LIST_SEGMENTS', 50)
+    gui, widget = review(long_game())
+    return gui, widget, len(gui.review_tree.segments)
+
+
+def assert_window_shown(gui, widget):
+    lo, hi = gui.review_move_window
+    tree = gui.review_tree
+    assert widget.text == 'Start Position\n\n' + ('... ' if lo else '') + ''.join(
+        t for t, _, _ in tree.segments[lo:hi]) + (' ...' if hi < len(tree.segments) else '')
+    shown = [i for i in range(1, len(tree.nodes)) if lo <= tree.move_segments[i] < hi]
+    assert sorted(gui.review_move_spans) == [0] + shown
+    for i in shown:
+        assert widget.get(*gui.review_move_spans[i]).split()[-1] == move_text(gui, i)
+
+
+def test_window_follows_the_current_move(long_review):
+    gui, widget, count = long_review
+    assert gui.review_move_window == (0, 50)
+    assert_window_shown(gui, widget)
+    for index in (300, 1, 200, 400):
+        gui.review_move_index = index
+        gui.highlight_current_move(widget)
+        center = gui.review_tree.move_segments[index]
+        lo = max(0, min(center - 25, count - 50))
+        assert gui.review_move_window == (lo, lo + 50)
+        assert_window_shown(gui, widget)
+        assert widget.tagged('current_move') == [widget.get(*gui.review_move_spans[index])]
+        assert widget.seen == gui.review_move_spans[index][0]
+
+
+def test_scrolling_moves_the_window(long_review):
+    # Scrolling to an end moves the window while the current move is left
+    # out, it is highlighted again when it is shown.
+    gui, widget, count = long_review
+    window = Window(widget)
+    gui.review_move_index = 1
+    gui.highlight_current_move(widget)
+    widget.view = (0.9, 1.0)
+    moves = 0
+    while gui.review_move_window[1] < count:
+        anchor = gui.review_move_window[1] - 1
+        gui.poll_review_move_list(window)
+        assert gui.review_move_window[0] > 0
+        assert_window_shown(gui, widget)
+        assert widget.seen == '{}.{}'.format(
+            *gui.review_move_positions[anchor + gui.review_move_base])
+        assert widget.tagged('current_move') == []
+        moves += 1
+    assert moves > 5
+    gui.poll_review_move_list(window)
+    assert gui.review_move_window == (count - 50, count)
+
+    widget.view = (0.0, 0.1)
+    while gui.review_move_window[0] > 0:
+        gui.poll_review_move_list(window)
+        assert_window_shown(gui, widget)
+    assert widget.tagged('current_move') == ['1. Nf3 ']
@@ -0,0 +1,52 @@
+"""ReviewGamePrefetcher preparing games in the background."""
+import shutil
+import time
+
+import chess.pgn
+
+import python_easy_chess_gui as pecg
+
+
+class GamesLoader:
+    """The read_game() and games of a review games loader, over a PGN."""
+
+    def __init__(self, pgn_file):
+        index = pecg.PgnIndex(pgn_file)
+        index.update()
+        self.pgn_file = pgn_file
+        self.games = index.games
+
+    def read_game(self, game_entry):
+        with open(self.pgn_file, encoding='utf-8') as h:
+            h.seek(game_entry['offset'])
+            return chess.pgn.read_game(h)
+
+
+def wait_for(prefetcher, loader, game_index, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        prepared = prefetcher.take(loader, game_index)
+        if prepared is not None:
+            return prepared
+        time.sleep(0.01)
+    return None
+
+
+def test_prepared_games_are_taken_once(tmp_path, games_pgn):
+    pgn_file = str(tmp_path / 'games.pgn')
+    shutil.copy(games_pgn, pgn_file)
+    loader = GamesLoader(pgn_file)
+    prefetcher = pecg.ReviewGamePrefetcher()
+    prefetcher.start()
+    try:
+        prefetcher.request(loader, [3, 2, 8, -1])
+        game, tree = wait_for(prefetcher, loader, 3)
+        assert game.headers == loader.read_game(loader.games[3]).headers
+        assert tree.nodes[0] is game
+        assert wait_for(prefetcher, loader, 2) is not None
+        assert prefetcher.take(loader, 3) is None
+        assert prefetcher.take(loader, 8) is None
+    finally:
+        prefetcher.stop()
+        prefetcher.join(10)
+    assert not prefetcher.is_alive()
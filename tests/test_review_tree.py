@@ -0,0 +1,104 @@
+"""ReviewTree and ReviewPositionStore against the python-chess game tree."""
+import io
+
+import chess
+import chess.pgn
+import pytest
+
+import python_easy_chess_gui as pecg
+
+NESTED_GAME = (
+    '[Event "Nested"]\n[Result "*"]\n\n'
+    '1. e4 ( { start } 1. d4 d5 ( 1... Nf6 2. c4 ) 2. c4 ) ( 1. c4 ) 1... e5 $1 { c } '
+    '( 1... c5 2. Nf3 ( 2. c3 ) ) 2. Nf3 ( 2. f4 exf4 ) 2... Nc6 *\n')
+
+
+def preorder(game):
+    """Returns the nodes of game as the move list shows them, variations in place."""
+    nodes = []
+
+    def walk(node):
+        if not node.variations:
+            return
+        main = node.variations[0]
+        nodes.append(main)
+        for var_node in node.variations[1:]:
+            nodes.append(var_node)
+            walk(var_node)
+        walk(main)
+    nodes.append(game)
+    walk(game)
+    return nodes
+
+
+@pytest.fixture
+def sample_games(games_pgn):
+    games = [chess.pgn.read_game(io.StringIO(NESTED_GAME))]
+    with open(games_pgn, encoding='utf-8') as h:
+        while True:
+            game = chess.pgn.read_game(h)
+            if game is None:
+                return games
+            games.append(game)
+
+
+def without_headers(game):
+    return game.accept(chess.pgn.StringExporter(headers=False))
+
+
+def test_nodes_boards_and_mainline(monkeypatch, sample_games):
+    # Few kept boards and a small cache, so most boards are replayed.
+    monkeypatch.setattr(pecg, 'REVIEW_CHECKPOINT_PLIES', 4)
+    monkeypatch.setattr(pecg, 'REVIEW_BOARD_CACHE_SIZE', 3)
+    for game in sample_games:
+        tree = pecg.ReviewTree(game)
+        assert tree.nodes == preorder(game)
+        assert len(tree.boards) == len(tree.labels) == len(tree.nodes)
+        ids = {id(node): i for i, node in enumerate(tree.nodes)}
+        for i, node in reversed(list(enumerate(tree.nodes))):
+            board = tree.boards[i]
+            assert board.fen() == node.board().fen()
+            if i:
+                assert tree.boards.parent(i) == ids[id(node.parent)]
+                assert board.peek() == node.move
+        assert [tree.nodes[i] for i in tree.mainline] == [game] + list(game.mainline())
+
+
+def test_move_list_text_is_the_game(sample_games):
+    for game in sample_games:
+        tree = pecg.ReviewTree(game)
+        text = ''.join(text for text, _, _ in tree.segments)
+        setup = ''.join(f'[{name} "{game.headers[name]}"]\n'
+                        for name in ('FEN', 'SetUp') if name in game.headers)
+        parsed = chess.pgn.read_game(io.StringIO(setup + '\n' + text))
+        # The result is not part of the move list.
+        parsed.headers['Result'] = game.headers['Result']
+        assert without_headers(parsed) == without_headers(game)
+
+        for i, segment in enumerate(tree.move_segments):
+            if i:
+                assert tree.segments[segment][1:] == ('move', i)
+        for first_node, first, end in tree.var_spans:
+            var_text = ''.join(text for text, _, _ in tree.segments[first:end])
+            assert var_text.strip().startswith('(')
+            assert var_text.strip().endswith(')')
+            assert next(value for _, kind, value in tree.segments[first:end]
+                        if kind == 'move') == first_node
+
+
+def test_deep_variations_are_not_recursive():
+    # Every variation goes on below the previous one, nested deeper than
+    # the recursion limit.
+    depth = 1500
+    game = chess.pgn.Game()
+    board = game.board()
+    node = game
+    for _ in range(depth):
+        moves = sorted(board.legal_moves, key=lambda move: move.uci())
+        node.add_variation(moves[0])
+        node = node.add_variation(moves[1])
+        board.push(moves[1])
+    tree = pecg.ReviewTree(game)
+    assert len(tree.nodes) == 2 * depth + 1
+    assert len(tree.var_spans) == depth
+    assert tree.boards[-1] == board
@@ -0,0 +1,79 @@
+"""UciSessionRecorder logs replayed by UciSessionReplayer to python-chess."""
+import io
+import os
+import sys
+
+import chess
+import chess.engine
+import pytest
+
+import python_easy_chess_gui as pecg
+
+TEST_ENGINE = [sys.executable, os.path.join(os.path.dirname(__file__), 'uci_test_engine.py')]
+
+
+def play(command, recorder=None, plies=6):
+    """Returns the engine name, moves and scores of a short game against command."""
+    with chess.engine.SimpleEngine.popen_uci(command) as engine:
+        if recorder is not None:
+            recorder.register(engine, 'opponent')
+        board = chess.Board()
+        results = []
+        for _ in range(plies):
+            result = engine.play(board, chess.engine.Limit(depth=1),
+                                 info=chess.engine.INFO_SCORE)
+            results.append((result.move, result.info['score']))
+            board.push(result.move)
+        return engine.id['name'], results
+
+
+@pytest.fixture
+def session_log(tmp_path):
+    """Records a game against the test engine, returns (log, game)."""
+    log_file = str(tmp_path / 'session.log')
+    recorder = pecg.UciSessionRecorder(log_file)
+    recorder.start()
+    try:
+        game = play(TEST_ENGINE, recorder)
+    finally:
+        recorder.stop()
+    return log_file, game
+
+
+def test_recorded_session(session_log):
+    log_file, (name, results) = session_log
+    with open(log_file, encoding='utf-8') as h:
+        assert h.readline().startswith(f'# pecg-uci-session v{pecg.UCI_SESSION_LOG_VERSION} ')
+    sessions = pecg.read_uci_session(log_file)
+    assert len(sessions) == 1
+    session = next(iter(sessions.values()))
+    assert session['role'] == 'opponent'
+    records = session['records']
+    assert [ms for ms, _, _ in records] == sorted(ms for ms, _, _ in records)
+    assert (records[0][1:]) == ('<', 'uci')
+    assert ('>', 'id name UciTestEngine') in [r[1:] for r in records]
+    assert [text for _, direction, text in records if text.startswith('bestmove')] == [
+        f'bestmove {move.uci()}' for move, _ in results]
+    assert not pecg.uci_session_recorder.is_active()
+
+
+def test_replayer_writes_the_engine_lines(session_log):
+    log_file, _ = session_log
+    records = next(iter(pecg.read_uci_session(log_file).values()))['records']
+    gui = ''.join(text + '\n' for _, direction, text in records if direction == '<')
+    out = io.StringIO()
+    pecg.UciSessionReplayer(log_file, 'opponent', speed=1000).run(io.StringIO(gui), out)
+    assert out.getvalue() == ''.join(
+        text + '\n' for _, direction, text in records if direction == '>')
+
+
+def test_replay_as_an_engine(session_log):
+    log_file, game = session_log
+    command = [sys.executable, pecg.__file__, '--replay-uci', log_file,
+               '--session', 'opponent', '--speed', '1000']
+    assert play(command) == game
+
+
+def test_unknown_session(session_log):
+    with pytest.raises(ValueError):
+        pecg.UciSessionReplayer(session_log[0], 'adviser')
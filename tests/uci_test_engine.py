@@ -0,0 +1,40 @@
+"""A small deterministic UCI engine for the UCI session tests.
+
+It plays the first legal move in UCI order and scores a position by its
+number of legal moves.
+"""
+import sys
+
+import chess
+
+
+def main():
+    board = chess.Board()
+    for line in sys.stdin:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == 'uci':
+            print('id name UciTestEngine')
+            print('id author pecg')
+            print('option name Hash type spin default 16 min 1 max 1024')
+            print('uciok')
+        elif words[0] == 'isready':
+            print('readyok')
+        elif words[0] == 'position':
+            board = chess.Board() if words[1] == 'startpos' else chess.Board(
+                ' '.join(words[2:8]))
+            if 'moves' in words:
+                for move in words[words.index('moves') + 1:]:
+                    board.push_uci(move)
+        elif words[0] == 'go':
+            move = min(board.legal_moves, key=lambda m: m.uci())
+            print(f'info depth 1 score cp {board.legal_moves.count()} pv {move.uci()}')
+            print(f'bestmove {move.uci()}')
+        elif words[0] == 'quit':
+            break
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()